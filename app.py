@@ -2,11 +2,30 @@ import streamlit as st
 import random
 import time
 from datetime import datetime
-import base64
 from io import BytesIO
 from PIL import Image
 import json
 import os
+import html
+import csv
+import tempfile
+import threading
+from collections import deque
+
+from cap import assets, config, metrics, resources
+from cap.batch import ScoredWriter, file_format, iter_rows, score_rows
+from cap.cache import ResultCache, text_key
+from cap.engine import DetectionEngine, EngineBusy, JobTimeout
+from cap.challenges import generate_spot_challenge
+from cap.detection import analyze_image, analyze_video, detect_text_batch, get_indicator_matcher, simulate_text_detection
+from cap.learning import LESSONS
+from cap.ingest import ImageTooLarge, ingest_image
+from cap.video import VideoUnsupported
+from cap.reports import report_card_html
+from cap.speech import SpeechCache, SpeechUnavailable, mime_type
+from cap.state import open_state
+from cap.store import open_report_store
+from cap.upload import Upload
 
 # Configure page
 st.set_page_config(
@@ -15,16 +34,109 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
+page_setup_started = time.perf_counter()
 
 # Function to encode image to base64 for HTML embedding
 def get_base64_of_bin_file(png_file):
-    """Convert image to base64 string"""
-    try:
-        with open(png_file, "rb") as f:
-            data = f.read()
-        return base64.b64encode(data).decode()
-    except FileNotFoundError:
-        return None
+    """Convert image to base64 string (memoized until the file changes)"""
+    return assets.base64_of_file(png_file)
+
+# Shared detection engine, one per server process
+@st.cache_resource
+def get_engine():
+    """Create the worker pool that runs detections off the script thread"""
+    return DetectionEngine()
+
+# Counters and values shared by all sessions, and by every replica when
+# CAP_STATE_URL points at a Redis server
+@st.cache_resource
+def get_state():
+    """Connect to the shared-state backend (this process only if none is configured)"""
+    return open_state()
+
+# Detection results shared by all sessions, keyed by content hash
+@st.cache_resource
+def get_result_cache():
+    """Create the result cache (in memory, backed by a file or the shared state if configured)"""
+    state = get_state()
+    return ResultCache(path=config.CACHE_PATH or None, state=state if state.shared else None)
+
+# Lexicon, indexes and challenge bank, shared by every session
+@st.cache_resource
+def get_resources():
+    """Start loading every detection resource in the background at server start"""
+    threading.Thread(target=resources.warm_up, name="cap-warm-up", daemon=True).start()
+    return resources.REGISTRY
+
+# Perceptual hashes of analyzed and community-reported images
+def get_hash_index():
+    """The known-image index, loaded into memory once per server process"""
+    return resources.get('image_hash_index')
+
+def hash_index():
+    """The known-image index, with newly reported images added every few seconds"""
+    index = get_hash_index()
+    index.sync_reports(get_report_store(), config.REPORT_SYNC_INTERVAL)
+    return index
+
+# MinHash signatures of checked news texts and community reports
+def get_text_index():
+    """The near-duplicate text index, loaded into memory once per server process"""
+    return resources.get('text_index')
+
+def text_index():
+    """The near-duplicate index, with new community reports added every few seconds"""
+    index = get_text_index()
+    index.sync_reports(get_report_store(), config.REPORT_SYNC_INTERVAL)
+    return index
+
+def run_cached(cache, key, detect, *args, **kwargs):
+    """Run a detection and remember its result under the content key"""
+    result = detect(*args, **kwargs)
+    cache.set(key, result)
+    metrics.DETECTIONS.inc(key.split(':', 1)[0], result['verdict'])
+    return result
+
+# Synthesized speech, with the fixed lessons rendered in the background
+@st.cache_resource
+def get_speech_cache():
+    """Create the audio cache and start pre-rendering lesson and challenge audio"""
+    speech = SpeechCache()
+    
+    def prerender():
+        try:
+            speech.prerender()
+        except SpeechUnavailable:
+            pass
+    threading.Thread(target=prerender, name="cap-prerender-audio", daemon=True).start()
+    return speech
+
+# Metrics file writer / HTTP endpoint, started once per server process
+@st.cache_resource
+def get_metrics_exporter():
+    """Start exporting the process's metrics as configured in cap.config"""
+    return metrics.Exporter() if config.METRICS_ENABLED else None
+
+# Community reports shared by every session
+@st.cache_resource
+def get_report_store():
+    """Open the report store (created and seeded on first use)"""
+    return open_report_store(get_state())
+
+UPCOMING_WORKSHOPS = ["Phnom Penh - Sept 15, 2025", "Siem Reap - Sept 22, 2025"]
+
+def register_for_workshops():
+    """Register this session for every upcoming workshop, counting each person once"""
+    state = get_state()
+    for workshop in UPCOMING_WORKSHOPS:
+        if workshop not in st.session_state.registered_workshops:
+            state.incr('workshop_registrations', workshop)
+    st.session_state.registered_workshops = list(UPCOMING_WORKSHOPS)
+
+def workshop_registrations():
+    """Registrations per upcoming workshop, across every session"""
+    counts = get_state().counters('workshop_registrations')
+    return {workshop: counts.get(workshop, 0) for workshop in UPCOMING_WORKSHOPS}
 
 # Custom CSS for better styling with accessibility features
 st.markdown("""
@@ -208,6 +320,13 @@ st.markdown("""
         justify-content: center;
     }
     
+    /* Highlighted fake news indicators */
+    .indicator-mark {
+        background-color: #ffe082;
+        padding: 0 2px;
+        border-radius: 3px;
+    }
+    
     /* Language toggle */
     .language-toggle {
         display: flex;
@@ -256,46 +375,6 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Initialize session state
-if 'community_reports' not in st.session_state:
-    st.session_state.community_reports = [
-        {
-            'id': 1,
-            'type': 'Image',
-            'description': 'Fake profile picture with unnatural skin texture',
-            'explanation': 'រូបភាពនេះមានសម្បុរាមិនធម្មជាតិ និងភ្នែកមិនស៊ីគ្នា ដែលជាសញ្ញាធម្មតានៃរូបភាព AI',
-            'date': '2025-08-20',
-            'category': 'Social Media Scam',
-            'user': 'Livhoung.H',
-            'accuracy': 92,
-            'likes': 24,
-            'comments': 5
-        },
-        {
-            'id': 2,
-            'type': 'News',
-            'description': 'False news about government policy',
-            'explanation': 'ព័ត៌មានក្លែងក្លាយអំពីគោលនយោបាយរដ្ឋាភិបាល ដែលមិនមានប្រភពជាក់លាក់',
-            'date': '2025-08-18',
-            'category': 'Political Misinformation',
-            'user': 'Pich H.',
-            'accuracy': 87,
-            'likes': 32,
-            'comments': 8
-        },
-        {
-            'id': 3,
-            'type': 'Video',
-            'description': 'Deepfake video of celebrity endorsement',
-            'explanation': 'វីដេអូក្លែងក្លាយដែលប្រើបច្ចេកវិទ្យា deepfake ធ្វើឱ្យតារាចិន្តបង្ហាញពាក្យផ្សាយទំនិញ',
-            'date': '2025-08-15',
-            'category': 'Commercial Fraud',
-            'user': 'Socheata.S',
-            'accuracy': 95,
-            'likes': 45,
-            'comments': 12
-        }
-    ]
-
 if 'user_score' not in st.session_state:
     st.session_state.user_score = 0
 
@@ -311,11 +390,42 @@ if 'language' not in st.session_state:
 if 'registered_workshops' not in st.session_state:
     st.session_state.registered_workshops = []
 
-# Add logo to sidebar if available
+if 'image_analysis' not in st.session_state:
+    st.session_state.image_analysis = None
+
+if 'image_preview' not in st.session_state:
+    st.session_state.image_preview = None
+if 'upload' not in st.session_state:
+    st.session_state.upload = None
+
+if 'text_analysis' not in st.session_state:
+    st.session_state.text_analysis = None
+
+# Learn to Spot: where this session is in each shuffled challenge bucket,
+# and the difficulty it is playing at
+if 'challenge_cursors' not in st.session_state:
+    st.session_state.challenge_cursors = {}
+
+if 'challenge_level' not in st.session_state:
+    st.session_state.challenge_level = None
+
+# Community feed paging: the id each visited page starts below (None = newest)
+if 'feed_cursors' not in st.session_state:
+    st.session_state.feed_cursors = [None]
+
+# Cluster of near-duplicate reports the feed is narrowed to, if any
+if 'feed_cluster' not in st.session_state:
+    st.session_state.feed_cluster = None
+if 'feed_report' not in st.session_state:
+    st.session_state.feed_report = None
+
+# Add logo to sidebar if available, as a small pre-optimized copy
+# (twice the display width, for high-density screens)
+logo = assets.best_variant("logo.png", 300)
 with st.sidebar:
-    if os.path.exists("logo.png"):
+    if logo:
         st.markdown('<div class="sidebar-logo">', unsafe_allow_html=True)
-        st.image("logo.png", width=150)
+        st.image(logo, width=150)
         st.markdown('</div>', unsafe_allow_html=True)
     
     st.markdown("### Navigation")
@@ -352,10 +462,16 @@ with st.sidebar:
     
     # Register button for workshops
     if st.button("📝 Register for Workshops", key="register_sidebar", use_container_width=True):
-        st.session_state.registered_workshops = ["Phnom Penh - Sept 15, 2025", "Siem Reap - Sept 22, 2025"]
+        register_for_workshops()
         st.success("Registered for all upcoming workshops!")
+    registrations = workshop_registrations()
+    st.caption(" · ".join(f"{workshop.split(' - ')[0]}: {count} registered"
+                          for workshop, count in registrations.items()))
+    
+    cache_stats = get_result_cache().stats()
+    st.caption(f"⚡ Result cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
     
-    if os.path.exists("logo.png"):
+    if logo:
         st.markdown("---")
         st.markdown("**🔍 CAP**")
         st.markdown("*Check, Analyze, Practice*")
@@ -385,137 +501,299 @@ else:
     </div>
     """, unsafe_allow_html=True)
 
-# Modern tab navigation with larger tabs
+# Modern tab navigation with larger tabs. Switching tabs reruns the
+# script and only the open tab's body is executed (see the bottom).
 tab1, tab2, tab3, tab4, tab5 = st.tabs([
     "🖼️ Detect Media", 
     "📰 Check News", 
     "🎮 Learn to Spot", 
     "👥 Community", 
     "📚 Learning Hub"
-])
+], key="main_tab", on_change="rerun")
+
+get_resources()
+get_metrics_exporter()
+get_speech_cache()
+metrics.observe('page_setup', time.perf_counter() - page_setup_started)
 
 # Helper functions
-def simulate_image_detection(image_file):
-    """Simulate AI detection for images with Khmer explanations"""
-    time.sleep(2)  # Simulate processing time
-    
-    scenarios = [
-        {
-            'score': random.randint(75, 95),
-            'verdict': 'AI Generated (Likely Fake)',
-            'khmer_explanation': 'រូបភាពនេះប្រហែលជា AI បង្កើត ដោយសារ:\n• សម្បុរាមិនធម្មជាតិ និងរលោង\n• ភ្នែកមិនស៊ីគ្នា\n• លម្អិតនៅជុំវិញថ្ពាល់មិនច្បាស់',
-            'english_explanation': 'This image is likely AI-generated because:\n• Unnatural and smooth skin texture\n• Eyes don\'t match properly\n• Blurry details around the head',
-            'technical': 'Detected inconsistencies in facial features and lighting patterns typical of GANs',
-            'class': 'fake-result'
-        },
-        {
-            'score': random.randint(15, 40),
-            'verdict': 'Real (Human Created)',
-            'khmer_explanation': 'រូបភាពនេះគឺពិតប្រាកដ ដោយសារ:\n• សម្បុរាមានលម្អិតធម្មជាតិ\n• ពន្លឺធម្មជាតិ និងស្រមោល\n• លម្អិតតូចៗស្របតាមធម្មជាតិ',
-            'english_explanation': 'This image appears authentic because:\n• Natural skin texture with details\n• Natural lighting and shadows\n• Small natural imperfections',
-            'technical': 'Natural compression artifacts and lighting consistent with camera capture',
-            'class': 'real-result'
-        },
-        {
-            'score': random.randint(45, 65),
-            'verdict': 'Uncertain - Needs Review',
-            'khmer_explanation': 'មិនអាចកំណត់បានច្បាស់:\n• មានលក្ខណៈលាយបញ្ចូលគ្នា\n• អាចជារូបភាពកែតម្រូវ\n• ត្រូវការការពិនិត្យបន្ថែម',
-            'english_explanation': 'Cannot determine with certainty:\n• Mixed characteristics present\n• Possibly heavily edited image\n• Requires additional verification',
-            'technical': 'Mixed indicators - possible heavy editing or borderline AI generation',
-            'class': 'warning-result'
-        }
-    ]
-    
-    return random.choice(scenarios)
-
-def simulate_text_detection(text):
-    """Simulate fake news detection with Khmer explanations"""
-    time.sleep(1.5)
-    
-    # Simple keyword-based simulation
-    fake_indicators = ['urgent', 'breaking', 'secret', 'hidden truth', 'government cover-up', 'exclusive']
-    fake_score = sum(20 for word in fake_indicators if word.lower() in text.lower())
-    fake_score += random.randint(0, 40)
-    
-    scenarios = [
-        {
-            'score': min(fake_score, 90),
-            'verdict': 'Likely Fake News',
-            'khmer_explanation': 'ព័ត៌មាននេះអាចជាក្លែងក្លាយ ដោយសារ:\n• ប្រើពាក្យបំផុសអារម្មណ៍\n• គ្មានប្រភពជាក់លាក់\n• ចង់ឱ្យចែករំលែកយ៉ាងលឿន',
-            'english_explanation': 'This news is likely fake because:\n• Uses emotional trigger words\n• Lacks specific sources\n• Urges rapid sharing',
-            'technical': 'High emotional language, lack of credible sources, urgency indicators',
-            'class': 'fake-result'
-        },
-        {
-            'score': random.randint(10, 30),
-            'verdict': 'Likely Reliable',
-            'khmer_explanation': 'ព័ត៌មាននេះគួរអាចទុកចិត្តបាន:\n• មានប្រភពច្បាស់លាស់\n• ភាសាគ្មានភាពលំអៀង\n• មានលម្អិតពិតប្រាកដ',
-            'english_explanation': 'This news appears reliable because:\n• Clear sources are provided\n• Neutral language is used\n• Contains verifiable details',
-            'technical': 'Neutral language, credible sources mentioned, factual content structure',
-            'class': 'real-result'
-        }
-    ]
-    
-    if fake_score > 50:
-        return scenarios[0]
-    else:
-        return scenarios[1]
-
-def generate_spot_challenge():
-    """Generate a spot the AI challenge"""
-    challenges = [
-        {
-            'type': 'Image',
-            'question': 'Which image is AI generated?',
-            'question_khmer': 'តើរូបភាពណាមួយដែល AI បង្កើត?',
-            'option_a': '👤 Professional headshot with perfect lighting',
-            'option_a_khmer': '👤 រូបថតក្បាលដែលមានពន្លឺល្អឥតខ្ចោះ',
-            'option_b': '📷 Casual selfie with natural imperfections',
-            'option_b_khmer': '📷 សេលហ្វ៊ីធម្មជាតិដែលមានកំហុសតូចៗ',
-            'correct': 'A',
-            'explanation': 'AI នឹងបង្កើតរូបភាពដែលល្អឥតខ្ចោះពេក ខណៈដែលរូបថតធម្មតាមានកំហុសតូចៗ',
-            'explanation_en': 'AI tends to create images that are too perfect, while real photos have small imperfections'
-        },
-        {
-            'type': 'News',
-            'question': 'Which headline is more likely fake?',
-            'question_khmer': 'តើចំណងជើងណាមួយដែលអាចជាក្លែងក្លាយ?',
-            'option_a': 'Local School Receives Government Funding for New Library',
-            'option_a_khmer': 'សាលារៀនមួយទទួលបានថវិកាពីរដ្ឋាភិបាលសម្រាប់បណ្ណាល័យថ្មី',
-            'option_b': 'SHOCKING: Secret Government Plan Revealed - Share Before Deleted!',
-            'option_b_khmer': 'គួរឱ្យភ្ញាក់ផ្អើល: ផែនការសម្ងាត់របស់រដ្ឋាភិបាលត្រូវបានបង្ហាញ - ចែករំលែកមុនពេលលុប!',
-            'correct': 'B',
-            'explanation': 'ចំណងជើងដែលប្រើពាក្យ "SHOCKING" និងស្នើសុំឱ្យចែករំលែក តែងតែជាសញ្ញានៃព័ត៌មានក្លែងក្លាយ',
-            'explanation_en': 'Headlines using words like "SHOCKING" and urging to share are often signs of fake news'
-        },
-        {
-            'type': 'Video',
-            'question': 'Which video description suggests AI generation?',
-            'question_khmer': 'តើការពិពណ៌នាវីដេអូណាដែលបង្ហាញថាវាត្រូវបានបង្កើតដោយ AI?',
-            'option_a': 'Celebrity cooking tutorial with kitchen mistakes',
-            'option_a_khmer': 'ការបង្រៀនធ្វើម្ហូបដោយតារាដែលមានកំហុសក្នុងផ្ទះបាយ',
-            'option_b': 'Celebrity perfectly endorsing product with flawless speech',
-            'option_b_khmer': 'តារានិយាយផ្សាយទំនិញដ៏ល្អឥតខ្ចោះដោយគ្មានកំហុស',
-            'correct': 'B',
-            'explanation': 'វីដេអូ AI តែងតែបង្ហាញមនុស្សល្បីនិយាយដ៏ល្អឥតខ្ចោះ ដោយមិនមានកំហុសធម្មជាតិ',
-            'explanation_en': 'AI videos often show celebrities speaking perfectly without natural mistakes'
-        }
-    ]
-    return random.choice(challenges)
-
-def get_accuracy_class(accuracy):
-    """Get CSS class based on accuracy percentage"""
-    if accuracy >= 80:
-        return "high-accuracy"
-    elif accuracy >= 60:
-        return "medium-accuracy"
-    else:
-        return "low-accuracy"
+def highlight_indicators(text):
+    """Return the text as HTML with matched indicator phrases marked"""
+    spans = []
+    for match in sorted(get_indicator_matcher().find(text)):
+        # Merge overlapping phrases into a single highlight
+        if spans and match.start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], match.end)
+        else:
+            spans.append([match.start, match.end])
+    parts = []
+    position = 0
+    for start, end in spans:
+        parts.append(html.escape(text[position:start]))
+        parts.append(f'<mark class="indicator-mark">{html.escape(text[start:end])}</mark>')
+        position = end
+    parts.append(html.escape(text[position:]))
+    return "".join(parts).replace("\n", "<br>")
 
-# Function to simulate audio playback (placeholder)
+# Read text aloud with the offline speech engine
 def play_audio(text):
-    """Simulate audio playback (in a real app, this would use TTS)"""
-    st.toast("🔊 Playing audio explanation...")
+    """Play ``text`` in the current language, synthesizing it on first use"""
+    try:
+        with st.spinner("🔊 Preparing audio..."):
+            path = get_speech_cache().audio_path(text, st.session_state.language)
+    except SpeechUnavailable:
+        st.toast("🔊 Audio is not available on this server yet.")
+        return
+    st.audio(path, format=mime_type(path), autoplay=True)
+
+def current_upload(uploaded_file):
+    """The uploaded file's bytes and cache key, taken from the widget once per file"""
+    upload = st.session_state.upload
+    if upload is None or upload.file_id != uploaded_file.file_id:
+        upload = Upload.read(uploaded_file)
+        st.session_state.upload = upload
+    return upload
+
+def image_preview(upload):
+    """Decode an uploaded image once into a thumbnail, kept for this upload"""
+    preview = st.session_state.image_preview
+    if preview is None or preview['file_id'] != upload.file_id:
+        preview = {'file_id': upload.file_id, 'thumbnail': None, 'error': None}
+        try:
+            preview['thumbnail'] = ingest_image(upload.open()).thumbnail()
+        except ImageTooLarge as error:
+            preview['error'] = f"⚠️ {error}"
+        except (OSError, ValueError):
+            preview['error'] = "⚠️ This file could not be read as an image."
+        st.session_state.image_preview = preview
+    return preview
+
+def collect_image_job():
+    """Move a finished image analysis from the engine into session state"""
+    analysis = st.session_state.image_analysis
+    if analysis is None or analysis['job_id'] is None:
+        return
+    engine = get_engine()
+    try:
+        if not engine.poll(analysis['job_id']).done:
+            return
+        analysis['result'] = engine.result(analysis['job_id'])
+    except KeyError:
+        analysis['error'] = "The analysis was lost. Please press Analyze again."
+    except JobTimeout:
+        analysis['error'] = "⌛ The analysis took too long. Please try again."
+    except (ImageTooLarge, VideoUnsupported) as error:
+        analysis['error'] = f"⚠️ {error}"
+    except Exception:
+        analysis['error'] = "Something went wrong while analyzing this file."
+    analysis['job_id'] = None
+
+@st.fragment(run_every=0.5)
+def poll_image_job():
+    """Show progress for the running image analysis until it finishes"""
+    analysis = st.session_state.image_analysis
+    if analysis is None or analysis['job_id'] is None:
+        return
+    engine = get_engine()
+    try:
+        job = engine.poll(analysis['job_id'])
+    except KeyError:
+        st.rerun()
+    if job.done:
+        # Full rerun so the result panel renders in the main page
+        st.rerun()
+    st.progress(engine.progress(job.id), text="Analyzing content... This may take a moment")
+
+def show_image_result(result, cache_key=None):
+    """Render an image detection result with audio and share actions"""
+    st.markdown(f"""
+    <div class="detection-result {result['class']}">
+        <div class="score-text">{result['verdict']}</div>
+        <p><strong>Confidence Score:</strong> {result['score']}%</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Link to the community report this image was matched against
+    if result.get('report_id') is not None:
+        st.info(f"🔗 Matches community report #{result['report_id']}: {result.get('report_label') or ''}")
+        if st.button("👥 View the community report" if st.session_state.language == 'English'
+                     else "👥 មើលការរាយការណ៍របស់សហគមន៍", key=f"image_report_{result['report_id']}"):
+            show_report(result['report_id'])
+            # The tabs are outside this fragment; only a full rerun switches them
+            st.rerun(scope="app")
+    
+    # Explanation with audio button
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        if st.session_state.language == 'Khmer':
+            st.markdown("**🇰🇭 Explanation in Khmer:**")
+            st.markdown(f"""
+            <div class="khmer-explanation">
+                {result['khmer_explanation']}
+            </div>
+            """, unsafe_allow_html=True)
+        else:
+            st.markdown("**🇺🇸 Explanation in English:**")
+            st.markdown(f"""
+            <div class="khmer-explanation">
+                {result['english_explanation']}
+            </div>
+            """, unsafe_allow_html=True)
+    with col2:
+        st.markdown("<br>", unsafe_allow_html=True)
+        if st.button("🔊", help="Listen to explanation", key="audio_img2"):
+            if st.session_state.language == 'Khmer':
+                play_audio(result['khmer_explanation'])
+            else:
+                play_audio(result['english_explanation'])
+    
+    # Technical details
+    with st.expander("🔬 Technical Details"):
+        st.write(result['technical'])
+    
+    # Store result for potential sharing
+    st.session_state.detection_result = result
+    
+    # Action buttons
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("📤 Share to Community", key="share_image2", use_container_width=True):
+            st.session_state.report_to_share = {
+                'type': 'Video' if 'frames' in result else 'Image',
+                'score': result['score'],
+                'verdict': result['verdict'],
+                'explanation': result['khmer_explanation'] if st.session_state.language == 'Khmer' else result['english_explanation'],
+                'hashes': result.get('hashes'),
+                'cache_key': cache_key
+            }
+            st.success("✅ Ready to share to community! Go to Community Reports tab.")
+    with col2:
+        if st.button("📥 Save Result", key="save_image2", use_container_width=True):
+            st.success("✅ Result saved to your reports!")
+
+# Reports shown per page of the community feed, and how many are read
+# at a time to fill a page when near-duplicates are folded away
+FEED_PAGE_SIZE = 10
+FEED_FETCH_SIZE = 3 * FEED_PAGE_SIZE
+
+# Choices offered when reporting, also used to filter the feed
+REPORT_TYPES = ["Image", "Video", "News", "Social Media Post"]
+REPORT_CATEGORIES = ["Social Media Scam", "Political Misinformation",
+                     "Commercial Fraud", "Health Misinformation"]
+
+def reset_feed():
+    """Go back to the first page when the feed's filters change"""
+    st.session_state.feed_cursors = [None]
+
+def show_cluster(cluster_id):
+    """Open the community feed on one cluster of near-duplicate reports"""
+    st.session_state.feed_cluster = cluster_id
+    st.session_state.feed_report = None
+    st.session_state.feed_query = ""
+    st.session_state.feed_cursors = [None]
+    st.session_state.main_tab = "👥 Community"
+
+def has_newer_duplicate(store, index, report, category=None, type=None):
+    """Whether a newer report of the same cluster is in the feed, so this one is folded into it"""
+    cluster_id = index.cluster_of(report['id'])
+    if cluster_id is None:
+        return False
+    newer = [id for id in index.cluster_reports(cluster_id) if id > report['id']]
+    if not newer or (category is None and type is None):
+        return bool(newer)
+    return bool(store.list_reports(ids=newer, category=category, type=type, limit=1))
+
+def feed_page(store, index, before_id, category=None, type=None):
+    """One page of the feed, newest first, each cluster shown once; and whether older reports exist"""
+    reports = []
+    while len(reports) <= FEED_PAGE_SIZE:
+        batch = store.list_reports(limit=FEED_FETCH_SIZE, before_id=before_id, category=category, type=type)
+        reports += [report for report in batch
+                    if not has_newer_duplicate(store, index, report, category, type)]
+        if len(batch) < FEED_FETCH_SIZE:
+            break
+        before_id = batch[-1]['id']
+    return reports[:FEED_PAGE_SIZE], len(reports) > FEED_PAGE_SIZE
+
+def show_report(report_id):
+    """Open the community feed on one report"""
+    st.session_state.feed_report = report_id
+    st.session_state.feed_cluster = None
+    st.session_state.feed_query = ""
+    st.session_state.feed_cursors = [None]
+    st.session_state.main_tab = "👥 Community"
+
+# Rows kept on screen while a batch file is being scored
+BATCH_PREVIEW_ROWS = 200
+
+def show_batch_verification():
+    """Score an uploaded CSV/JSONL file of texts and offer the scored file"""
+    english = st.session_state.language == 'English'
+    batch_file = st.file_uploader(
+        "Upload a CSV or JSONL file of messages" if english else "ផ្ទុកឡើងឯកសារ CSV ឬ JSONL នៃសារ",
+        type=['csv', 'tsv', 'jsonl', 'ndjson', 'json'],
+        key="batch_file",
+        help="One message per row. The text is taken from a 'text', 'content' or 'message' column."
+    )
+    text_field = st.text_input(
+        "Text column (optional)" if english else "ជួរឈរអត្ថបទ (ស្រេចចិត្ត)",
+        key="batch_field",
+        placeholder="text"
+    )
+    if batch_file is None:
+        return
+    
+    if st.button("🔍 Score File", key="batch_score", use_container_width=True):
+        previous = st.session_state.get('batch_output')
+        if previous and os.path.exists(previous['path']):
+            os.remove(previous['path'])
+        st.session_state.batch_output = None
+        
+        fmt = file_format(batch_file.name)
+        base = os.path.splitext(batch_file.name)[0]
+        progress = st.progress(0.0, text="Scoring...")
+        table = st.empty()
+        preview = deque(maxlen=BATCH_PREVIEW_ROWS)
+        total = fake = 0
+        
+        # Scored rows go straight to disk; only the preview stays in memory
+        output = tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='',
+                                             suffix=f"_{base}.{fmt}", delete=False)
+        try:
+            with output:
+                writer = ScoredWriter(output, fmt)
+                batch_file.seek(0)
+                rows = iter_rows(batch_file, fmt, text_field.strip() or None)
+                for records in score_rows(rows, detect_text_batch):
+                    writer.write(records)
+                    total += len(records)
+                    fake += sum(1 for record in records if record['verdict'] == 'Likely Fake News')
+                    preview.extend(records)
+                    progress.progress(min(batch_file.tell() / max(batch_file.size, 1), 1.0),
+                                      text=f"Scored {total} texts")
+                    table.dataframe(list(preview), use_container_width=True)
+        except (ValueError, csv.Error) as error:
+            os.remove(output.name)
+            st.error(f"Could not read this file: {error}")
+            return
+        
+        progress.empty()
+        table.empty()
+        st.session_state.batch_output = {
+            'path': output.name,
+            'name': f"{base}_scored.{fmt}",
+            'total': total,
+            'fake': fake,
+            'preview': list(preview)
+        }
+    
+    result = st.session_state.get('batch_output')
+    if result and os.path.exists(result['path']):
+        st.success(f"✅ Scored {result['total']} texts - {result['fake']} likely fake")
+        st.dataframe(result['preview'], use_container_width=True)
+        with open(result['path'], 'rb') as f:
+            st.download_button("📥 Download Scored File", f, file_name=result['name'],
+                               key="batch_download", on_click="ignore", use_container_width=True)
 
 # Function to handle image upload with fake detection
 def handle_image_upload():
@@ -592,8 +870,10 @@ def handle_image_upload():
     else:
         st.warning("Demo image not found. Please add 'image.jpeg' to the same directory as this script.")
 
-# Main content in tabs
-with tab1:
+# Main content in tabs. The detection panels and the game are fragments:
+# their buttons rerun just that section, not the whole page.
+@st.fragment
+def media_detection_tab():
     st.header("Media Detection")
     if st.session_state.language == 'Khmer':
         st.markdown("**ផ្ទុកឡើងរូបភាព ឬវីដេអូ ដើម្បីពិនិត្យថាតើវាត្រូវបានបង្កើតដោយ AI**")
@@ -606,77 +886,79 @@ with tab1:
         help="Supported formats: PNG, JPG, JPEG, GIF, MP4, AVI, MOV"
     )
     
-    if uploaded_file is not None:
+    if uploaded_file is None:
+        # Let go of the last upload's bytes
+        st.session_state.upload = None
+    else:
         # Check if it's the demo image
         if uploaded_file.name == "image.jpeg":
             handle_image_upload()
         else:
-            # Display the uploaded file
-            if uploaded_file.type.startswith('image'):
-                st.image(uploaded_file, caption="Uploaded Image")
+            # One buffer for the preview, the player, the cache key and the analysis
+            upload = current_upload(uploaded_file)
+            # Display the uploaded file (images as a small decoded preview)
+            upload_error = None
+            if upload.type.startswith('image'):
+                preview = image_preview(upload)
+                upload_error = preview['error']
+                if preview['thumbnail'] is not None:
+                    st.image(preview['thumbnail'], caption="Uploaded Image")
             else:
-                st.video(uploaded_file)
+                st.video(upload.data, format=upload.type)
             
-            if st.button("🔍 Analyze Content", type="primary", use_container_width=True):
-                with st.spinner("Analyzing content... This may take a moment"):
-                    result = simulate_image_detection(uploaded_file)
-                
-                # Display results
-                st.markdown(f"""
-                <div class="detection-result {result['class']}">
-                    <div class="score-text">{result['verdict']}</div>
-                    <p><strong>Confidence Score:</strong> {result['score']}%</p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Explanation with audio button
-                col1, col2 = st.columns([4, 1])
-                with col1:
-                    if st.session_state.language == 'Khmer':
-                        st.markdown("**🇰🇭 Explanation in Khmer:**")
-                        st.markdown(f"""
-                        <div class="khmer-explanation">
-                            {result['khmer_explanation']}
-                        </div>
-                        """, unsafe_allow_html=True)
-                    else:
-                        st.markdown("**🇺🇸 Explanation in English:**")
-                        st.markdown(f"""
-                        <div class="khmer-explanation">
-                            {result['english_explanation']}
-                        </div>
-                        """, unsafe_allow_html=True)
-                with col2:
-                    st.markdown("<br>", unsafe_allow_html=True)
-                    if st.button("🔊", help="Listen to explanation", key="audio_img2"):
-                        if st.session_state.language == 'Khmer':
-                            play_audio(result['khmer_explanation'])
+            # Forget results that belong to a previously uploaded file
+            analysis = st.session_state.image_analysis
+            if analysis and analysis['file_id'] != upload.file_id:
+                if analysis['job_id'] is not None:
+                    get_engine().discard(analysis['job_id'])
+                st.session_state.image_analysis = None
+            
+            if upload_error:
+                st.error(upload_error)
+            elif st.button("🔍 Analyze Content", type="primary", use_container_width=True):
+                cache = get_result_cache()
+                key = upload.key
+                cached = cache.get(key)
+                if cached is not None:
+                    st.session_state.image_analysis = {
+                        'file_id': upload.file_id,
+                        'cache_key': key,
+                        'job_id': None,
+                        'result': cached,
+                        'error': None
+                    }
+                else:
+                    try:
+                        # Videos and animated GIFs go through the frame sampler
+                        if upload.is_video:
+                            job_id = get_engine().submit('video', run_cached, cache, key,
+                                                         analyze_video, upload.data)
                         else:
-                            play_audio(result['english_explanation'])
-                
-                # Technical details
-                with st.expander("🔬 Technical Details"):
-                    st.write(result['technical'])
-                
-                # Store result for potential sharing
-                st.session_state.detection_result = result
-                
-                # Action buttons
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("📤 Share to Community", key="share_image2", use_container_width=True):
-                        st.session_state.report_to_share = {
-                            'type': 'Image',
-                            'score': result['score'],
-                            'verdict': result['verdict'],
-                            'explanation': result['khmer_explanation'] if st.session_state.language == 'Khmer' else result['english_explanation']
+                            job_id = get_engine().submit('image', run_cached, cache, key,
+                                                         analyze_image, upload.data, hash_index())
+                    except EngineBusy:
+                        st.warning("⏳ Many people are analyzing right now. Please try again in a moment.")
+                    else:
+                        st.session_state.image_analysis = {
+                            'file_id': upload.file_id,
+                            'cache_key': key,
+                            'job_id': job_id,
+                            'result': None,
+                            'error': None
                         }
-                        st.success("✅ Ready to share to community! Go to Community Reports tab.")
-                with col2:
-                    if st.button("📥 Save Result", use_container_width=True):
-                        st.success("✅ Result saved to your reports!")
+            
+            collect_image_job()
+            analysis = st.session_state.image_analysis
+            if analysis is not None:
+                if analysis['job_id'] is not None:
+                    poll_image_job()
+                elif analysis['error']:
+                    st.error(analysis['error'])
+                else:
+                    show_image_result(analysis['result'], analysis['cache_key'])
 
-with tab2:
+@st.fragment
+def news_verification_tab():
     st.header("News Verification")
     if st.session_state.language == 'Khmer':
         st.markdown("**បញ្ចូលខ្លឹមសារព័ត៌មាន ដើម្បីពិនិត្យសញ្ញានៃព័ត៌មានក្លែងក្លាយ**")
@@ -692,68 +974,130 @@ with tab2:
     
     # Also add analyze button after text input
     if st.button("🔍 Analyze Text", type="primary", use_container_width=True, key="analyze_btn_second"):
-        if not text_input:
+        if not text_input.strip():
             st.warning("Please enter some text to analyze.")
+            st.session_state.text_analysis = None
         else:
-            with st.spinner("Analyzing text for fake news indicators..."):
-                result = simulate_text_detection(text_input)
-            
-            # Display results
-            st.markdown(f"""
-            <div class="detection-result {result['class']}">
-                <div class="score-text">{result['verdict']}</div>
-                <p><strong>Fake News Score:</strong> {result['score']}%</p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # Explanation with audio button
-            col1, col2 = st.columns([4, 1])
-            with col1:
+            cache = get_result_cache()
+            key = text_key(text_input)
+            result = cache.get(key)
+            index = text_index()
+            duplicate = index.find(text_input)
+            if result is None and duplicate is not None and duplicate['result_key']:
+                # A near-duplicate was checked before: reuse its verdict
+                result = cache.get(duplicate['result_key'])
+            if result is None:
+                with st.spinner("Analyzing text for fake news indicators..."):
+                    result = run_cached(cache, key, simulate_text_detection, text_input)
+                index.record_analysis(text_input, result, key)
+            st.session_state.text_analysis = {'text': text_input, 'result': result, 'duplicate': duplicate}
+    
+    # The result stays up (and its buttons work) until the text is edited
+    analysis = st.session_state.text_analysis
+    if analysis is not None and analysis['text'] == text_input:
+        result = analysis['result']
+        
+        # Seen before: the earlier verdict and the community reports like it
+        duplicate = analysis.get('duplicate')
+        if duplicate is not None:
+            similar_reports = get_text_index().cluster_size(duplicate['cluster_id'])
+            similarity = round(duplicate['similarity'] * 100)
+            if st.session_state.language == 'Khmer':
+                st.info(f"🔁 អត្ថបទស្រដៀងគ្នា ({similarity}%) ត្រូវបានពិនិត្យរួចហើយ"
+                        + (f" — លទ្ធផលមុន: {duplicate['verdict']}" if duplicate['verdict'] else ""))
+            else:
+                st.info(f"🔁 A similar text ({similarity}% alike) was checked before"
+                        + (f" — earlier verdict: {duplicate['verdict']}" if duplicate['verdict'] else ""))
+            if similar_reports:
+                if st.button(f"👥 View {similar_reports} similar community reports"
+                             if st.session_state.language == 'English'
+                             else f"👥 មើលការរាយការណ៍ស្រដៀងគ្នា {similar_reports}",
+                             key="news_cluster"):
+                    show_cluster(duplicate['cluster_id'])
+                    # The tabs are outside this fragment; only a full rerun switches them
+                    st.rerun(scope="app")
+        
+        # Display results
+        st.markdown(f"""
+        <div class="detection-result {result['class']}">
+            <div class="score-text">{result['verdict']}</div>
+            <p><strong>Fake News Score:</strong> {result['score']}%</p>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # Explanation with audio button
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            if st.session_state.language == 'Khmer':
+                st.markdown("**🇰🇭 Explanation in Khmer:**")
+                st.markdown(f"""
+                <div class="khmer-explanation">
+                    {result['khmer_explanation']}
+                </div>
+                """, unsafe_allow_html=True)
+            else:
+                st.markdown("**🇺🇸 Explanation in English:**")
+                st.markdown(f"""
+                <div class="khmer-explanation">
+                    {result['english_explanation']}
+                </div>
+                """, unsafe_allow_html=True)
+        with col2:
+            st.markdown("<br>", unsafe_allow_html=True)
+            if st.button("🔊", key="audio_news", help="Listen to explanation"):
                 if st.session_state.language == 'Khmer':
-                    st.markdown("**🇰🇭 Explanation in Khmer:**")
-                    st.markdown(f"""
-                    <div class="khmer-explanation">
-                        {result['khmer_explanation']}
-                    </div>
-                    """, unsafe_allow_html=True)
+                    play_audio(result['khmer_explanation'])
                 else:
-                    st.markdown("**🇺🇸 Explanation in English:**")
-                    st.markdown(f"""
-                    <div class="khmer-explanation">
-                        {result['english_explanation']}
-                    </div>
-                    """, unsafe_allow_html=True)
-            with col2:
-                st.markdown("<br>", unsafe_allow_html=True)
-                if st.button("🔊", key="audio_news", help="Listen to explanation"):
-                    if st.session_state.language == 'Khmer':
-                        play_audio(result['khmer_explanation'])
-                    else:
-                        play_audio(result['english_explanation'])
-            
-            # Technical details
-            with st.expander("🔬 Analysis Details"):
-                st.write(result['technical'])
-                
-            # Store result for potential sharing
-            st.session_state.detection_result = result
+                    play_audio(result['english_explanation'])
+        
+        # Technical details
+        with st.expander("🔬 Analysis Details"):
+            st.write(result['technical'])
+            if result.get('matches'):
+                phrases = sorted({match[2] for match in result['matches']})
+                st.markdown("**Triggered phrases:** " + ", ".join(phrases))
+                st.markdown(f"""
+                <div class="khmer-explanation">
+                    {highlight_indicators(text_input)}
+                </div>
+                """, unsafe_allow_html=True)
             
-            # Action buttons
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("📤 Share to Community", key="share_news", use_container_width=True):
-                    st.session_state.report_to_share = {
-                        'type': 'News',
-                        'score': result['score'],
-                        'verdict': result['verdict'],
-                        'explanation': result['khmer_explanation'] if st.session_state.language == 'Khmer' else result['english_explanation']
-                    }
-                    st.success("✅ Ready to share to community! Go to Community Reports tab.")
-            with col2:
-                if st.button("📥 Save Result", use_container_width=True):
-                    st.success("✅ Result saved to your reports!")
+        # Store result for potential sharing
+        st.session_state.detection_result = result
+        
+        # Action buttons
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("📤 Share to Community", key="share_news", use_container_width=True):
+                st.session_state.report_to_share = {
+                    'type': 'News',
+                    'score': result['score'],
+                    'verdict': result['verdict'],
+                    'explanation': result['khmer_explanation'] if st.session_state.language == 'Khmer' else result['english_explanation']
+                }
+                st.success("✅ Ready to share to community! Go to Community Reports tab.")
+        with col2:
+            if st.button("📥 Save Result", use_container_width=True):
+                st.success("✅ Result saved to your reports!")
+    
+    # Batch mode for volunteers triaging many forwarded messages
+    with st.expander("📂 Batch Check (CSV / JSONL)" if st.session_state.language == 'English' else "📂 ពិនិត្យជាបាច់ (CSV / JSONL)"):
+        show_batch_verification()
 
-with tab3:
+def choose_answer(choice):
+    """Record the player's answer and score it, once per challenge"""
+    st.session_state.user_choice = choice
+    st.session_state.games_played += 1
+    if choice == st.session_state.current_challenge['correct']:
+        st.session_state.user_score += 1
+
+def next_challenge():
+    """Clear the finished challenge so the game starts over"""
+    del st.session_state.current_challenge
+    del st.session_state.user_choice
+
+@st.fragment
+def learning_game_tab():
     st.header("Learning Games")
     
     if st.session_state.language == 'Khmer':
@@ -768,8 +1112,11 @@ with tab3:
         st.metric("Games Played", st.session_state.games_played)
     
     if st.button("🎲 Start New Challenge", type="primary", use_container_width=True):
-        challenge = generate_spot_challenge()
+        challenge = generate_spot_challenge(st.session_state.challenge_cursors, st.session_state.user_score,
+                                            st.session_state.games_played, st.session_state.challenge_level)
+        st.session_state.challenge_level = challenge.get('difficulty')
         st.session_state.current_challenge = challenge
+        st.session_state.pop('user_choice', None)
     
     if 'current_challenge' in st.session_state:
         challenge = st.session_state.current_challenge
@@ -788,8 +1135,8 @@ with tab3:
                 st.info(challenge['option_a_khmer'])
             else:
                 st.info(challenge['option_a'])
-            if st.button("Choose A", key="choice_a", use_container_width=True):
-                st.session_state.user_choice = 'A'
+            st.button("Choose A", key="choice_a", use_container_width=True,
+                      disabled='user_choice' in st.session_state, on_click=choose_answer, args=('A',))
         
         with col2:
             st.markdown("**Option B:**")
@@ -797,18 +1144,15 @@ with tab3:
                 st.info(challenge['option_b_khmer'])
             else:
                 st.info(challenge['option_b'])
-            if st.button("Choose B", key="choice_b", use_container_width=True):
-                st.session_state.user_choice = 'B'
+            st.button("Choose B", key="choice_b", use_container_width=True,
+                      disabled='user_choice' in st.session_state, on_click=choose_answer, args=('B',))
         
         if 'user_choice' in st.session_state:
             user_choice = st.session_state.user_choice
             correct_answer = challenge['correct']
             
-            st.session_state.games_played += 1
-            
             if user_choice == correct_answer:
                 st.success("🎉 Correct! Well done!")
-                st.session_state.user_score += 1
             else:
                 st.error(f"❌ Incorrect. The correct answer was {correct_answer}")
             
@@ -835,12 +1179,146 @@ with tab3:
                     play_audio(challenge['explanation_en'])
             
             # Reset for next challenge
-            if st.button("🔄 Next Challenge", use_container_width=True):
-                del st.session_state.current_challenge
-                del st.session_state.user_choice
-                st.rerun()
+            st.button("🔄 Next Challenge", use_container_width=True, on_click=next_challenge)
 
-with tab4:
+@st.fragment
+def community_feed():
+    """Search, filters and the paginated feed, rerun on their own when used"""
+    # Display existing reports in a feed format
+    if st.session_state.language == 'Khmer':
+        st.subheader("📊 ការរាយការណ៍សហគមន៍")
+    else:
+        st.subheader("📊 Community Reports Feed")
+    
+    # Search and filters
+    english = st.session_state.language == 'English'
+    query = st.text_input(
+        "🔍 Search reports" if english else "🔍 ស្វែងរកការរាយការណ៍",
+        key="feed_query",
+        placeholder="Search in English or Khmer..." if english else "ស្វែងរកជាភាសាខ្មែរ ឬអង់គ្លេស...")
+    col1, col2 = st.columns(2)
+    with col1:
+        category_filter = st.selectbox(
+            "Category" if english else "ប្រភេទ", [None] + REPORT_CATEGORIES, key="feed_category",
+            format_func=lambda option: option or ("All" if english else "ទាំងអស់"), on_change=reset_feed)
+    with col2:
+        type_filter = st.selectbox(
+            "Content Type" if english else "ប្រភេទមាតិកា", [None] + REPORT_TYPES, key="feed_type",
+            format_func=lambda option: option or ("All" if english else "ទាំងអស់"), on_change=reset_feed)
+    
+    # Only the visible page of the feed is fetched and rendered
+    store = get_report_store()
+    index = text_index()
+    cursors = st.session_state.feed_cursors
+    cluster = st.session_state.feed_cluster
+    if st.session_state.feed_report is not None and not query.strip():
+        # The report an analyzed image was matched against
+        reports = store.list_reports(ids=[st.session_state.feed_report])
+        st.button("✖️ Show all reports" if english else "✖️ បង្ហាញការរាយការណ៍ទាំងអស់", key="feed_all",
+                  on_click=show_report, args=(None,))
+        if not reports:
+            st.info("This report is no longer available." if english else "ការរាយការណ៍នេះលែងមានហើយ។")
+        has_older = False
+    elif cluster is not None and not query.strip():
+        # One cluster of near-duplicate reports, paged like the feed
+        members = index.cluster_reports(cluster)
+        st.info(f"🔁 {len(members)} similar reports" if english else f"🔁 ការរាយការណ៍ស្រដៀងគ្នា {len(members)}")
+        st.button("✖️ Show all reports" if english else "✖️ បង្ហាញការរាយការណ៍ទាំងអស់", key="feed_all",
+                  on_click=show_cluster, args=(None,))
+        ids = [id for id in reversed(members) if cursors[-1] is None or id < cursors[-1]][:FEED_PAGE_SIZE + 1]
+        reports = store.list_reports(ids=ids, category=category_filter, type=type_filter) if ids else []
+        has_older = len(ids) > FEED_PAGE_SIZE
+        reports = reports[:FEED_PAGE_SIZE]
+    elif query.strip():
+        # Ranked search results replace the feed while there is a query;
+        # each cluster is shown once, at its best-ranked report
+        shown_clusters = set()
+        reports = []
+        for report in store.search(query, category=category_filter, type=type_filter, limit=FEED_FETCH_SIZE):
+            report_cluster = index.cluster_of(report['id'])
+            if report_cluster is None or report_cluster not in shown_clusters:
+                shown_clusters.add(report_cluster)
+                reports.append(report)
+        reports = reports[:FEED_PAGE_SIZE]
+        if not reports:
+            st.info("No reports match your search." if english else "រកមិនឃើញការរាយការណ៍ដែលត្រូវគ្នាទេ។")
+    else:
+        # Near-duplicates are folded into the newest report of their cluster
+        reports, has_older = feed_page(store, index, cursors[-1], category_filter, type_filter)
+    
+    with metrics.timed('feed_render'):
+        for report in reports:
+            report_cluster = index.cluster_of(report['id'])
+            with st.container():
+                st.markdown(report_card_html(report, st.session_state.language), unsafe_allow_html=True)
+                
+                # Add audio button for each report on this page
+                if st.button("🔊 Listen to Report", key=f"audio_report_{report['id']}"):
+                    play_audio(f"{report['description']}. {report['explanation']}")
+                similar = index.cluster_size(report_cluster) - 1 if cluster is None and report_cluster else 0
+                if similar:
+                    st.button(f"🔁 {similar} similar reports" if english else f"🔁 ការរាយការណ៍ស្រដៀងគ្នា {similar}",
+                              key=f"cluster_{report['id']}", on_click=show_cluster, args=(report_cluster,))
+    
+    # Feed paging
+    if not query.strip():
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            st.button("⬅️ Newer", key="feed_newer", use_container_width=True,
+                      disabled=len(cursors) == 1, on_click=cursors.pop)
+        with col2:
+            st.markdown(f"<div style='text-align: center;'>Page {len(cursors)}</div>", unsafe_allow_html=True)
+        with col3:
+            st.button("Older ➡️", key="feed_older", use_container_width=True,
+                      disabled=not has_older, on_click=cursors.append,
+                      args=(reports[-1]['id'] if reports else None,))
+
+@st.fragment
+def community_analytics():
+    """Report trends for moderators, read from the store's rollup tables"""
+    english = st.session_state.language == 'English'
+    periods = {7: "Last 7 days" if english else "៧ ថ្ងៃចុងក្រោយ",
+               30: "Last 30 days" if english else "៣០ ថ្ងៃចុងក្រោយ",
+               0: "All time" if english else "ទាំងអស់"}
+    days = st.selectbox("Period" if english else "រយៈពេល", list(periods), format_func=periods.get,
+                        key="trends_period")
+    trends = get_report_store().trends(days)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Reports" if english else "ការរាយការណ៍", trends['total'])
+    with col2:
+        mean = trends['mean_accuracy']
+        st.metric("Mean accuracy" if english else "ភាពត្រឹមត្រូវជាមធ្យម", f"{mean:.0f}%" if mean is not None else "-")
+    with col3:
+        # The category with the biggest rise over the previous period
+        previous = trends['previous_by_category']
+        rises = {category: count - previous.get(category, 0) for category, count in trends['by_category'].items()}
+        spiking = max(rises, key=rises.get) if days and rises and max(rises.values()) > 0 else None
+        st.metric("Spiking" if english else "កំពុងកើនឡើង", spiking or "-",
+                  delta=f"+{rises[spiking]}" if spiking else None)
+    
+    if trends['total']:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("**By category**" if english else "**តាមប្រភេទ**")
+            st.bar_chart(trends['by_category'], horizontal=True)
+        with col2:
+            st.markdown("**By content type**" if english else "**តាមប្រភេទមាតិកា**")
+            st.bar_chart(trends['by_type'], horizontal=True)
+        st.markdown("**Reports per day**" if english else "**ការរាយការណ៍ក្នុងមួយថ្ងៃ**")
+        st.line_chart({'date': [day for day, _ in trends['by_day']],
+                       'reports': [count for _, count in trends['by_day']]}, x='date', y='reports')
+    else:
+        st.info("No reports in this period." if english else "គ្មានការរាយការណ៍ក្នុងរយៈពេលនេះទេ។")
+    
+    if trends['top_reporters']:
+        st.markdown("**Top reporters**" if english else "**អ្នករាយការណ៍ច្រើនជាងគេ**")
+        st.dataframe({"Reporter" if english else "អ្នករាយការណ៍": [user for user, _ in trends['top_reporters']],
+                      "Reports" if english else "ការរាយការណ៍": [count for _, count in trends['top_reporters']]},
+                     hide_index=True, use_container_width=True)
+
+def community_tab():
     st.header("Community Hub")
     
     if st.session_state.language == 'Khmer':
@@ -848,41 +1326,14 @@ with tab4:
     else:
         st.markdown("**Community-reported AI content and scams in Cambodia**")
     
-    # Display existing reports in a feed format
-    if st.session_state.language == 'Khmer':
-        st.subheader("📊 ការរាយការណ៍សហគមន៍")
-    else:
-        st.subheader("📊 Community Reports Feed")
+    community_feed()
     
-    for report in reversed(st.session_state.community_reports):
-        with st.container():
-            st.markdown(f"""
-            <div class="report-card">
-                <div class="user-info">
-                    <div class="user-avatar">{report['user'][0]}</div>
-                    <div>
-                        <strong>{report['user']}</strong>
-                        <span>• {report['date']}</span>
-                        <span class="accuracy-badge {get_accuracy_class(report['accuracy'])}">
-                            {report['accuracy']}% accurate
-                        </span>
-                    </div>
-                </div>
-                <h4>{report['type']}: {report['description']}</h4>
-                <p><strong>Category:</strong> {report['category']}</p>
-                <div class="khmer-explanation">
-                    <strong>🇰🇭 Explanation:</strong> {report['explanation']}
-                </div>
-                <div style="display: flex; gap: 15px; margin-top: 10px;">
-                    <span>👍 {report['likes']}</span>
-                    <span>💬 {report['comments']} comments</span>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # Add audio button for each report
-            if st.button("🔊 Listen to Report", key=f"audio_report_{report['id']}"):
-                play_audio(f"{report['description']}. {report['explanation']}")
+    # The charts are only built while the expander is open
+    trends = st.expander("📈 Trends" if st.session_state.language == 'English' else "📈 និន្នាការ",
+                         key="trends_open", on_change="rerun")
+    with trends:
+        if trends.open:
+            community_analytics()
     
     # Add new report section (initially hidden)
     if st.session_state.language == 'Khmer':
@@ -904,13 +1355,12 @@ with tab4:
         
         with st.form("report_form"):
             if st.session_state.language == 'Khmer':
-                content_type = st.selectbox("ប្រភេទមាតិកា", ["Image", "Video", "News", "Social Media Post"])
+                content_type = st.selectbox("ប្រភេទមាតិកា", REPORT_TYPES)
                 description = st.text_area("ការពិពណ៌នា", value=prefilled_description, 
                                           placeholder="ពិពណ៌នាអំពីមាតិកាក្លែងក្លាយ...")
                 khmer_explanation = st.text_area("ការពន្យល់ជាភាសាខ្មែរ", value=prefilled_explanation, 
                                                 placeholder="ពន្យល់ជាភាសាខ្មែរ...")
-                category = st.selectbox("ប្រភេទ", ["Social Media Scam", "Political Misinformation", 
-                                                   "Commercial Fraud", "Health Misinformation"])
+                category = st.selectbox("ប្រភេទ", REPORT_CATEGORIES)
                 
                 # Only show accuracy slider if not prefilled from detection
                 if st.session_state.report_to_share:
@@ -921,13 +1371,12 @@ with tab4:
                 
                 submit_text = "🚀 ដាក់ស្នើការរាយការណ៍"
             else:
-                content_type = st.selectbox("Content Type", ["Image", "Video", "News", "Social Media Post"])
+                content_type = st.selectbox("Content Type", REPORT_TYPES)
                 description = st.text_area("Description", value=prefilled_description, 
                                           placeholder="Describe the fake content...")
                 khmer_explanation = st.text_area("Khmer Explanation", value=prefilled_explanation, 
                                                 placeholder="Explain in Khmer...")
-                category = st.selectbox("Category", ["Social Media Scam", "Political Misinformation", 
-                                                   "Commercial Fraud", "Health Misinformation"])
+                category = st.selectbox("Category", REPORT_CATEGORIES)
                 
                 # Only show accuracy slider if not prefilled from detection
                 if st.session_state.report_to_share:
@@ -943,7 +1392,6 @@ with tab4:
                 fake_users = ["Livhoung.H", "Pich H.", "Socheata.S", "Dara K.", "Sophea M."]
                 
                 new_report = {
-                    'id': max([r['id'] for r in st.session_state.community_reports], default=0) + 1,
                     'type': content_type,
                     'description': description,
                     'explanation': khmer_explanation,
@@ -954,16 +1402,30 @@ with tab4:
                     'likes': random.randint(5, 50),
                     'comments': random.randint(1, 15)
                 }
-                st.session_state.community_reports.append(new_report)
+                shared = st.session_state.report_to_share
+                if shared and shared.get('hashes'):
+                    # Stored with the report, so future uploads of the image
+                    # link to it on every server process
+                    new_report['image_hashes'] = shared['hashes']
+                with metrics.timed('report_submit'):
+                    new_report = get_report_store().add(new_report)
+                    # Cluster it right away, so the feed shows it grouped
+                    get_text_index().sync_reports(get_report_store())
+                    metrics.REPORTS_SUBMITTED.inc(content_type)
+                    st.session_state.feed_cursors = [None]
                 
-                # Clear the shared report if it was used
-                if st.session_state.report_to_share:
-                    st.session_state.report_to_share = None
+                    # Clear the shared report if it was used
+                    if shared:
+                        if shared.get('hashes'):
+                            get_hash_index().sync_reports(get_report_store())
+                            if shared.get('cache_key'):
+                                get_result_cache().delete(shared['cache_key'])
+                        st.session_state.report_to_share = None
                     
                 st.success("✅ Report submitted successfully!")
                 st.rerun()
 
-with tab5:
+def learning_hub_tab():
     st.header("Learning Resources")
     
     if st.session_state.language == 'Khmer':
@@ -978,97 +1440,25 @@ with tab5:
         inner_tabs = st.tabs(["🔍 Detection Tips", "🚨 Common Scams", "🛡️ Protection Guide", "❓ FAQ"])
     
     with inner_tabs[0]:
-        if st.session_state.language == 'Khmer':
-            content = """
-            ### របៀបកំណត់អត្តសញ្ញាណមាតិកាដែលបង្កើតដោយ AI
-            
-            **សម្រាប់រូបភាព:**
-            - ស្វែងរកវាយនភាពស្បែកដែលមិនធម្មជាតិ
-            - ពិនិត្យមើលពន្លឺ និងស្រមោលដែលមិនស្របគ្នា
-            - កត់សម្គាល់លក្ខណៈមុខដែលមិនស៊ីមេទ្រី
-            - មើលឃើញដៃ ឬម្រាមដៃដែលមានរូបរាងចម្លែក
-            """
-        else:
-            content = """
-            ### How to Spot AI-Generated Content
-            
-            **For Images:**
-            - Look for unnatural skin textures
-            - Check for inconsistent lighting and shadows
-            - Notice asymmetrical facial features
-            - Watch for strange hands or fingers
-            """
-        
+        content = LESSONS['tips'][st.session_state.language]
         st.markdown(content)
         if st.button("🔊 Listen to Tips", key="audio_tips1"):
             play_audio(content)
     
     with inner_tabs[1]:
-        if st.session_state.language == 'Khmer':
-            content = """
-            ### ការបោកប្រាស់ AI ធម្មតានៅកម្ពុជា
-            
-            **ការបោកប្រាស់តាមបណ្តាញសង្គម:**
-            - ការផ្សាយក្លែងក្លាយពីតារាល្បី
-            - ការផ្តល់ជូនល្អពេក
-            - សារបន្ទាន់
-            """
-        else:
-            content = """
-            ### Common AI Scams in Cambodia
-            
-            **Social Media Scams:**
-            - Fake celebrity endorsements
-            - Too-good-to-be-true offers
-            - Urgency-based messages
-            """
-        
+        content = LESSONS['scams'][st.session_state.language]
         st.markdown(content)
         if st.button("🔊 Listen to Scam Info", key="audio_scams"):
             play_audio(content)
     
     with inner_tabs[2]:
-        if st.session_state.language == 'Khmer':
-            content = """
-            ### របៀបការពារខ្លួនអ្នក
-            
-            **គន្លឹះទូទៅ:**
-            - ត្រួតពិនិត្យប្រភពឱ្យបានច្បាស់
-            - កុំចែករំលែកមាតិកាដែលមិនទាន់បានផ្ទៀងផ្ទាត់
-            - ប្រើប្រភពច្រើនសម្រាប់ព័ត៌មានសំខាន់
-            - សង្ស័យចំពោះសារបន្ទាន់
-            """
-        else:
-            content = """
-            ### How to Protect Yourself
-            
-            **General Tips:**
-            - Always verify sources
-            - Don't share unverified content
-            - Use multiple sources for important news
-            - Be skeptical of urgent messages
-            """
-        
+        content = LESSONS['protection'][st.session_state.language]
         st.markdown(content)
         if st.button("🔊 Listen to Protection Tips", key="audio_protection"):
             play_audio(content)
     
     with inner_tabs[3]:
-        if st.session_state.language == 'Khmer':
-            content = """
-            ### សំណួរដែលសួរញឹកញាប់
-            
-            **Q: តើឧបករណ៍កំណត់អត្តសញ្ញាណ AI ត្រឹមត្រូវប៉ុន្មាន?**
-            A: ឧបករណ៍របស់យើងផ្តល់នូវការប៉ាន់ស្មានដោយផ្អែកលើលំនាំ AI ធម្មតា។ ត្រូវប្រើវិធីសាស្ត្រផ្ទៀងផ្ទាត់ច្រើនជានិច្ច។
-            """
-        else:
-            content = """
-            ### Frequently Asked Questions
-            
-            **Q: How accurate is the AI detection?**
-            A: Our tool provides estimates based on common AI patterns. Always use multiple verification methods.
-            """
-        
+        content = LESSONS['faq'][st.session_state.language]
         st.markdown(content)
         if st.button("🔊 Listen to FAQ", key="audio_faq"):
             play_audio(content)
@@ -1087,12 +1477,33 @@ with tab5:
     
     # Add register button in the learning hub as well
     if st.button("📝 Register for Workshops", key="register_learning", use_container_width=True):
-        st.session_state.registered_workshops = ["Phnom Penh - Sept 15, 2025", "Siem Reap - Sept 22, 2025"]
+        register_for_workshops()
         st.success("Registered for all upcoming workshops!")
     
     # Show registration status
     if st.session_state.registered_workshops:
         st.success(f"You are registered for: {', '.join(st.session_state.registered_workshops)}")
+    st.caption(" · ".join(f"{workshop}: {count} registered" for workshop, count in workshop_registrations().items()))
+
+with tab1:
+    if tab1.open:
+        media_detection_tab()
+
+with tab2:
+    if tab2.open:
+        news_verification_tab()
+
+with tab3:
+    if tab3.open:
+        learning_game_tab()
+
+with tab4:
+    if tab4.open:
+        community_tab()
+
+with tab5:
+    if tab5.open:
+        learning_hub_tab()
 
 # Footer without logo
 st.divider()
@@ -0,0 +1 @@
+"""Performance benchmarks for the CAP app (run from the repository root)."""
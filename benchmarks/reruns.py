@@ -0,0 +1,250 @@
+"""Rerun latency benchmarks, driving app.py headlessly with AppTest.
+
+Each scenario opens the app, gets it into the right state and then
+times one interaction (a click, a tab switch, a form submit) several
+times. The median wall time, and the memory that app.py and the cap
+package allocated during the interaction and still hold after it, are
+compared with the stored baselines:
+
+    python -m benchmarks.reruns                  # compare, exit 1 on a regression
+    python -m benchmarks.reruns --update         # record new baselines
+    python -m benchmarks.reruns feed_10000 -r 9  # one scenario, more repeats
+
+Everything runs against a throwaway data directory, so the benchmark
+never touches the real report database or result cache.
+
+Memory is counted from allocations with an app.py or cap/ frame on
+their stack. Streamlit's own work, including AppTest compiling app.py
+afresh on every run (the server compiles it once), is left out.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# cap.config reads its settings on import, so point it at a scratch
+# directory before anything imports the app
+os.environ["CAP_DATA_DIR"] = tempfile.mkdtemp(prefix="cap-bench-")
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from cap import resources  # noqa: E402
+from cap.store import ReportStore  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+NEWS_TAB = "📰 Check News"
+GAME_TAB = "🎮 Learn to Spot"
+COMMUNITY_TAB = "👥 Community"
+
+# Stack depth kept per allocation: enough to reach the app frame that
+# called into Streamlit, pandas or SQLite
+TRACE_FRAMES = 32
+APP_FRAMES = [tracemalloc.Filter(True, APP, all_frames=True),
+              tracemalloc.Filter(True, os.path.join(ROOT, "cap", "*"), all_frames=True)]
+# Traced steps per scenario; some (a random challenge) vary from run to run
+MEMORY_PASSES = 3
+
+SAMPLE_TEXT = "BREAKING!!! Share before it gets deleted: free money for everyone who registers today"
+
+
+def open_tab(at, label):
+    at.session_state["main_tab"] = label
+    at.run()
+
+
+def by_label(widgets, *labels):
+    """The widget with one of ``labels`` (one per language)"""
+    return next(widget for widget in widgets if widget.label in labels)
+
+
+def fill_feed(size):
+    """Grow the shared report database to ``size`` reports"""
+    store = ReportStore()
+    missing = size - store.count()
+    if missing > 0:
+        store.import_reports({
+            'type': 'News',
+            'description': f"Benchmark report {number}: fake giveaway shared on Facebook",
+            'explanation': "ព័ត៌មានក្លែងក្លាយអំពីការចែកលុយ",
+            'category': 'Social Media Scam',
+            'user': 'bench',
+            'accuracy': 80,
+        } for number in range(missing))
+
+
+# Scenario: (prepare(at), step(at, repeat)); only step is measured
+def _language_toggle(at, repeat):
+    at.button(key="kh_btn" if repeat % 2 == 0 else "en_btn").click().run()
+
+
+def _analyze_text(at, repeat):
+    # A new text each time so the result cache does not answer
+    at.text_area[0].input(f"{SAMPLE_TEXT} #{repeat}").run()
+    at.button(key="analyze_btn_second").click().run()
+
+
+def _prepare_challenge(at):
+    open_tab(at, GAME_TAB)
+
+
+def _play_challenge(at, repeat):
+    by_label(at.button, "🎲 Start New Challenge").click().run()
+    at.button(key="choice_a").click().run()
+    by_label(at.button, "🔄 Next Challenge").click().run()
+
+
+def _submit_report(at, repeat):
+    by_label(at.text_area, "Description", "ការពិពណ៌នា").input(f"Benchmark submission {repeat}")
+    by_label(at.button, "🚀 Submit Report", "🚀 ដាក់ស្នើការរាយការណ៍").click().run()
+
+
+def _feed(size):
+    def prepare(at):
+        fill_feed(size)
+        open_tab(at, COMMUNITY_TAB)
+
+    def step(at, repeat):
+        # Page forward and back through the feed, or just rerun if it fits on one page
+        button = at.button(key="feed_older" if repeat % 2 == 0 else "feed_newer")
+        if button.disabled:
+            at.run()
+        else:
+            button.click().run()
+    return prepare, step
+
+
+# A Khmer word typed one syllable at a time, then completed
+SEARCH_PREFIXES = ["ព័", "ព័ត៌", "ព័ត៌មា", "ព័ត៌មាន"]
+
+
+def _search_as_you_type(at, repeat):
+    query = SEARCH_PREFIXES[repeat % len(SEARCH_PREFIXES)]
+    at.text_input(key="feed_query").input(query).run()
+    if not any('report-card' in block.value for block in at.markdown):
+        raise RuntimeError(f"search_khmer_prefix: no reports found for {query!r}")
+
+
+SCENARIOS = {
+    'language_toggle': (lambda at: None, _language_toggle),
+    'analyze_text': (lambda at: open_tab(at, NEWS_TAB), _analyze_text),
+    'play_challenge': (_prepare_challenge, _play_challenge),
+    'submit_report': (lambda at: open_tab(at, COMMUNITY_TAB), _submit_report),
+    # Feed sizes grow in place, so these run smallest first
+    'feed_10': _feed(10),
+    'feed_1000': _feed(1000),
+    'feed_10000': _feed(10000),
+    'search_khmer_prefix': (lambda at: open_tab(at, COMMUNITY_TAB), _search_as_you_type),
+}
+
+
+def run_scenario(name, repeats, timeout):
+    """Median wall time (ms) and memory the app kept (KiB) of one scenario"""
+    prepare, step = SCENARIOS[name]
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    at.run()
+    prepare(at)
+    step(at, 0)  # warm-up: imports, cache_resource, first render
+    if at.exception:
+        raise RuntimeError(f"{name}: {at.exception[0].message}")
+    timings = []
+    for repeat in range(1, repeats + 1):
+        started = time.perf_counter()
+        step(at, repeat)
+        timings.append((time.perf_counter() - started) * 1000)
+    # Memory is measured on separate passes, tracing slows everything down
+    allocations = [app_allocations(at, step, repeat)
+                   for repeat in range(repeats + 1, repeats + 1 + MEMORY_PASSES)]
+    if at.exception:
+        raise RuntimeError(f"{name}: {at.exception[0].message}")
+    return {'time_ms': round(statistics.median(timings), 1),
+            'alloc_kib': round(statistics.median(allocations))}
+
+
+def app_allocations(at, step, repeat):
+    """KiB allocated by app.py and cap/ code during one step and still held after it"""
+    tracemalloc.start(TRACE_FRAMES)
+    try:
+        step(at, repeat)
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    snapshot = snapshot.filter_traces(APP_FRAMES)
+    return sum(stat.size for stat in snapshot.statistics('filename')) / 1024
+
+
+def load_baselines(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def regressions(name, result, baseline, tolerance, min_time_ms, min_alloc_kib):
+    """Human-readable descriptions of how ``result`` is worse than ``baseline``"""
+    problems = []
+    for metric, floor, unit in (('time_ms', min_time_ms, 'ms'), ('alloc_kib', min_alloc_kib, 'KiB')):
+        if metric not in baseline:
+            continue
+        before, after = baseline[metric], result[metric]
+        # Small absolute changes are noise, however large in relative terms
+        if after > before * (1 + tolerance) and after - before > floor:
+            problems.append(f"{name}: {metric} {before} -> {after} {unit} (+{(after / before - 1) * 100:.0f}%)")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.reruns", description=__doc__.splitlines()[0])
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument('-r', '--repeats', type=int, default=5, help="timed repeats per scenario")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown or memory growth as a fraction of the baseline")
+    parser.add_argument('--min-time-ms', type=float, default=20.0,
+                        help="ignore time regressions smaller than this")
+    parser.add_argument('--min-alloc-kib', type=float, default=128.0,
+                        help="ignore memory regressions smaller than this")
+    parser.add_argument('--baselines', default=BASELINES, help="baseline file")
+    parser.add_argument('--update', action='store_true', help="store the results as the new baselines")
+    parser.add_argument('--timeout', type=float, default=60.0, help="seconds allowed per app run")
+    args = parser.parse_args(argv)
+    unknown = sorted(set(args.scenarios) - set(SCENARIOS))
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+
+    names = [name for name in SCENARIOS if not args.scenarios or name in args.scenarios]
+    # Load the shared resources now rather than in the app's background
+    # thread, so no scenario times them and none races the script's
+    # compilation (ast.parse is not thread-safe before Python 3.11.8)
+    resources.warm_up()
+    baselines = load_baselines(args.baselines)
+    results, problems = {}, []
+    print(f"{'scenario':<18}{'time ms':>10}{'baseline':>10}{'app KiB':>10}{'baseline':>10}")
+    for name in names:
+        result = results[name] = run_scenario(name, args.repeats, args.timeout)
+        baseline = baselines.get(name, {})
+        print(f"{name:<18}{result['time_ms']:>10}{baseline.get('time_ms', '-'):>10}"
+              f"{result['alloc_kib']:>10}{baseline.get('alloc_kib', '-'):>10}")
+        problems += regressions(name, result, baseline, args.tolerance, args.min_time_ms, args.min_alloc_kib)
+
+    if args.update:
+        baselines.update(results)
+        with open(args.baselines, 'w', encoding='utf-8') as file:
+            json.dump(baselines, file, indent=2, sort_keys=True)
+            file.write('\n')
+        print(f"Baselines written to {args.baselines}")
+        return 0
+    for problem in problems:
+        print(f"REGRESSION {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
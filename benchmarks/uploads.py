@@ -0,0 +1,172 @@
+"""Memory benchmark for the upload path: read, hash, preview and analyze.
+
+Each scenario writes a synthetic upload (a large noisy JPEG or PNG, an
+MP4) and processes it in a fresh child process the way the Detect Media
+tab does: the bytes arrive as an in-memory file, ``cap.upload.Upload``
+takes them, hashes them for the cache key, decodes a preview and runs
+the analysis. Peak RSS is read from the child after each stage, so it
+covers that one upload only:
+
+    python -m benchmarks.uploads                   # all scenarios
+    python -m benchmarks.uploads jpeg_12mp mp4     # some of them
+
+"Python" is the peak of Python-level allocations (tracemalloc) while
+the upload is handled, as a multiple of the file size: 1.0x means the
+upload was never copied. "handled" and "analyzed" are the peak RSS
+growth over the process before the upload arrived, after reading,
+hashing and previewing, and after the full analysis; the decoded
+working copy and the forensic arrays come on top of the file itself.
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+# Synthetic uploads: (file name, how to write it)
+_RNG_SEED = 7
+
+
+def _noise(width, height):
+    rng = np.random.default_rng(_RNG_SEED)
+    # Smooth gradients plus noise compress like a photo, not like static
+    y, x = np.mgrid[0:height, 0:width]
+    base = ((x / width + y / height) * 96).astype(np.int16)[..., None]
+    pixels = base + rng.integers(0, 160, (height, width, 3), dtype=np.int16)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def _write_image(format, width, height, **options):
+    def write(path):
+        _noise(width, height).save(path, format, **options)
+    return write
+
+
+def _write_mp4(path, width=1280, height=720, frames=150):
+    import av
+
+    rng = np.random.default_rng(_RNG_SEED)
+    with av.open(path, 'w', format='mp4') as container:
+        stream = container.add_stream('mpeg4', rate=25)
+        stream.width, stream.height, stream.pix_fmt = width, height, 'yuv420p'
+        stream.bit_rate = 8_000_000
+        for _ in range(frames):
+            pixels = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+            for packet in stream.encode(av.VideoFrame.from_ndarray(pixels, format='rgb24')):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+
+
+SCENARIOS = {
+    'jpeg_12mp': ('upload.jpg', 'image/jpeg', _write_image('JPEG', 4000, 3000, quality=95)),
+    'jpeg_24mp': ('upload.jpg', 'image/jpeg', _write_image('JPEG', 6000, 4000, quality=95)),
+    'png_6mp': ('upload.png', 'image/png', _write_image('PNG', 3000, 2000)),
+    'mp4': ('upload.mp4', 'video/mp4', _write_mp4),
+}
+
+
+def _reset_peak_rss():
+    """Start a new peak RSS measurement (Linux only; elsewhere the peak covers the whole process)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+    except OSError:
+        pass
+
+
+def _rss():
+    """Current and peak resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/status') as file:
+            fields = dict(line.split(':', 1) for line in file)
+        return int(fields['VmRSS'].split()[0]) * 1024, int(fields['VmHWM'].split()[0]) * 1024
+    except (OSError, KeyError):
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak if sys.platform == 'darwin' else peak * 1024
+        return peak, peak
+
+
+def child(path, mime_type):
+    """Handle one upload in this process and print its measurements as JSON"""
+    from cap.detection import analyze_image, analyze_video
+    from cap.ingest import ingest_image
+    from cap.upload import Upload
+
+    # Load the decoders and detection resources on something tiny first,
+    # so their one-off memory is not counted against the upload
+    warm = io.BytesIO()
+    _noise(64, 64).save(warm, 'PNG')
+    analyze_image(warm.getvalue())
+    _reset_peak_rss()
+    before = _rss()[0]
+
+    tracemalloc.start()
+    with open(path, 'rb') as file:
+        # What Streamlit hands the script: a BytesIO over the received bytes
+        uploaded = io.BytesIO(file.read())
+    uploaded.name, uploaded.type = os.path.basename(path), mime_type
+    size = len(uploaded.getvalue())
+    upload = Upload.read(uploaded)
+    upload.key
+    if not upload.is_video:
+        ingest_image(upload.open()).thumbnail()
+    python_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    handled = _rss()[1]
+
+    if upload.is_video:
+        analyze_video(upload.data)
+    else:
+        analyze_image(upload.data)
+    analyzed = _rss()[1]
+    print(json.dumps({'size': size, 'python': python_peak, 'handled': handled - before,
+                      'analyzed': analyzed - before}))
+
+
+def run_scenario(name, directory):
+    file_name, mime_type, write = SCENARIOS[name]
+    path = os.path.join(directory, f"{name}-{file_name}")
+    if not os.path.exists(path):
+        write(path)
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.uploads', '--child', path, mime_type],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.uploads", description=__doc__.splitlines()[0])
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument('--child', nargs=2, metavar=('PATH', 'TYPE'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        child(*args.child)
+        return 0
+    unknown = sorted(set(args.scenarios) - set(SCENARIOS))
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+
+    mib = 1024 * 1024
+    print(f"{'scenario':<12}{'file MiB':>10}{'Python':>10}{'handled MiB':>13}{'analyzed MiB':>14}")
+    with tempfile.TemporaryDirectory(prefix="cap-uploads-") as directory:
+        for name in SCENARIOS:
+            if args.scenarios and name not in args.scenarios:
+                continue
+            result = run_scenario(name, directory)
+            size = result['size']
+            print(f"{name:<12}{size / mib:>10.1f}{result['python'] / size:>9.2f}x"
+                  f"{result['handled'] / mib:>13.1f}{result['analyzed'] / mib:>14.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
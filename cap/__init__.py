@@ -0,0 +1 @@
+"""Backend helpers for the CAP - Check, Analyze, Practice app."""
@@ -0,0 +1,107 @@
+"""Pre-optimized static images.
+
+The images shipped with the app (logo, banner, ...) are far larger than
+anything the page displays. The first time an image is asked for at a
+given width, a resized WebP and an optimized PNG (JPEG for opaque
+photos) are written to the asset cache directory, and the smaller of
+the two is served from then on. Variant names carry the original's
+mtime, so replacing an image regenerates its variants, and base64 data
+URIs are memoized on the same mtime.
+"""
+import base64
+import glob
+import os
+import threading
+from functools import lru_cache
+
+from PIL import Image
+
+from cap import config
+
+_MIME_TYPES = {'.webp': 'image/webp', '.png': 'image/png', '.jpg': 'image/jpeg'}
+_lock = threading.Lock()
+
+
+def source_path(name):
+    return os.path.join(config.ASSET_DIR, name)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _save(image, path, format, **params):
+    # Write next to the target and rename, so other processes never see half a file
+    partial = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    image.save(partial, format, **params)
+    os.replace(partial, path)
+
+
+def _write_variants(source, width, prefix):
+    with Image.open(source) as image:
+        transparent = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if transparent else 'RGB')
+    if width and image.width > width:
+        image = image.resize((width, max(round(image.height * width / image.width), 1)), Image.LANCZOS)
+    webp, fallback = prefix + '.webp', prefix + ('.png' if transparent else '.jpg')
+    _save(image, webp, 'WEBP', quality=85, method=6)
+    if transparent:
+        _save(image, fallback, 'PNG', optimize=True)
+    else:
+        _save(image, fallback, 'JPEG', quality=85, optimize=True, progressive=True)
+    return [webp, fallback]
+
+
+@lru_cache(maxsize=64)
+def _best_variant(name, width, mtime):
+    base = os.path.join(config.ASSET_CACHE_DIR, f"{os.path.splitext(name)[0]}-{width or 'full'}-")
+    prefix = f"{base}{mtime}"
+    with _lock:
+        variants = [path for path in glob.glob(glob.escape(prefix) + '.*')
+                    if os.path.splitext(path)[1] in _MIME_TYPES]
+        if len(variants) < 2:
+            os.makedirs(config.ASSET_CACHE_DIR, exist_ok=True)
+            # Variants of an older copy of the image are no longer needed
+            for stale in glob.glob(glob.escape(base) + '*'):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+            variants = _write_variants(source_path(name), width, prefix)
+    return min(variants, key=os.path.getsize)
+
+
+def best_variant(name, width=None):
+    """Path of the smallest variant of asset ``name`` at most ``width`` pixels wide.
+
+    Returns None when the asset does not exist.
+    """
+    mtime = _mtime(source_path(name))
+    if mtime is None:
+        return None
+    return _best_variant(name, width or 0, mtime)
+
+
+@lru_cache(maxsize=64)
+def _encoded(path, mtime):
+    with open(path, 'rb') as file:
+        return base64.b64encode(file.read()).decode()
+
+
+def base64_of_file(path):
+    """Base64 of a file's contents, read again only after the file changes"""
+    mtime = _mtime(path)
+    if mtime is None:
+        return None
+    return _encoded(path, mtime)
+
+
+def data_uri(name, width=None):
+    """``data:`` URI of the smallest variant of asset ``name``, for inline HTML"""
+    path = best_variant(name, width)
+    if path is None:
+        return None
+    return f"data:{_MIME_TYPES[os.path.splitext(path)[1]]};base64,{base64_of_file(path)}"
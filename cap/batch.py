@@ -0,0 +1,132 @@
+"""Streaming batch scoring for CSV and JSONL files of texts.
+
+Rows are read lazily, scored a batch at a time and written straight to
+an output file, so memory stays bounded by the batch size no matter how
+large the input is.
+"""
+import csv
+import io
+import json
+import os
+from itertools import islice
+
+# Column names tried, in order, when the caller does not name one
+TEXT_FIELDS = ('text', 'content', 'message', 'body', 'news')
+BATCH_SIZE = 256
+
+
+def file_format(name):
+    """'csv', 'jsonl' or 'lines' (one text per line), judged from the file name"""
+    ext = os.path.splitext(name)[1].lower()
+    if ext in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    if ext in ('.csv', '.tsv'):
+        return 'csv'
+    if ext == '.txt':
+        return 'lines'
+    raise ValueError(f"Unsupported file type: {ext or name}")
+
+
+def _pick_field(fields, text_field):
+    if text_field:
+        if text_field not in fields:
+            raise ValueError(f"Column '{text_field}' not found")
+        return text_field
+    lowered = {f.lower(): f for f in fields}
+    for candidate in TEXT_FIELDS:
+        if candidate in lowered:
+            return lowered[candidate]
+    return fields[0]
+
+
+def iter_rows(binary_file, fmt, text_field=None):
+    """Yield ``(record, text)`` pairs from a binary file object.
+
+    ``record`` is the original row (a dict) so it can be written back out
+    with the scores appended. JSONL lines may also be bare strings.
+    """
+    stream = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            sample = stream.read(4096)
+            stream.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+            except csv.Error:
+                dialect = csv.excel
+            reader = csv.DictReader(stream, dialect=dialect)
+            if not reader.fieldnames:
+                return
+            field = _pick_field(reader.fieldnames, text_field)
+            for record in reader:
+                # Cells beyond the header row would land under a None key
+                record.pop(None, None)
+                yield record, record.get(field) or ''
+        elif fmt == 'lines':
+            for line in stream:
+                line = line.rstrip('\r\n')
+                if line.strip():
+                    yield {'text': line}, line
+        else:
+            field = None
+            for line in stream:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    record = {'text': str(record)}
+                if field is None:
+                    field = _pick_field(list(record), text_field)
+                yield record, str(record.get(field) or '')
+    finally:
+        # Leave the caller's file open
+        stream.detach()
+
+
+def batched(iterable, size=BATCH_SIZE):
+    """Split an iterable into lists of at most ``size`` items"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def score_rows(rows, score_batch, batch_size=BATCH_SIZE):
+    """Score ``(record, text)`` pairs, yielding one list of scored records per batch.
+
+    ``score_batch`` takes a list of texts and returns a list of result
+    dicts with at least ``score`` and ``verdict``.
+    """
+    for batch in batched(rows, batch_size):
+        results = score_batch([text for _, text in batch])
+        scored = []
+        for (record, _), result in zip(batch, results):
+            record = dict(record)
+            record['fake_score'] = result['score']
+            record['verdict'] = result['verdict']
+            record['indicators'] = '; '.join(sorted({m[2] for m in result.get('matches', [])}))
+            scored.append(record)
+        yield scored
+
+
+class ScoredWriter:
+    """Write scored records as CSV, or as JSONL for any other format"""
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        self._csv = None
+
+    def write(self, records):
+        for record in records:
+            if self.fmt != 'csv':
+                self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+                continue
+            if self._csv is None:
+                self._csv = csv.DictWriter(self.stream, fieldnames=list(record),
+                                           extrasaction='ignore')
+                self._csv.writeheader()
+            self._csv.writerow(record)
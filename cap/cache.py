@@ -0,0 +1,185 @@
+"""Content-addressed cache for detection results.
+
+Results are keyed by a hash of what was analyzed (the uploaded bytes or
+the normalized text), so the same viral screenshot or forwarded message
+is only analyzed once. Entries live in an in-memory LRU and, optionally,
+in a SQLite file that is shared by every session and survives restarts,
+or in the shared state (Redis) when several replicas serve the app.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from cap import config
+
+# Hashing reads large uploads in slices so no extra copy is made
+_CHUNK = 1 << 20
+_SPACES = re.compile(r"\s+")
+# Where results live in the shared state
+_STATE_PREFIX = "results:"
+
+
+def content_key(data, namespace="image"):
+    """Cache key for raw bytes (or any buffer) such as an uploaded file"""
+    digest = hashlib.sha256()
+    view = memoryview(data)
+    for start in range(0, len(view), _CHUNK):
+        digest.update(view[start:start + _CHUNK])
+    return f"{namespace}:{digest.hexdigest()}"
+
+
+def normalize_text(text):
+    """Normalize text so trivially different copies share a key"""
+    text = unicodedata.normalize("NFC", text)
+    return _SPACES.sub(" ", text).strip().casefold()
+
+
+def text_key(text, namespace="text"):
+    """Cache key for a piece of text, after normalization"""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8"))
+    return f"{namespace}:{digest.hexdigest()}"
+
+
+class ResultCache:
+    """LRU + TTL cache with an optional SQLite or shared-state tier behind it.
+
+    ``max_entries`` bounds the in-memory tier and ``max_disk_entries``
+    the file; a ``state`` backend (``cap.state``) replaces the file and
+    expires entries itself. Every tier drops entries older than ``ttl``
+    seconds. Values must be JSON serializable when a second tier is used.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, path=None, max_disk_entries=None, state=None):
+        self.max_entries = max_entries or config.CACHE_MAX_ENTRIES
+        self.ttl = ttl or config.CACHE_TTL
+        self.max_disk_entries = max_disk_entries or config.CACHE_MAX_DISK_ENTRIES
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db = None
+        self._state = state
+        if path and state is None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=10, check_same_thread=False,
+                                       isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_expiry ON results (expires_at)")
+
+    def get(self, key):
+        """Return the cached value for ``key`` or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM results WHERE key = ? AND expires_at > ?",
+                    (key, now)).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+            if self._state is None:
+                self.misses += 1
+                return None
+        # A network round trip, so other threads are not held up meanwhile
+        raw = self._state.get(_STATE_PREFIX + key)
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return None
+            value = json.loads(raw)
+            self._remember(key, value, now + self.ttl)
+            self.hits += 1
+            self.disk_hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store ``value`` in both tiers"""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires_at))
+                self._writes += 1
+                if self._writes % 100 == 0:
+                    self._prune_disk()
+        if self._state is not None:
+            self._state.set(_STATE_PREFIX + key, json.dumps(value, ensure_ascii=False), self.ttl)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _prune_disk(self):
+        self._db.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),))
+        self._db.execute("""
+            DELETE FROM results WHERE key IN (
+                SELECT key FROM results ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_disk_entries,))
+
+    def delete(self, key):
+        """Drop ``key`` from both tiers"""
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+        if self._state is not None:
+            self._state.delete(_STATE_PREFIX + key)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+        if self._state is not None:
+            self._state.clear(_STATE_PREFIX)
+
+    def stats(self):
+        """Hit/miss counters and current sizes"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._memory),
+            }
@@ -0,0 +1,125 @@
+"""Spot-the-AI practice challenges for the Learn to Spot game.
+
+The challenge bank is read once from a JSON Lines file (one challenge
+per line with ``id``, ``type``, ``difficulty`` and the question fields)
+and indexed by difficulty and by type and difficulty.
+
+Each session walks each bucket in a shuffled order, without repeats
+until it has seen every challenge in it. The order is an affine permutation
+``(a * i + b) mod n`` with ``a`` coprime to ``n``, so a session only
+stores three integers per bucket and picking the next challenge is O(1)
+however large the bank is.
+"""
+import json
+import os
+import random
+from math import gcd
+
+from cap import resources
+
+DEFAULT_BANK = os.path.join(os.path.dirname(__file__), "data", "challenges.jsonl")
+
+# Accuracy so far that moves a player up or down a level
+LEVEL_UP_ACCURACY = 0.8
+LEVEL_DOWN_ACCURACY = 0.5
+MIN_GAMES_TO_ADAPT = 3
+
+
+def load_challenges(path=DEFAULT_BANK):
+    """Read challenges from a JSON Lines file, skipping blank lines"""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def target_difficulty(score, played, levels, current=None):
+    """The difficulty to play next, given the player's record so far.
+
+    Players start on the easiest level and move one level up or down
+    when their accuracy is clearly high or low.
+    """
+    levels = sorted(levels)
+    level = current if current in levels else levels[0]
+    if played < MIN_GAMES_TO_ADAPT:
+        return level
+    position = levels.index(level)
+    accuracy = score / played
+    if accuracy >= LEVEL_UP_ACCURACY:
+        position = min(position + 1, len(levels) - 1)
+    elif accuracy < LEVEL_DOWN_ACCURACY:
+        position = max(position - 1, 0)
+    return levels[position]
+
+
+class ChallengeBank:
+    """Challenges indexed by difficulty and by (type, difficulty)"""
+
+    def __init__(self, challenges):
+        self.challenges = list(challenges)
+        self._buckets = {}
+        for index, challenge in enumerate(self.challenges):
+            difficulty = int(challenge.get('difficulty', 1))
+            self._buckets.setdefault((None, difficulty), []).append(index)
+            self._buckets.setdefault((challenge['type'], difficulty), []).append(index)
+        self.difficulties = sorted({difficulty for _, difficulty in self._buckets})
+        self.types = sorted({type for type, _ in self._buckets if type is not None})
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_BANK):
+        return cls(load_challenges(path))
+
+    def __len__(self):
+        return len(self.challenges)
+
+    @staticmethod
+    def _cursor_key(type, level):
+        return f"{type or '*'}:{level}"
+
+    def next(self, cursors, difficulty=None, type=None):
+        """The next unseen challenge at ``difficulty`` (optionally of one ``type``).
+
+        When the session has seen everything at that level, the nearest
+        level with unseen challenges is used; once everything has been
+        seen, a new pass starts. ``cursors`` is a plain dict kept per
+        session (e.g. in session_state) and is updated in place.
+        """
+        difficulty = difficulty or self.difficulties[0]
+        levels = [level for level in sorted(self.difficulties, key=lambda level: (abs(level - difficulty), level))
+                  if (type, level) in self._buckets]
+        if not levels:
+            raise KeyError(f"No {type} challenges in the bank" if type else "The challenge bank is empty")
+        for level in levels:
+            cursor = cursors.get(self._cursor_key(type, level))
+            if cursor is None or cursor[2] < len(self._buckets[(type, level)]):
+                break
+        else:
+            # Everything has been seen: start a new pass at every level
+            for level in levels:
+                cursors.pop(self._cursor_key(type, level), None)
+            level, cursor = levels[0], None
+        bucket = self._buckets[(type, level)]
+        size = len(bucket)
+        if cursor is None or cursor[2] >= size:
+            # Start a new pass over the bucket in a fresh order
+            step = random.randrange(1, size) if size > 1 else 1
+            while gcd(step, size) != 1:
+                step = random.randrange(1, size)
+            cursor = [step, random.randrange(size), 0]
+        step, offset, position = cursor
+        cursor[2] = position + 1
+        cursors[self._cursor_key(type, level)] = cursor
+        return self.challenges[bucket[(step * position + offset) % size]]
+
+
+resources.register('challenge_bank', ChallengeBank.from_file, paths=(DEFAULT_BANK,))
+
+
+def get_challenge_bank():
+    """The challenge bank, loaded once per process and reloaded when its file changes"""
+    return resources.get('challenge_bank')
+
+
+def generate_spot_challenge(cursors=None, score=0, played=0, level=None):
+    """Generate a spot the AI challenge suited to the player's record"""
+    bank = get_challenge_bank()
+    difficulty = target_difficulty(score, played, bank.difficulties, level)
+    return bank.next({} if cursors is None else cursors, difficulty)
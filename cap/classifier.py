@@ -0,0 +1,194 @@
+"""Linear fake-news classifier over hashed character n-grams and words.
+
+Texts are normalized (``cap.khmer.normalize``) and cut into character
+n-grams, which works for Khmer without word boundaries as well as for
+English, and into words (Khmer segmented with ``cap.khmer``). Each
+n-gram and word is hashed straight into one of ``2 ** bits`` weights
+with a random sign (the hashing trick), so there is no vocabulary to
+store. The indicator lexicon's score is one more, dense
+feature. A logistic regression over these features gives the
+probability that a text is fake.
+
+Featurizing and scoring run on a whole batch at once: the batch is
+joined into one array of code points and every n-gram of every text is
+hashed with a few vectorized NumPy operations.
+
+Weights are kept in a small ``.npz`` file and can be retrained with
+``python -m cap train-text``.
+"""
+import json
+import os
+import re
+import zlib
+
+import numpy as np
+
+from cap import resources
+from cap.khmer import get_segmenter, normalize
+
+DEFAULT_MODEL = os.path.join(os.path.dirname(__file__), "data", "text_model.npz")
+DEFAULT_TRAINING = os.path.join(os.path.dirname(__file__), "data", "text_training.jsonl")
+DEFAULT_BITS = 18
+DEFAULT_NGRAMS = (2, 4)
+
+_BLANKS = re.compile(r"\s+")
+# Marks the start and end of each text, so n-grams see its edges and
+# never run from one text into the next
+_BOUNDARY = "\x02"
+_PRIME = np.uint64(0x100000001B3)
+_MIX1 = np.uint64(0xFF51AFD7ED558CCD)
+_MIX2 = np.uint64(0xC4CEB9FE1A85EC53)
+# Keeps word hashes apart from the n-gram hashes of the same characters
+_WORD_SALT = np.uint64(0x5744)
+
+# Labels accepted in training files
+FAKE_LABELS = {'1', 'fake', 'true', 'yes'}
+REAL_LABELS = {'0', 'real', 'reliable', 'false', 'no'}
+
+
+def _mix(h):
+    """MurmurHash3's 64-bit finalizer, element-wise"""
+    h ^= h >> np.uint64(33)
+    h *= _MIX1
+    h ^= h >> np.uint64(33)
+    h *= _MIX2
+    h ^= h >> np.uint64(33)
+    return h
+
+
+def hashed_features(texts, bits=DEFAULT_BITS, ngrams=DEFAULT_NGRAMS, words=True):
+    """Sparse n-gram (and word) features of a batch as ``(rows, columns, values)`` arrays.
+
+    Row ``i`` belongs to ``texts[i]``. Values are +-1 per n-gram or word
+    (repeats add up), scaled by 1/sqrt(features in the text) so long and
+    short texts are on the same scale.
+    """
+    framed = [_BOUNDARY + _BLANKS.sub(" ", normalize(text)).strip() + _BOUNDARY for text in texts]
+    codes = np.frombuffer("".join(framed).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    owner = np.repeat(np.arange(len(texts)), [len(text) for text in framed])
+    rows, columns, signs = [], [], []
+    low, high = ngrams
+    for size in range(low, high + 1):
+        count = len(codes) - size + 1
+        if count <= 0:
+            continue
+        # Polynomial hash of every window of ``size`` code points
+        h = np.full(count, size, dtype=np.uint64)
+        for offset in range(size):
+            h = h * _PRIME + codes[offset:offset + count]
+        h = _mix(h)
+        inside = owner[:count] == owner[size - 1:size - 1 + count]
+        h = h[inside]
+        rows.append(owner[:count][inside])
+        columns.append((h & np.uint64((1 << bits) - 1)).astype(np.int64))
+        signs.append(np.where(h >> np.uint64(63), -1.0, 1.0))
+    if words:
+        segmenter = get_segmenter()
+        tokens = [segmenter.tokens(text) for text in texts]
+        flat = [token for text_tokens in tokens for token in text_tokens]
+        if flat:
+            h = np.fromiter((zlib.crc32(token.encode("utf-8")) for token in flat),
+                            dtype=np.uint64, count=len(flat))
+            h = _mix(h ^ _WORD_SALT)
+            rows.append(np.repeat(np.arange(len(texts)), [len(text_tokens) for text_tokens in tokens]))
+            columns.append((h & np.uint64((1 << bits) - 1)).astype(np.int64))
+            signs.append(np.where(h >> np.uint64(63), -1.0, 1.0))
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+    rows, columns, values = np.concatenate(rows), np.concatenate(columns), np.concatenate(signs)
+    totals = np.bincount(rows, minlength=len(texts))
+    values /= np.sqrt(np.maximum(totals, 1))[rows]
+    return rows, columns, values
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class TextModel:
+    """Logistic regression over hashed n-grams and words plus the indicator score"""
+
+    def __init__(self, weights, bias=0.0, indicator_weight=0.0, ngrams=DEFAULT_NGRAMS, words=True):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bits = int(np.log2(len(self.weights)))
+        if len(self.weights) != 1 << self.bits:
+            raise ValueError("The number of weights must be a power of two")
+        self.bias = float(bias)
+        self.indicator_weight = float(indicator_weight)
+        self.ngrams = tuple(ngrams)
+        self.words = bool(words)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_MODEL):
+        with np.load(path) as data:
+            weights = np.zeros(1 << int(data['bits']), dtype=np.float32)
+            weights[data['indices']] = data['values']
+            # Models saved before word features existed have no 'words' entry
+            words = bool(data['words']) if 'words' in data else False
+            return cls(weights, data['bias'], data['indicator_weight'], tuple(data['ngrams']), words)
+
+    def save(self, path):
+        """Write the non-zero weights to a compressed ``.npz`` file"""
+        indices = np.flatnonzero(self.weights).astype(np.int32)
+        np.savez_compressed(path, bits=self.bits, indices=indices, values=self.weights[indices],
+                            bias=self.bias, indicator_weight=self.indicator_weight,
+                            ngrams=np.array(self.ngrams), words=self.words)
+
+    def decision(self, texts, indicator_scores=None):
+        """Logit of the fake probability for each text"""
+        rows, columns, values = hashed_features(texts, self.bits, self.ngrams, self.words)
+        logits = np.bincount(rows, self.weights[columns] * values, minlength=len(texts)) + self.bias
+        if indicator_scores is not None:
+            logits += self.indicator_weight * np.asarray(indicator_scores, dtype=np.float64) / 100
+        return logits
+
+    def predict_proba(self, texts, indicator_scores=None):
+        """Probability that each text is fake"""
+        return _sigmoid(self.decision(texts, indicator_scores))
+
+
+resources.register('text_model', TextModel.from_file, paths=(DEFAULT_MODEL,))
+
+
+def train(texts, labels, indicator_scores=None, bits=DEFAULT_BITS, ngrams=DEFAULT_NGRAMS,
+          words=True, epochs=300, learning_rate=2.0, l2=1e-4):
+    """Fit a :class:`TextModel` by full-batch gradient descent on the log loss"""
+    labels = np.asarray(labels, dtype=np.float64)
+    indicators = (np.zeros(len(texts)) if indicator_scores is None
+                  else np.asarray(indicator_scores, dtype=np.float64) / 100)
+    rows, columns, values = hashed_features(texts, bits, ngrams, words)
+    weights = np.zeros(1 << bits)
+    bias = indicator_weight = 0.0
+    for _ in range(epochs):
+        logits = np.bincount(rows, weights[columns] * values, minlength=len(texts))
+        error = _sigmoid(logits + bias + indicator_weight * indicators) - labels
+        # Only weights of n-grams seen in training move (plus the L2 decay)
+        gradient = np.bincount(columns, error[rows] * values, minlength=len(weights)) / len(texts)
+        weights -= learning_rate * (gradient + l2 * weights)
+        bias -= learning_rate * error.mean()
+        indicator_weight -= learning_rate * (error * indicators).mean()
+    # Weights that never got a gradient stay exactly zero and are not stored
+    return TextModel(weights, bias, indicator_weight, ngrams, words)
+
+
+def load_examples(path=DEFAULT_TRAINING):
+    """``(texts, labels)`` from a JSON Lines file of ``{"text": ..., "label": ...}``"""
+    texts, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                texts.append(record['text'])
+                labels.append(parse_label(record['label']))
+    return texts, labels
+
+
+def parse_label(value):
+    """1 for fake, 0 for reliable"""
+    label = str(value).strip().lower()
+    if label in FAKE_LABELS:
+        return 1
+    if label in REAL_LABELS:
+        return 0
+    raise ValueError(f"Unknown label: {value!r}")
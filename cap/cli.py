@@ -0,0 +1,212 @@
+"""Command-line scoring, for cron jobs and bulk checks without Streamlit.
+
+    python -m cap text messages.csv -o scored.csv
+    cat forwarded.txt | python -m cap text
+    python -m cap image photo1.jpg photo2.png
+    python -m cap import-reports old_reports.json
+    python -m cap reindex-search
+    python -m cap prerender-audio
+    python -m cap warm-up
+    python -m cap train-text labelled.jsonl -o cap/data/text_model.npz
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+
+from cap.batch import BATCH_SIZE, ScoredWriter, file_format, iter_rows, score_rows
+from cap.detection import detect_image, detect_text_batch
+
+
+def _open_input(path):
+    if path == '-':
+        return sys.stdin.buffer
+    return open(path, 'rb')
+
+
+def score_text(args):
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    output_format = args.output_format
+    if output_format is None:
+        # Keep a single CSV input as CSV, everything else becomes JSONL
+        single = len(args.paths) == 1 and args.paths[0] != '-'
+        fmt = args.format or (file_format(args.paths[0]) if single else None)
+        output_format = 'csv' if fmt == 'csv' else 'jsonl'
+    writer = ScoredWriter(out, output_format)
+    total = 0
+    try:
+        for path in args.paths:
+            fmt = args.format or ('lines' if path == '-' else file_format(path))
+            source = _open_input(path)
+            try:
+                rows = iter_rows(source, fmt, args.field)
+                for records in score_rows(rows, detect_text_batch, args.batch_size):
+                    writer.write(records)
+                    total += len(records)
+            finally:
+                if source is not sys.stdin.buffer:
+                    source.close()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        else:
+            out.flush()
+    print(f"cap: scored {total} texts", file=sys.stderr)
+
+
+def score_image(args):
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for path in args.paths:
+            with open(path, 'rb') as f:
+                result = detect_image(f.read())
+            record = {'file': path, 'score': result['score'], 'verdict': result['verdict'],
+                      'technical': result['technical']}
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def _report_store(args):
+    """The store named by ``--db``, else the deployment's (Redis if CAP_STATE_URL is set)"""
+    from cap.state import StateUnavailable, open_state
+    from cap.store import RedisReportStore, ReportStore
+
+    if args.db:
+        return ReportStore(args.db, seed=False)
+    try:
+        state = open_state()
+    except StateUnavailable as error:
+        sys.exit(f"cap: error: {error}")
+    if state.shared:
+        return RedisReportStore(state.client, state.prefix, seed=False)
+    return ReportStore(seed=False)
+
+
+def import_reports(args):
+    store = _report_store(args)
+    with open(args.path, encoding='utf-8') as f:
+        if args.path.endswith(('.jsonl', '.ndjson')):
+            reports = [json.loads(line) for line in f if line.strip()]
+        else:
+            reports = json.load(f)
+    added = store.import_reports(reports)
+    print(f"cap: imported {added} of {len(reports)} reports ({store.count()} in store)", file=sys.stderr)
+
+
+def reindex_search(args):
+    store = _report_store(args)
+    store.rebuild_search_index()
+    print(f"cap: re-indexed {store.count()} reports for search", file=sys.stderr)
+
+
+def prerender_audio(args):
+    from cap.speech import SpeechCache, SpeechUnavailable
+
+    try:
+        rendered = SpeechCache().prerender(args.languages or ('English', 'Khmer'))
+    except SpeechUnavailable as error:
+        sys.exit(f"cap: error: {error}")
+    print(f"cap: {rendered} lesson and challenge recordings ready", file=sys.stderr)
+
+
+def warm_up(args):
+    from cap import resources
+
+    resources.warm_up(args.names or None)
+    for status in resources.REGISTRY.status():
+        if status['loaded']:
+            files = ', '.join(status['paths']) or '-'
+            print(f"{status['name']:<20}{status['load_seconds'] * 1000:>10.1f} ms  {files}")
+
+
+def train_text(args):
+    from cap.classifier import DEFAULT_MODEL, DEFAULT_TRAINING, parse_label, train
+    from cap.detection import indicator_score
+
+    texts, labels = [], []
+    for path in args.paths or [DEFAULT_TRAINING]:
+        with open(path, 'rb') as source:
+            for record, text in iter_rows(source, args.format or file_format(path), args.field):
+                texts.append(text)
+                labels.append(parse_label(record.get(args.label_field)))
+    if not texts:
+        raise ValueError("No training examples")
+    indicators = [indicator_score(text) for text in texts]
+    model = train(texts, labels, indicators, bits=args.bits, epochs=args.epochs)
+    predicted = model.predict_proba(texts, indicators) > 0.5
+    accuracy = (predicted == [label == 1 for label in labels]).mean()
+    output = args.output or DEFAULT_MODEL
+    model.save(output)
+    print(f"cap: trained on {len(texts)} texts ({sum(labels)} fake), "
+          f"training accuracy {accuracy:.0%}, saved to {output}", file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m cap',
+                                     description='Score news text or images for fake content.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    text = commands.add_parser('text', help='score CSV, JSONL or plain-text files (default: stdin)')
+    text.add_argument('paths', nargs='*', default=['-'], help="input files, '-' for stdin")
+    text.add_argument('--format', choices=['csv', 'jsonl', 'lines'],
+                      help='input format (default: from the file extension, lines for stdin)')
+    text.add_argument('--field', help='column or JSON key holding the text')
+    text.add_argument('--output-format', choices=['csv', 'jsonl'],
+                      help='output format (default: csv for a single CSV input, else jsonl)')
+    text.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    text.add_argument('-o', '--output', help='write results here instead of stdout')
+    text.set_defaults(func=score_text)
+
+    image = commands.add_parser('image', help='score image files, one JSON line each')
+    image.add_argument('paths', nargs='+')
+    image.add_argument('-o', '--output', help='write results here instead of stdout')
+    image.set_defaults(func=score_image)
+
+    reports = commands.add_parser('import-reports',
+                                  help='load community reports (JSON list or JSONL of report dicts)')
+    reports.add_argument('path')
+    reports.add_argument('--db', help='report database (default: CAP_STATE_URL if set, else CAP_REPORTS_DB_PATH)')
+    reports.set_defaults(func=import_reports)
+
+    reindex = commands.add_parser('reindex-search',
+                                  help='rebuild the report search index (e.g. after editing the Khmer dictionary)')
+    reindex.add_argument('--db', help='report database (default: CAP_STATE_URL if set, else CAP_REPORTS_DB_PATH)')
+    reindex.set_defaults(func=reindex_search)
+
+    audio = commands.add_parser('prerender-audio',
+                                help='synthesize the Learning Hub and challenge audio ahead of time')
+    audio.add_argument('--language', dest='languages', action='append', choices=['English', 'Khmer'],
+                       help='only this language (repeatable; default: both)')
+    audio.set_defaults(func=prerender_audio)
+
+    training = commands.add_parser('train-text', help='train the fake news text model on labelled texts')
+    training.add_argument('paths', nargs='*', help='CSV or JSONL files with a text and a label '
+                                                   '(fake/reliable or 1/0; default: the bundled examples)')
+    training.add_argument('--format', choices=['csv', 'jsonl'],
+                          help='input format (default: from the file extension)')
+    training.add_argument('--field', help='column or JSON key holding the text')
+    training.add_argument('--label-field', default='label', help='column or JSON key holding the label')
+    training.add_argument('--bits', type=int, default=18, help='log2 of the number of hashed features')
+    training.add_argument('--epochs', type=int, default=300)
+    training.add_argument('-o', '--output', help='weights file (default: the bundled model)')
+    training.set_defaults(func=train_text)
+
+    warm = commands.add_parser('warm-up', help='load the shared detection resources and show how long each took')
+    warm.add_argument('names', nargs='*', help='only these resources (default: all)')
+    warm.set_defaults(func=warm_up)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        args.func(args)
+    except (OSError, ValueError, KeyError, csv.Error, sqlite3.Error) as error:
+        parser.exit(2, f"cap: error: {error}\n")
+    except KeyboardInterrupt:
+        return 130
+    return 0
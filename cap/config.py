@@ -0,0 +1,111 @@
+"""Runtime settings, read once from environment variables"""
+import os
+
+
+def _env_int(name, default):
+    """Read an integer setting, falling back to the default"""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name, default):
+    """Read a float setting, falling back to the default"""
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# Detection engine: how many analyses run at once, how many may wait in
+# line, and how long a single job may take before we give up on it
+MAX_WORKERS = _env_int("CAP_MAX_WORKERS", 4)
+MAX_PENDING = _env_int("CAP_MAX_PENDING", 32)
+JOB_TIMEOUT = _env_float("CAP_JOB_TIMEOUT", 30.0)
+
+# Where CAP keeps its files (result cache, databases, generated assets)
+DATA_DIR = os.environ.get("CAP_DATA_DIR", ".cap")
+
+# Result cache: in-memory LRU size, entry lifetime in seconds, and the
+# shared on-disk tier (set CAP_CACHE_PATH to an empty string to disable)
+CACHE_MAX_ENTRIES = _env_int("CAP_CACHE_MAX_ENTRIES", 1024)
+CACHE_MAX_DISK_ENTRIES = _env_int("CAP_CACHE_MAX_DISK_ENTRIES", 100000)
+CACHE_TTL = _env_float("CAP_CACHE_TTL", 7 * 24 * 3600)
+CACHE_PATH = os.environ.get("CAP_CACHE_PATH", os.path.join(DATA_DIR, "results.sqlite3"))
+
+# Known-image index: stored perceptual hashes and how many of the 64 bits
+# may differ for a pHash candidate, then for the dHash confirmation
+HASH_INDEX_PATH = os.environ.get("CAP_HASH_INDEX_PATH", os.path.join(DATA_DIR, "image_hashes.sqlite3"))
+HASH_MATCH_DISTANCE = _env_int("CAP_HASH_MATCH_DISTANCE", 8)
+HASH_CONFIRM_DISTANCE = _env_int("CAP_HASH_CONFIRM_DISTANCE", 12)
+
+# Near-duplicate text index: MinHash signature length, how many LSH
+# bands it is cut into (candidates share at least one band), the
+# estimated Jaccard similarity that confirms a match, and shingle size
+DEDUP_INDEX_PATH = os.environ.get("CAP_DEDUP_INDEX_PATH", os.path.join(DATA_DIR, "text_signatures.sqlite3"))
+DEDUP_PERMUTATIONS = _env_int("CAP_DEDUP_PERMUTATIONS", 128)
+DEDUP_BANDS = _env_int("CAP_DEDUP_BANDS", 32)
+DEDUP_THRESHOLD = _env_float("CAP_DEDUP_THRESHOLD", 0.5)
+DEDUP_SHINGLE_SIZE = _env_int("CAP_DEDUP_SHINGLE_SIZE", 5)
+# How often, at most, in seconds, a rerun checks the report store for
+# reports to add to the in-memory indexes
+REPORT_SYNC_INTERVAL = _env_float("CAP_REPORT_SYNC_INTERVAL", 2.0)
+
+# Image ingest: largest image accepted at all (checked from the header),
+# largest bitmap we are willing to decode after JPEG draft scaling, and
+# the size of the working copy and of the on-page thumbnail
+MAX_IMAGE_PIXELS = _env_int("CAP_MAX_IMAGE_PIXELS", 120_000_000)
+MAX_DECODE_PIXELS = _env_int("CAP_MAX_DECODE_PIXELS", 25_000_000)
+WORKING_MAX_SIDE = _env_int("CAP_WORKING_MAX_SIDE", 2048)
+THUMBNAIL_SIDE = _env_int("CAP_THUMBNAIL_SIDE", 640)
+
+# Video sampling: decode keyframes only (or every frame), keep every Nth
+# of those, downscale to this size, score this many at a time, and stop
+# after this many frames even if the verdict is still open
+VIDEO_KEYFRAMES_ONLY = os.environ.get("CAP_VIDEO_KEYFRAMES_ONLY", "1") != "0"
+VIDEO_EVERY_N = _env_int("CAP_VIDEO_EVERY_N", 1)
+VIDEO_FRAME_SIDE = _env_int("CAP_VIDEO_FRAME_SIDE", 512)
+VIDEO_BATCH_SIZE = _env_int("CAP_VIDEO_BATCH_SIZE", 8)
+VIDEO_MAX_FRAMES = _env_int("CAP_VIDEO_MAX_FRAMES", 120)
+
+# Shared detection resources (lexicon, indexes, challenge bank): how
+# often, in seconds, their data files are checked for changes, and
+# whether a changed file is reloaded without a restart
+RESOURCE_CHECK_INTERVAL = _env_float("CAP_RESOURCE_CHECK_INTERVAL", 2.0)
+RESOURCE_RELOAD = _env_int("CAP_RESOURCE_RELOAD", 1) != 0
+
+# Shared state for several server replicas: a Redis URL (e.g.
+# redis://cache:6379/0) moves community reports, shared counters and the
+# result cache there, under this key prefix. Empty keeps them local.
+STATE_URL = os.environ.get("CAP_STATE_URL", "")
+STATE_PREFIX = os.environ.get("CAP_STATE_PREFIX", "cap:")
+
+# Community report database, and how long a writer waits for the lock
+REPORTS_DB_PATH = os.environ.get("CAP_REPORTS_DB_PATH", os.path.join(DATA_DIR, "reports.sqlite3"))
+DB_BUSY_TIMEOUT = _env_float("CAP_DB_BUSY_TIMEOUT", 10.0)
+
+# Static images: where the originals live, and where their resized
+# WebP/PNG variants are written the first time they are needed
+ASSET_DIR = os.environ.get("CAP_ASSET_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ASSET_CACHE_DIR = os.environ.get("CAP_ASSET_CACHE_DIR", os.path.join(DATA_DIR, "assets"))
+
+# Metrics: latency histograms and counters in Prometheus text format,
+# written to a file every few seconds and/or served on a local port
+# (CAP_METRICS_PATH="" turns the file off, CAP_METRICS_PORT=0 the endpoint)
+METRICS_ENABLED = _env_int("CAP_METRICS", 1) != 0
+METRICS_PATH = os.environ.get("CAP_METRICS_PATH", os.path.join(DATA_DIR, "metrics.prom"))
+METRICS_INTERVAL = _env_float("CAP_METRICS_INTERVAL", 15.0)
+METRICS_HOST = os.environ.get("CAP_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = _env_int("CAP_METRICS_PORT", 0)
+
+# Offline text-to-speech: a command per language that reads text on stdin
+# and writes WAV to stdout, and where the synthesized audio is kept.
+# espeak-ng has no Khmer voice; point CAP_TTS_COMMAND_KM at a Khmer
+# engine (e.g. a wrapper around a local Khmer TTS model) to enable it.
+TTS_COMMANDS = {
+    'English': os.environ.get("CAP_TTS_COMMAND_EN", "espeak-ng -v en --stdin --stdout"),
+    'Khmer': os.environ.get("CAP_TTS_COMMAND_KM", ""),
+}
+TTS_TIMEOUT = _env_float("CAP_TTS_TIMEOUT", 30.0)
+AUDIO_CACHE_DIR = os.environ.get("CAP_AUDIO_CACHE_DIR", os.path.join(DATA_DIR, "audio"))
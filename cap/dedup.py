@@ -0,0 +1,249 @@
+"""Near-duplicate lookup for news text and community reports.
+
+Each text is cut into character shingles (overlapping windows of a few
+characters of the normalized text, so Khmer without spaces and English
+are handled alike) and summarized by a MinHash signature: the smallest
+hash of any shingle under each of a fixed set of hash functions. Two
+signatures agree at a position with probability equal to the Jaccard
+similarity of their shingle sets. Signatures are cut into bands and
+every band is a bucket key (locality-sensitive hashing), so a lookup
+only compares against the texts sharing a bucket, not the whole corpus.
+
+Stored texts are grouped into clusters: a text joins the cluster of the
+closest stored text it matches. The feed uses the clusters to group
+duplicate reports, and a checked text links to the reports like it.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from cap import config, resources
+from cap.khmer import normalize
+
+_BLANKS = re.compile(r"\s+")
+# Signatures are stored, so the hash functions must never change
+_SEED = 0x43415031
+# Texts kept per bucket. A near-duplicate of the texts in a full bucket
+# still finds them, so this only bounds the work per lookup.
+BUCKET_LIMIT = 16
+
+
+def shingles(text, size):
+    """The set of ``size``-character windows of the normalized text"""
+    text = _BLANKS.sub(" ", normalize(text)).strip()
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[start:start + size] for start in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures under ``permutations`` multiply-shift hash functions"""
+
+    def __init__(self, permutations, shingle_size, seed=_SEED):
+        rng = np.random.default_rng(seed)
+        self.shingle_size = shingle_size
+        # h(x) = top 32 bits of (a * x + b) mod 2**64, with a odd
+        self._a = rng.integers(0, 2 ** 64, permutations, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 64, permutations, dtype=np.uint64)
+
+    def signature(self, text):
+        """uint32 signature of ``text``, or None if it has nothing to compare"""
+        grams = shingles(text, self.shingle_size)
+        if not grams:
+            return None
+        hashes = np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams),
+                             dtype=np.uint64, count=len(grams))
+        # uint64 arithmetic wraps, which is the mod 2**64
+        mixed = self._a[:, None] * hashes[None, :] + self._b[:, None]
+        return (mixed.min(axis=1) >> np.uint64(32)).astype(np.uint32)
+
+
+class TextIndex:
+    """Persistent MinHash/LSH index of analyzed texts and community reports.
+
+    Analyzed texts keep their verdict and the result cache key of their
+    full result; reports keep their id. Both carry a cluster id.
+    """
+
+    def __init__(self, path=None, permutations=None, bands=None, threshold=None, shingle_size=None):
+        permutations = permutations or config.DEDUP_PERMUTATIONS
+        self.bands = bands or config.DEDUP_BANDS
+        if permutations % self.bands:
+            raise ValueError(f"{permutations} permutations do not split into {self.bands} bands")
+        self.threshold = threshold if threshold is not None else config.DEDUP_THRESHOLD
+        self.hasher = MinHasher(permutations, shingle_size or config.DEDUP_SHINGLE_SIZE)
+        self._buckets = [{} for _ in range(self.bands)]
+        self._entries = {}
+        self._signatures = {}
+        # Cluster id -> report ids in it, and report id -> cluster id
+        self._clusters = {}
+        self._report_clusters = {}
+        self._last_report_id = 0
+        self._synced_at = None
+        self._lock = threading.Lock()
+        path = path or config.DEDUP_INDEX_PATH
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS text_signatures (
+                id INTEGER PRIMARY KEY,
+                signature BLOB NOT NULL,
+                cluster_id INTEGER NOT NULL,
+                report_id INTEGER,
+                verdict TEXT,
+                score INTEGER,
+                result_key TEXT,
+                created_at TEXT NOT NULL
+            )
+        """)
+        self._db.execute("CREATE UNIQUE INDEX IF NOT EXISTS text_signatures_report "
+                         "ON text_signatures (report_id)")
+        rows = self._db.execute(
+            "SELECT id, signature, cluster_id, report_id, verdict, score, result_key "
+            "FROM text_signatures ORDER BY id")
+        for row in rows:
+            signature = np.frombuffer(row[1], dtype='<u4').astype(np.uint32)
+            if len(signature) == permutations:
+                self._index(self._entry(row), signature)
+
+    @staticmethod
+    def _entry(row):
+        return {
+            'id': row[0],
+            'cluster_id': row[2],
+            'report_id': row[3],
+            'verdict': row[4],
+            'score': row[5],
+            'result_key': row[6],
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _index(self, entry, signature):
+        self._entries[entry['id']] = entry
+        self._signatures[entry['id']] = signature
+        for band, key in enumerate(signature.reshape(self.bands, -1)):
+            bucket = self._buckets[band].setdefault(key.tobytes(), [])
+            if len(bucket) < BUCKET_LIMIT:
+                bucket.append(entry['id'])
+        report_id = entry['report_id']
+        if report_id is not None:
+            self._clusters.setdefault(entry['cluster_id'], []).append(report_id)
+            self._report_clusters[report_id] = entry['cluster_id']
+            self._last_report_id = max(self._last_report_id, report_id)
+
+    def _match(self, signature, reported_only=False):
+        candidates = set()
+        for band, key in enumerate(signature.reshape(self.bands, -1)):
+            candidates.update(self._buckets[band].get(key.tobytes(), ()))
+        if reported_only:
+            candidates = [id for id in candidates if self._entries[id]['report_id'] is not None]
+        if not candidates:
+            return None
+        candidates = list(candidates)
+        similarity = (np.stack([self._signatures[id] for id in candidates]) == signature).mean(axis=1)
+        best = int(similarity.argmax())
+        if similarity[best] < self.threshold:
+            return None
+        return dict(self._entries[candidates[best]], similarity=float(similarity[best]))
+
+    def _add(self, signature, match, report_id=None, verdict=None, score=None, result_key=None):
+        """Store a signature in the cluster of ``match`` (or a new one); None if already stored"""
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO text_signatures (signature, cluster_id, report_id, verdict, score, "
+            "result_key, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (signature.astype('<u4').tobytes(), match['cluster_id'] if match else 0, report_id,
+             verdict, score, result_key, datetime.now().isoformat(timespec='seconds')))
+        if not cursor.rowcount:
+            if report_id is not None:
+                # Another process indexed this report first; use its entry
+                row = self._db.execute(
+                    "SELECT id, signature, cluster_id, report_id, verdict, score, result_key "
+                    "FROM text_signatures WHERE report_id = ?", (report_id,)).fetchone()
+                self._index(self._entry(row), signature)
+            return None
+        cluster_id = match['cluster_id'] if match else cursor.lastrowid
+        if match is None:
+            self._db.execute("UPDATE text_signatures SET cluster_id = ? WHERE id = ?",
+                             (cluster_id, cursor.lastrowid))
+        entry = self._entry((cursor.lastrowid, None, cluster_id, report_id, verdict, score, result_key))
+        self._index(entry, signature)
+        return entry
+
+    def find(self, text, reported_only=False):
+        """Closest stored entry for ``text``, with its estimated similarity, or None"""
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return None
+        with self._lock:
+            return self._match(signature, reported_only)
+
+    def record_analysis(self, text, result, result_key=None):
+        """Remember an analyzed text and its verdict unless a near-duplicate is stored"""
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return None
+        with self._lock:
+            if self._match(signature) is None:
+                return self._add(signature, None, verdict=result['verdict'],
+                                 score=result['score'], result_key=result_key)
+        return None
+
+    def sync_reports(self, store, interval=None):
+        """Index the reports added to ``store`` since the last sync; returns how many.
+
+        With ``interval``, the store is only queried if the last sync was
+        at least that many seconds ago.
+        """
+        now = time.monotonic()
+        if interval is not None and self._synced_at is not None and now - self._synced_at < interval:
+            return 0
+        self._synced_at = now
+        reports = store.list_reports(after_id=self._last_report_id)
+        if not reports:
+            return 0
+        # Oldest first, so each cluster is named after its first report
+        pending = [(report['id'], self.hasher.signature(f"{report['description']}\n{report['explanation']}"))
+                   for report in reversed(reports)]
+        added = 0
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for report_id, signature in pending:
+                    if signature is None or report_id in self._report_clusters:
+                        continue
+                    if self._add(signature, self._match(signature), report_id=report_id) is not None:
+                        added += 1
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            self._last_report_id = max(self._last_report_id, reports[0]['id'])
+        return added
+
+    def cluster_of(self, report_id):
+        """Cluster id of a report, or None if it is not indexed"""
+        return self._report_clusters.get(report_id)
+
+    def cluster_size(self, cluster_id):
+        """How many reports a cluster holds"""
+        return len(self._clusters.get(cluster_id, ()))
+
+    def cluster_reports(self, cluster_id):
+        """Ids of the reports in a cluster, oldest first"""
+        with self._lock:
+            return list(self._clusters.get(cluster_id, ()))
+
+
+# Grows as texts are checked, so it is loaded once and never reloaded
+resources.register('text_index', TextIndex)
@@ -0,0 +1,264 @@
+"""Fake content detection for images and news text.
+
+Plain Python with no Streamlit dependency, shared by the app, batch
+jobs and the command line.
+"""
+import time
+
+from cap import resources
+from cap.khmer import syllable_spans
+from cap.matcher import DEFAULT_LEXICON, IndicatorMatcher
+from cap.metrics import timed_function
+
+resources.register('indicator_lexicon', IndicatorMatcher.from_file, paths=(DEFAULT_LEXICON,))
+
+
+def get_indicator_matcher():
+    """Indicator lexicon automaton, shared by the process and rebuilt when the lexicon changes"""
+    return resources.get('indicator_lexicon')
+
+
+def get_text_model():
+    """Fake news text model, shared by the process and reloaded when its weights change"""
+    # Registered by cap.classifier, imported on first use so that image
+    # scoring and the rest of this module don't load NumPy
+    return resources.get('text_model')
+
+
+@timed_function('image_detection')
+def simulate_image_detection(image_file, delay=0):
+    """Run image detection, optionally padded with a simulated delay"""
+    time.sleep(delay)
+    return detect_image(image_file)
+
+
+def detect_image(image_file):
+    """Score an image for signs of AI generation or editing.
+
+    ``image_file`` is an ingested upload, a PIL image (e.g. a video
+    frame) or encoded image bytes.
+    """
+    # Imported here so text-only users of this module don't load PIL
+    from PIL import Image
+
+    from cap.forensics import extract_features, forensic_result
+    from cap.ingest import IngestedImage, ingest_image
+
+    if isinstance(image_file, IngestedImage):
+        image = image_file
+    elif isinstance(image_file, Image.Image):
+        return forensic_result(extract_features(image_file, image_file.format))
+    else:
+        try:
+            image = ingest_image(image_file)
+        except (OSError, ValueError):
+            return unreadable_image_result()
+    return forensic_result(extract_features(image.working, image.format, image.quantization))
+
+
+def unreadable_image_result():
+    """Result for an upload that could not be decoded as an image"""
+    return {
+        'score': 50,
+        'verdict': 'Uncertain - Needs Review',
+        'khmer_explanation': 'មិនអាចអានរូបភាពនេះបានទេ:\n• ឯកសារអាចខូច ឬមិនមែនជារូបភាព\n• សូមសាកល្បងឯកសារផ្សេង\n• ត្រូវការការពិនិត្យបន្ថែម',
+        'english_explanation': 'This image could not be read:\n• The file may be damaged or not an image\n• Try another copy of the file\n• Requires additional verification',
+        'technical': 'The upload could not be decoded as an image',
+        'class': 'warning-result'
+    }
+
+
+@timed_function('image_analysis')
+def analyze_image(data, index=None, delay=0):
+    """Check an upload against known fakes, then run image detection.
+
+    A near-duplicate of an image the community already reported
+    short-circuits the analysis. Otherwise the image's hashes are stored
+    in ``index`` and attached to the result, so a later report can be
+    linked to it.
+    """
+    # Imported here so text-only users of this module don't load PIL
+    from cap.ingest import ImageTooLarge, ingest_image
+    from cap.phash import dhash, phash
+
+    try:
+        image = ingest_image(data)
+    except ImageTooLarge:
+        raise
+    except (OSError, ValueError):
+        # Not something PIL can decode (e.g. a video); score the raw upload
+        image = None
+    hashes = None
+    if index is not None and image is not None:
+        hashes = (phash(image.working), dhash(image.working))
+    if hashes is not None:
+        match = index.find(hashes, reported_only=True)
+        if match is not None:
+            result = known_fake_result(match)
+            result['hashes'] = [format(h, '016x') for h in hashes]
+            return result
+    result = simulate_image_detection(image or data, delay=delay)
+    if hashes is not None:
+        index.record_analysis(hashes, result)
+        result['hashes'] = [format(h, '016x') for h in hashes]
+    return result
+
+
+@timed_function('video_analysis')
+def analyze_video(data, delay=0):
+    """Sample frames from a video or animated GIF and combine their scores"""
+    from cap.video import VideoUnsupported, iter_frames, score_frames
+
+    time.sleep(delay)  # Simulate processing time
+    frames = iter_frames(data)
+    try:
+        aggregator, stopped_early = score_frames(
+            frames, lambda batch: [detect_image(frame) for frame in batch])
+    finally:
+        # Release the decoder right away when we stop early
+        frames.close()
+    if aggregator.count == 0:
+        raise VideoUnsupported("No frames could be decoded from this video")
+    return video_verdict(aggregator, stopped_early)
+
+
+def video_verdict(aggregator, stopped_early=False):
+    """Turn aggregated frame scores into a video result with Khmer explanations"""
+    technical = (f"Scored {aggregator.count} sampled frames; mean AI score {aggregator.mean:.0f}"
+                 + (f" (±{2 * aggregator.stderr:.0f})" if aggregator.count > 1 else "")
+                 + ("; stopped early once the verdict was clear" if stopped_early else ""))
+    if aggregator.mean >= aggregator.fake_above:
+        return {
+            'score': round(aggregator.mean),
+            'verdict': 'AI Generated Video (Likely Deepfake)',
+            'khmer_explanation': 'វីដេអូនេះប្រហែលជា AI បង្កើត (deepfake) ដោយសារ:\n• រូបភាពជាច្រើនក្នុងវីដេអូមានសញ្ញា AI\n• ភាពមិនស៊ីគ្នាកើតឡើងម្តងហើយម្តងទៀត\n• ត្រូវប្រុងប្រយ័ត្នមុនពេលចែករំលែក',
+            'english_explanation': 'This video is likely AI-generated (deepfake) because:\n• Many frames show signs of AI generation\n• The inconsistencies repeat across the clip\n• Be careful before sharing it',
+            'technical': technical,
+            'class': 'fake-result',
+            'frames': aggregator.count
+        }
+    if aggregator.mean <= aggregator.real_below:
+        return {
+            'score': round(aggregator.mean),
+            'verdict': 'Real (Human Created)',
+            'khmer_explanation': 'វីដេអូនេះហាក់ដូចជាពិតប្រាកដ ដោយសារ:\n• រូបភាពក្នុងវីដេអូមើលទៅធម្មជាតិ\n• មិនមានសញ្ញា AI ច្បាស់លាស់\n• នៅតែត្រូវផ្ទៀងផ្ទាត់ប្រភព',
+            'english_explanation': 'This video appears authentic because:\n• Frames look natural\n• No clear signs of AI generation\n• Still verify where it came from',
+            'technical': technical,
+            'class': 'real-result',
+            'frames': aggregator.count
+        }
+    return {
+        'score': round(aggregator.mean),
+        'verdict': 'Uncertain - Needs Review',
+        'khmer_explanation': 'មិនអាចកំណត់បានច្បាស់:\n• រូបភាពខ្លះមានសញ្ញា AI ខ្លះទៀតមិនមាន\n• អាចជាវីដេអូកែតម្រូវ\n• ត្រូវការការពិនិត្យបន្ថែម',
+        'english_explanation': 'Cannot determine with certainty:\n• Some frames show AI signs, others do not\n• Possibly an edited video\n• Requires additional verification',
+        'technical': technical,
+        'class': 'warning-result',
+        'frames': aggregator.count
+    }
+
+
+def known_fake_result(match):
+    """Result for an image matching one the community already reported"""
+    return {
+        # 99 for an exact copy, one point less per differing pHash bit
+        'score': max(99 - match['distance'], 80),
+        'verdict': 'Known Fake (Reported by Community)',
+        'khmer_explanation': 'រូបភាពនេះត្រូវបានសហគមន៍រាយការណ៍រួចហើយថាជារូបភាពក្លែងក្លាយ:\n• ស៊ីគ្នានឹងរូបភាពដែលបានរាយការណ៍ពីមុន\n• អាចត្រូវបានប្តូរទំហំ ឬបង្រួមឡើងវិញ\n• សូមមើលការរាយការណ៍របស់សហគមន៍',
+        'english_explanation': 'This image was already reported as fake by the community:\n• It matches a previously reported image\n• It may have been resized or recompressed\n• See the community report for details',
+        'technical': f"Perceptual hash match with community report #{match['report_id']} "
+                     f"({match['distance']} of 64 bits differ)",
+        'class': 'fake-result',
+        'report_id': match['report_id'],
+        'report_label': match['label']
+    }
+
+
+@timed_function('text_detection')
+def simulate_text_detection(text, delay=0):
+    """Run fake news detection on one text, optionally padded with a simulated delay"""
+    time.sleep(delay)
+    return detect_text_batch([text])[0]
+
+
+def detect_text_batch(texts):
+    """Score a batch of texts for fake news with the text model and indicator lexicon.
+
+    Blank texts are not scored (the model would only see its bias) and
+    get a "No Content" result, so batch output keeps one row per input.
+    """
+    results = [None] * len(texts)
+    scored = [index for index, text in enumerate(texts) if text.strip()]
+    if scored:
+        matches = [indicator_matches(texts[index]) for index in scored]
+        probabilities = get_text_model().predict_proba(
+            [texts[index] for index in scored], [IndicatorMatcher.score(found) for found in matches])
+        for index, found, probability in zip(scored, matches, probabilities):
+            results[index] = text_verdict(found, probability)
+    return [result or empty_text_result() for result in results]
+
+
+def empty_text_result():
+    """Result for a text with nothing to score"""
+    return {
+        'score': None,
+        'verdict': 'No Content',
+        'khmer_explanation': 'គ្មានអត្ថបទសម្រាប់វិភាគទេ',
+        'english_explanation': 'There is no text to analyze',
+        'technical': "Empty text: not scored",
+        'class': 'warning-result',
+        'matches': []
+    }
+
+
+def indicator_matches(text):
+    """Indicator phrases found in ``text``, on word boundaries"""
+    return whole_words(text, get_indicator_matcher().find(text))
+
+
+def indicator_score(text):
+    """The indicator feature of the text model, the same in training and scoring"""
+    return IndicatorMatcher.score(indicator_matches(text))
+
+
+def whole_words(text, matches):
+    """The matches that start and end on word boundaries ("secret" but not "secretary").
+
+    Khmer phrases only have to start and end on syllable boundaries:
+    Khmer compounds freely, so "លាក់" (hide) still counts inside
+    "លាក់បាំង" (conceal).
+    """
+    if not matches:
+        return matches
+    inside = bytearray(len(text) + 1)
+    for start, end in syllable_spans(text):
+        inside[start + 1:end] = b"\x01" * (end - start - 1)
+    return [m for m in matches if not inside[m.start] and not inside[m.end]]
+
+
+def text_verdict(matches, probability):
+    """Turn the fake probability and indicator matches into a result with Khmer explanations"""
+    fake_score = int(min(max(round(probability * 100), 1), 99))
+    phrases = len({m.phrase for m in matches})
+    technical = (f"Text model: {probability:.0%} probability of fake news; "
+                 f"{phrases} indicator phrase{'s' if phrases != 1 else ''} found")
+    if fake_score > 50:
+        result = {
+            'score': fake_score,
+            'verdict': 'Likely Fake News',
+            'khmer_explanation': 'ព័ត៌មាននេះអាចជាក្លែងក្លាយ ដោយសារ:\n• ប្រើពាក្យបំផុសអារម្មណ៍\n• គ្មានប្រភពជាក់លាក់\n• ចង់ឱ្យចែករំលែកយ៉ាងលឿន',
+            'english_explanation': 'This news is likely fake because:\n• Uses emotional trigger words\n• Lacks specific sources\n• Urges rapid sharing',
+            'technical': technical,
+            'class': 'fake-result'
+        }
+    else:
+        result = {
+            'score': fake_score,
+            'verdict': 'Likely Reliable',
+            'khmer_explanation': 'ព័ត៌មាននេះគួរអាចទុកចិត្តបាន:\n• មានប្រភពច្បាស់លាស់\n• ភាសាគ្មានភាពលំអៀង\n• មានលម្អិតពិតប្រាកដ',
+            'english_explanation': 'This news appears reliable because:\n• Clear sources are provided\n• Neutral language is used\n• Contains verifiable details',
+            'technical': technical,
+            'class': 'real-result'
+        }
+    result['matches'] = [list(m) for m in matches]
+    return result
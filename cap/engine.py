@@ -0,0 +1,162 @@
+"""Background detection engine.
+
+Analyses run on a bounded worker pool instead of the Streamlit script
+thread. A page submits a job, gets back an id it can keep in session
+state, and picks the result up on a later rerun.
+"""
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cap import config
+
+
+class EngineBusy(Exception):
+    """Raised when the pending-job limit is reached"""
+
+
+class JobTimeout(Exception):
+    """Raised when a job did not finish within the engine timeout"""
+
+
+class Job:
+    """Bookkeeping for one submitted analysis"""
+
+    def __init__(self, job_id, kind, future):
+        self.id = job_id
+        self.kind = kind
+        self.future = future
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.timed_out = False
+
+    @property
+    def done(self):
+        return self.timed_out or self.future.done()
+
+    @property
+    def elapsed(self):
+        end = self.finished_at or time.monotonic()
+        return end - self.submitted_at
+
+
+class DetectionEngine:
+    """Run detection functions on a shared, bounded thread pool.
+
+    At most ``max_workers`` jobs run at once and at most ``max_pending``
+    are accepted (running or queued); beyond that ``submit`` raises
+    ``EngineBusy`` so the page can ask the user to retry. A job that is
+    still unfinished ``timeout`` seconds after submission is reported as
+    timed out. Python threads cannot be killed, so a runaway job keeps
+    its worker until it returns, but the user is no longer kept waiting.
+    """
+
+    # How long finished jobs nobody collected are kept around
+    RETENTION = 300
+
+    def __init__(self, max_workers=None, max_pending=None, timeout=None):
+        self.max_workers = max_workers or config.MAX_WORKERS
+        self.max_pending = max(max_pending or config.MAX_PENDING, self.max_workers)
+        self.timeout = timeout or config.JOB_TIMEOUT
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="cap-detect")
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._ids = itertools.count(1)
+        self._jobs = {}
+        self._durations = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` and return the job id"""
+        if not self._slots.acquire(blocking=False):
+            raise EngineBusy("Too many analyses in progress")
+        self._prune()
+        with self._lock:
+            job_id = next(self._ids)
+        job = Job(job_id, kind, None)
+        try:
+            job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._jobs[job_id] = job
+        job.future.add_done_callback(lambda _: self._slots.release())
+        return job_id
+
+    def _run(self, job, fn, args, kwargs):
+        job.started_at = time.monotonic()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            job.finished_at = time.monotonic()
+            self._record_duration(job.kind, job.finished_at - job.started_at)
+
+    def _record_duration(self, kind, seconds):
+        # Exponentially weighted average, only used for progress estimates
+        with self._lock:
+            previous = self._durations.get(kind)
+            self._durations[kind] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.RETENTION
+        with self._lock:
+            stale = [job_id for job_id, job in self._jobs.items()
+                     if job.done and job.submitted_at < cutoff]
+            for job_id in stale:
+                del self._jobs[job_id]
+
+    def poll(self, job_id):
+        """Return the Job for ``job_id``, marking it timed out if overdue.
+
+        Raises KeyError for unknown or already collected jobs.
+        """
+        with self._lock:
+            job = self._jobs[job_id]
+        if not job.future.done() and job.elapsed > self.timeout:
+            job.timed_out = True
+            job.future.cancel()
+        return job
+
+    def progress(self, job_id):
+        """Estimated completion between 0 and 1, based on past durations"""
+        job = self.poll(job_id)
+        if job.done:
+            return 1.0
+        if job.started_at is None:
+            return 0.0
+        expected = self._durations.get(job.kind)
+        if not expected:
+            return 0.5
+        return min((time.monotonic() - job.started_at) / expected, 0.95)
+
+    def result(self, job_id):
+        """Collect a finished job's result and forget the job.
+
+        Re-raises the job's exception, or JobTimeout if it ran too long.
+        """
+        job = self.poll(job_id)
+        if not job.done:
+            raise RuntimeError(f"Job {job_id} is still running")
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        if job.timed_out:
+            raise JobTimeout(f"Analysis took longer than {self.timeout:g} seconds")
+        return job.future.result()
+
+    def discard(self, job_id):
+        """Forget a job the caller is no longer interested in"""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None:
+            job.future.cancel()
+
+    def pending(self):
+        """Number of jobs currently queued or running"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.future.done())
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
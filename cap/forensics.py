@@ -0,0 +1,252 @@
+"""Image forensics: cheap signal-level evidence of generation or editing.
+
+Four measurements, each computed with whole-array NumPy operations on
+the working copy of an upload:
+
+* error level analysis: how much each region changes when the image is
+  saved again as JPEG; regions pasted in from elsewhere or retouched
+  stand out from the rest;
+* noise residual: the sensor noise left after removing image content.
+  Camera photos carry some everywhere, generated images are often
+  unnaturally clean;
+* spectral peaks: upsampling layers in image generators leave periodic
+  patterns that show as isolated peaks in the Fourier spectrum of the
+  noise residual;
+* JPEG quantization tables: cameras and phones use their own high
+  quality tables, while editors and generators save with the standard
+  IJG tables, or not as JPEG at all.
+
+The weights that turn these into a score are set by hand, not trained,
+so the score is evidence for a human to weigh, not a proof.
+"""
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+# Largest side analyzed; bigger working copies are scaled down first
+ANALYSIS_SIDE = 1024
+# Side of the square blocks that local statistics are taken over
+BLOCK = 32
+# Side of the centre crop whose spectrum is examined
+FFT_SIDE = 512
+ELA_QUALITY = 90
+
+# Score at or above which an image is called AI-generated, and at or below real
+FAKE_ABOVE = 70
+REAL_BELOW = 40
+
+# IJG reference luminance table (natural order), scaled by libjpeg's quality setting
+_IJG_LUMINANCE = np.array([
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+])
+_QUALITIES = np.arange(1, 101)
+_SCALES = np.where(_QUALITIES < 50, 5000 // _QUALITIES, 200 - 2 * _QUALITIES)
+_IJG_TABLES = np.clip((_IJG_LUMINANCE[None, :] * _SCALES[:, None] + 50) // 100, 1, 255)
+
+# Immerkaer's noise estimation mask: it cancels smooth image content
+_NOISE_MASK = ((1, -2, 1), (-2, 4, -2), (1, -2, 1))
+
+# Bullet shown for each finding, in Khmer and English
+FINDINGS = {
+    'clean_noise': ('ស្ទើរតែគ្មានគ្រាប់ noise ធម្មជាតិរបស់កាមេរ៉ា (វាយនភាពរលោងខុសធម្មតា)',
+                    'Almost none of the natural noise a camera leaves (unusually smooth texture)'),
+    'uneven_noise': ('កម្រិត noise ខុសគ្នាខ្លាំងរវាងផ្នែកនានានៃរូបភាព',
+                     'Noise level differs strongly between parts of the image'),
+    'spectral_peaks': ('មានលំនាំប្រេកង់ដដែលៗ ដែលជាលក្ខណៈនៃការបង្កើតរូបភាពដោយ AI',
+                       'Repeating frequency patterns typical of AI image generators'),
+    'uneven_ela': ('ផ្នែកខ្លះត្រូវបានបង្ហាប់ខុសពីផ្នែកផ្សេងទៀត (អាចត្រូវបានកែសម្រួល)',
+                   'Some regions were compressed differently from the rest (possible editing)'),
+    'not_camera_file': ('មិនមែនជាឯកសារ JPEG ដែលថតពីកាមេរ៉ា ឬទូរស័ព្ទ',
+                        'Not saved as a camera or phone JPEG'),
+    'natural_noise': ('មាន noise ធម្មជាតិរបស់កាមេរ៉ាស្មើៗគ្នាពេញរូបភាព',
+                      'Natural, even camera noise across the image'),
+    'clean_spectrum': ('មិនមានលំនាំប្រេកង់ដដែលៗខុសធម្មតា',
+                       'No unusual repeating frequency patterns'),
+    'even_ela': ('ការបង្ហាប់ស្មើគ្នាពេញរូបភាព',
+                 'Compression is consistent across the whole image'),
+    'camera_jpeg': ('ការបង្ហាប់ JPEG ស្របនឹងកាមេរ៉ា ឬទូរស័ព្ទ',
+                    'JPEG compression consistent with a camera or phone'),
+}
+
+
+def _analysis_copy(image):
+    image = image.convert('RGB')
+    if max(image.size) > ANALYSIS_SIDE:
+        image = image.copy()
+        image.thumbnail((ANALYSIS_SIDE, ANALYSIS_SIDE), Image.Resampling.BOX)
+    return image
+
+
+def _blocks(array, size=BLOCK):
+    """View of ``array`` as whole ``size`` x ``size`` blocks, shape (rows, cols, size, size)"""
+    rows, cols = array.shape[0] // size, array.shape[1] // size
+    return array[:rows * size, :cols * size].reshape(rows, size, cols, size).swapaxes(1, 2)
+
+
+def _spread(values):
+    """Interquartile range relative to the median"""
+    low, median, high = np.percentile(values, (25, 50, 75))
+    return float((high - low) / median) if median > 0 else 0.0
+
+
+def error_level(image, quality=ELA_QUALITY):
+    """Mean JPEG re-save error and how unevenly it is spread over blocks"""
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    buffer.seek(0)
+    with Image.open(buffer) as resaved:
+        difference = np.abs(np.asarray(image, dtype=np.int16) - np.asarray(resaved, dtype=np.int16))
+    error = difference.mean(axis=2, dtype=np.float32)
+    blocks = _blocks(error).mean(axis=(2, 3)).ravel()
+    return float(error.mean()), _spread(blocks) if blocks.size else 0.0
+
+
+def noise_residual(gray):
+    """The image convolved with the noise mask (content mostly cancelled)"""
+    height, width = gray.shape
+    residual = np.zeros((height - 2, width - 2), dtype=np.float32)
+    for dy, row in enumerate(_NOISE_MASK):
+        for dx, weight in enumerate(row):
+            residual += weight * gray[dy:dy + height - 2, dx:dx + width - 2]
+    return residual
+
+
+def noise_levels(residual):
+    """Noise sigma of the image (its flatter blocks) and its spread across blocks"""
+    # sigma = sqrt(pi / 2) / 6 * mean |residual| (Immerkaer 1996)
+    sigmas = _blocks(np.abs(residual)).mean(axis=(2, 3)).ravel() * (np.sqrt(np.pi / 2) / 6)
+    if not sigmas.size:
+        return 0.0, 0.0
+    # Edges and texture inflate busy blocks, so the flatter quarter is the noise floor
+    return float(np.percentile(sigmas, 25)), _spread(sigmas)
+
+
+def spectral_peaks(residual, jpeg=False):
+    """Strongest isolated peak in the residual's spectrum, in log units above its ring.
+
+    For JPEGs the frequencies of the 8x8 block grid are left out, since
+    block edges produce peaks there in any camera photo.
+    """
+    side = min(FFT_SIDE, *residual.shape)
+    if side < 64:
+        return 0.0
+    top, left = (residual.shape[0] - side) // 2, (residual.shape[1] - side) // 2
+    crop = residual[top:top + side, left:left + side]
+    window = np.hanning(side).astype(np.float32)
+    spectrum = np.log1p(np.abs(np.fft.fftshift(np.fft.fft2((crop - crop.mean()) * np.outer(window, window)))))
+    # Compare each frequency with the mean of its ring, so the smooth
+    # fall-off of natural spectra does not count as a peak
+    offsets = np.arange(side) - side // 2
+    radius = np.hypot(offsets[:, None], offsets[None, :]).astype(np.int32)
+    ring_means = np.bincount(radius.ravel(), spectrum.ravel()) / np.maximum(np.bincount(radius.ravel()), 1)
+    excess = spectrum - ring_means[radius]
+    # Only the upper half of the frequencies, away from the axes (image borders)
+    usable = (radius > side // 4) & (np.abs(offsets)[:, None] > 2) & (np.abs(offsets)[None, :] > 2)
+    if jpeg:
+        grid = np.abs((offsets * 8 / side) - np.round(offsets * 8 / side)) * side / 8 <= 1
+        usable &= ~(grid[:, None] | grid[None, :])
+    return float(excess[usable].max()) if usable.any() else 0.0
+
+
+def jpeg_quality(quantization):
+    """Estimated quality and whether the luminance table is the standard IJG one"""
+    if not quantization or 0 not in quantization:
+        return None, None
+    table = np.asarray(quantization[0][:64])
+    errors = np.abs(_IJG_TABLES - table[None, :]).sum(axis=1)
+    best = int(errors.argmin())
+    return int(_QUALITIES[best]), bool(errors[best] == 0)
+
+
+def extract_features(image, format=None, quantization=None):
+    """Forensic measurements of a PIL image (and its original file's format and tables)"""
+    image = _analysis_copy(image)
+    gray = np.asarray(image.convert('L'), dtype=np.float32)
+    residual = noise_residual(gray)
+    ela_mean, ela_spread = error_level(image)
+    noise, noise_spread = noise_levels(residual)
+    quality, standard = jpeg_quality(quantization)
+    return {
+        'ela_mean': round(ela_mean, 3),
+        'ela_spread': round(ela_spread, 3),
+        'noise_sigma': round(noise, 3),
+        'noise_spread': round(noise_spread, 3),
+        'spectral_peak': round(spectral_peaks(residual, jpeg=format == 'JPEG'), 3),
+        'format': format,
+        'jpeg_quality': quality,
+        'standard_tables': standard,
+    }
+
+
+def _evidence(value, neutral, full):
+    """-1..1: how far ``value`` is from ``neutral`` towards ``full``"""
+    return float(np.clip((value - neutral) / (full - neutral), -1.0, 1.0))
+
+
+def score_features(features):
+    """AI-generation score (0-100) and the findings behind it, strongest first"""
+    contributions = []
+
+    clean = _evidence(features['noise_sigma'], 0.8, 0.3)
+    contributions.append((22 * clean, 'clean_noise' if clean > 0 else 'natural_noise'))
+    uneven = _evidence(features['noise_spread'], 1.2, 2.0)
+    if uneven > 0:
+        contributions.append((8 * uneven, 'uneven_noise'))
+    peaks = _evidence(features['spectral_peak'], 3.0, 5.0)
+    contributions.append((20 * peaks, 'spectral_peaks' if peaks > 0 else 'clean_spectrum'))
+    ela = _evidence(features['ela_spread'], 1.5, 3.0)
+    contributions.append((10 * ela, 'uneven_ela' if ela > 0 else 'even_ela'))
+
+    if features['jpeg_quality'] is not None:
+        # Camera tables: high quality and not the library default
+        if features['jpeg_quality'] >= 85 and not features['standard_tables']:
+            contributions.append((-15, 'camera_jpeg'))
+    elif features['format'] in ('PNG', 'WEBP'):
+        contributions.append((10, 'not_camera_file'))
+
+    score = int(round(np.clip(50 + sum(points for points, _ in contributions), 1, 99)))
+    findings = [name for points, name in sorted(contributions, key=lambda item: -abs(item[0])) if points]
+    return score, findings
+
+
+def forensic_result(features):
+    """A detection result dict for measured ``features``"""
+    score, findings = score_features(features)
+    if score >= FAKE_ABOVE:
+        verdict, css = 'AI Generated (Likely Fake)', 'fake-result'
+        khmer, english = 'រូបភាពនេះប្រហែលជា AI បង្កើត ដោយសារ:', 'This image is likely AI-generated because:'
+        shown = [name for name in findings if name in
+                 ('clean_noise', 'uneven_noise', 'spectral_peaks', 'uneven_ela', 'not_camera_file')]
+    elif score <= REAL_BELOW:
+        verdict, css = 'Real (Human Created)', 'real-result'
+        khmer, english = 'រូបភាពនេះហាក់ដូចជាពិតប្រាកដ ដោយសារ:', 'This image appears authentic because:'
+        shown = [name for name in findings if name in
+                 ('natural_noise', 'clean_spectrum', 'even_ela', 'camera_jpeg')]
+    else:
+        verdict, css = 'Uncertain - Needs Review', 'warning-result'
+        khmer, english = 'មិនអាចកំណត់បានច្បាស់:', 'Cannot determine with certainty:'
+        shown = findings
+    shown = shown[:3]
+    quality = features['jpeg_quality']
+    tables = '' if quality is None else (f"; JPEG quality ~{quality} "
+                                         f"({'standard' if features['standard_tables'] else 'custom'} tables)")
+    return {
+        'score': score,
+        'verdict': verdict,
+        'khmer_explanation': '\n'.join([khmer] + [f"• {FINDINGS[name][0]}" for name in shown]),
+        'english_explanation': '\n'.join([english] + [f"• {FINDINGS[name][1]}" for name in shown]),
+        'technical': (f"Noise sigma {features['noise_sigma']:.2f} (spread {features['noise_spread']:.2f}); "
+                      f"spectral peak {features['spectral_peak']:.2f}; "
+                      f"error level {features['ela_mean']:.2f} (spread {features['ela_spread']:.2f})"
+                      f"{tables}"),
+        'class': css,
+        'features': features,
+    }
@@ -0,0 +1,197 @@
+"""Near-duplicate lookup for images the community has already seen.
+
+Perceptual hashes of analyzed and reported images are kept in SQLite and
+loaded into a BK-tree, a metric tree over Hamming distance, so finding
+every stored hash within a few bits of a new upload only visits a small
+part of the corpus instead of comparing against all of it. Reported
+images' hashes are also stored with the report in the report store, and
+each process's index picks them up from there.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from cap import config, resources
+from cap.phash import hamming
+
+_SIGN_BIT = 1 << 63
+
+
+def _to_sql(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= _SIGN_BIT else value
+
+
+def _from_sql(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class BKTree:
+    """Burkhard-Keller tree keyed by 64-bit hashes under Hamming distance"""
+
+    def __init__(self):
+        # Each node is [key, items, {distance: child}]
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, key, item):
+        self._size += 1
+        if self._root is None:
+            self._root = [key, [item], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(key, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [key, [item], {}]
+                return
+            node = child
+
+    def search(self, key, radius):
+        """All ``(distance, item)`` pairs within ``radius`` bits of ``key``"""
+        found = []
+        if self._root is None:
+            return found
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(key, node[0])
+            if distance <= radius:
+                found.extend((distance, item) for item in node[1])
+            # Triangle inequality: only subtrees in this band can hold matches
+            low, high = distance - radius, distance + radius
+            stack.extend(child for d, child in node[2].items() if low <= d <= high)
+        return found
+
+
+class ImageHashIndex:
+    """Persistent index of image hashes, optionally linked to community reports.
+
+    Candidates are found by pHash distance and confirmed by dHash
+    distance, which keeps false matches between unrelated images rare.
+    """
+
+    def __init__(self, path=None, max_distance=None, confirm_distance=None):
+        self.max_distance = max_distance if max_distance is not None else config.HASH_MATCH_DISTANCE
+        self.confirm_distance = confirm_distance if confirm_distance is not None else config.HASH_CONFIRM_DISTANCE
+        self._tree = BKTree()
+        self._report_ids = set()
+        self._last_report_id = 0
+        self._synced_at = None
+        self._lock = threading.Lock()
+        path = path or config.HASH_INDEX_PATH
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS image_hashes (
+                id INTEGER PRIMARY KEY,
+                phash INTEGER NOT NULL,
+                dhash INTEGER NOT NULL,
+                report_id INTEGER,
+                label TEXT,
+                verdict TEXT,
+                score INTEGER,
+                created_at TEXT NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS image_hashes_report ON image_hashes (report_id)")
+        rows = self._db.execute(
+            "SELECT id, phash, dhash, report_id, label, verdict, score FROM image_hashes")
+        for row in rows:
+            self._index(self._entry(row))
+
+    @staticmethod
+    def _entry(row):
+        return {
+            'id': row[0],
+            'phash': _from_sql(row[1]),
+            'dhash': _from_sql(row[2]),
+            'report_id': row[3],
+            'label': row[4],
+            'verdict': row[5],
+            'score': row[6],
+        }
+
+    def __len__(self):
+        return len(self._tree)
+
+    def _index(self, entry):
+        self._tree.add(entry['phash'], entry)
+        if entry['report_id'] is not None:
+            self._report_ids.add(entry['report_id'])
+            self._last_report_id = max(self._last_report_id, entry['report_id'])
+
+    def add(self, hashes, report_id=None, label=None, verdict=None, score=None):
+        """Store a ``(phash, dhash)`` pair and return its entry"""
+        phash, dhash = hashes
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO image_hashes (phash, dhash, report_id, label, verdict, score, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (_to_sql(phash), _to_sql(dhash), report_id, label, verdict, score,
+                 datetime.now().isoformat(timespec='seconds')))
+            entry = self._entry((cursor.lastrowid, _to_sql(phash), _to_sql(dhash),
+                                 report_id, label, verdict, score))
+            self._index(entry)
+        return entry
+
+    def find(self, hashes, reported_only=False):
+        """Closest stored entry for ``(phash, dhash)``, with its distance, or None"""
+        phash, dhash = hashes
+        with self._lock:
+            candidates = self._tree.search(phash, self.max_distance)
+        best = None
+        for distance, entry in candidates:
+            if reported_only and entry['report_id'] is None:
+                continue
+            if hamming(dhash, entry['dhash']) > self.confirm_distance:
+                continue
+            # Prefer reported entries, then the nearest
+            rank = (entry['report_id'] is None, distance)
+            if best is None or rank < best[0]:
+                best = (rank, dict(entry, distance=distance))
+        return best[1] if best else None
+
+    def record_analysis(self, hashes, result):
+        """Remember an analyzed image unless a near-identical one is stored"""
+        if self.find(hashes) is None:
+            self.add(hashes, verdict=result['verdict'], score=result['score'])
+
+    def record_report(self, hashes, report_id, label, score=None):
+        """Link an image to the community report that flagged it"""
+        return self.add(hashes, report_id=report_id, label=label, score=score)
+
+    def sync_reports(self, store, interval=None):
+        """Link the images of reports added to ``store`` since the last sync; returns how many.
+
+        With ``interval``, the store is only queried if the last sync was
+        at least that many seconds ago.
+        """
+        now = time.monotonic()
+        if interval is not None and self._synced_at is not None and now - self._synced_at < interval:
+            return 0
+        self._synced_at = now
+        added = 0
+        for image in store.reported_images(after_id=self._last_report_id):
+            if image['report_id'] in self._report_ids:
+                continue
+            self.record_report([int(h, 16) for h in image['image_hashes']], image['report_id'],
+                               image['description'], image['accuracy'])
+            added += 1
+        return added
+
+
+# Grows as images are analyzed and reports synced, so it is loaded once and never reloaded
+resources.register('image_hash_index', ImageHashIndex)
@@ -0,0 +1,91 @@
+"""Bounded-memory image ingest.
+
+Uploads are opened lazily, their dimensions checked from the header, and
+JPEGs decoded in draft mode (scaled down inside the decoder) so a 40
+megapixel phone photo never exists as a full-resolution bitmap. Every
+later stage works on a capped-resolution working copy and the page
+shows a small thumbnail.
+"""
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from cap import config
+from cap.upload import BufferReader
+
+# Our own checks below replace PIL's decompression-bomb warning
+Image.MAX_IMAGE_PIXELS = config.MAX_IMAGE_PIXELS
+
+
+class ImageTooLarge(ValueError):
+    """Raised when an image exceeds the configured pixel limits"""
+
+
+class IngestedImage:
+    """A decoded working copy plus what we learned from the original file"""
+
+    def __init__(self, working, format, original_size, quantization=None):
+        self.working = working
+        self.format = format
+        self.original_size = original_size
+        self.quantization = quantization
+        self._thumbnail = None
+
+    def thumbnail(self, side=None):
+        """Encoded JPEG/PNG preview, small enough to send to every browser"""
+        if self._thumbnail is None:
+            side = side or config.THUMBNAIL_SIDE
+            preview = self.working
+            scale = side / max(preview.size)
+            if scale < 1:
+                # A resized copy, never a full-size one
+                size = (max(round(preview.width * scale), 1), max(round(preview.height * scale), 1))
+                preview = preview.resize(size, Image.Resampling.BICUBIC, reducing_gap=2.0)
+            buffer = BytesIO()
+            if preview.mode in ('RGBA', 'LA'):
+                preview.save(buffer, 'PNG', optimize=True)
+            else:
+                preview.convert('RGB').save(buffer, 'JPEG', quality=80, optimize=True)
+            self._thumbnail = buffer.getvalue()
+        return self._thumbnail
+
+
+def open_image(data):
+    """Open encoded image bytes (or a file) lazily, rejecting oversized images before decode"""
+    image = Image.open(data if hasattr(data, 'read') else BufferReader(data))
+    width, height = image.size
+    if width * height > config.MAX_IMAGE_PIXELS:
+        image.close()
+        raise ImageTooLarge(
+            f"Image is {width * height / 1e6:.0f} megapixels; the limit is "
+            f"{config.MAX_IMAGE_PIXELS / 1e6:.0f}")
+    return image
+
+
+def ingest_image(data, max_side=None):
+    """Decode an upload into a working copy no larger than ``max_side`` pixels a side"""
+    max_side = max_side or config.WORKING_MAX_SIDE
+    image = open_image(data)
+    original_size = image.size
+    format = image.format
+    quantization = getattr(image, 'quantization', None)
+    # JPEG only: let the decoder scale by 1/2, 1/4 or 1/8 up front. The
+    # request keeps the image's aspect ratio, so a landscape photo is not
+    # also held to ``max_side`` pixels on its short side.
+    scale = min(max_side / max(original_size), 1.0)
+    image.draft('RGB', (max(int(original_size[0] * scale), 1), max(int(original_size[1] * scale), 1)))
+    width, height = image.size
+    if width * height > config.MAX_DECODE_PIXELS:
+        image.close()
+        raise ImageTooLarge(
+            f"{format or 'This'} images larger than "
+            f"{config.MAX_DECODE_PIXELS / 1e6:.0f} megapixels are not supported")
+    # The decoded bitmap becomes the working copy; rotating it in place
+    # (and only when EXIF asks for it) avoids a second full-size bitmap
+    image.load()
+    ImageOps.exif_transpose(image, in_place=True)
+    working = image
+    if working.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        working = working.convert('RGBA' if 'transparency' in working.info else 'RGB')
+    working.thumbnail((max_side, max_side))
+    return IngestedImage(working, format, original_size, quantization)
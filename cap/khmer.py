@@ -0,0 +1,184 @@
+"""Khmer text normalization and word segmentation.
+
+Khmer is written without spaces between words. A run of Khmer script is
+first split into orthographic syllables (a base character with its
+subscripts and vowel signs), which never straddle a word boundary, and
+the syllables are then grouped into words by a Viterbi search over a
+trie of dictionary words: of all the ways to cover the run with
+dictionary words, the one with the highest product of word frequencies
+wins. Syllables no dictionary word covers become one-syllable words
+with a low probability, so unknown names still come out as tokens.
+
+The frequency dictionary (``data/khmer_words.tsv``) is loaded once into
+the shared resource registry and reloaded when the file changes; search
+and text scoring segment with the same copy. Text indexed or trained on
+before an edit keeps its old words: run ``python -m cap reindex-search``
+and retrain the text model after changing the dictionary.
+"""
+import math
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+from cap import resources
+
+DEFAULT_DICTIONARY = os.path.join(os.path.dirname(__file__), "data", "khmer_words.tsv")
+
+# Zero-width characters that often sneak into pasted Khmer text, the two
+# invisible inherent vowels, and the deprecated independent vowels
+# spelled the recommended way
+_CLEANUP = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff\u17b4\u17b5"))
+_CLEANUP.update({0x17a3: "\u17a2", 0x17a4: "\u17a2\u17b6"})
+
+KHMER_RUN = re.compile(r"[\u1780-\u17dd\u17e0-\u17e9\u19e0-\u19ff]+")
+# The repetition mark (U+17D7) stays with the syllable it repeats
+_SYLLABLE = re.compile(r"[\u1780-\u17b3](?:\u17d2[\u1780-\u17b3]|[\u17b4-\u17d1\u17d3\u17d7\u17dd])*"
+                       r"|[\u17e0-\u17e9]+")
+WORD = re.compile(r"[^\W_]+")
+
+# How much less likely an unknown syllable is than a word seen once
+UNKNOWN_PENALTY = math.log(20)
+# Khmer runs (phrases between spaces) whose words are remembered;
+# headlines and scam templates repeat the same ones a lot
+RUN_CACHE_SIZE = 8192
+
+
+def normalize(text):
+    """NFC, casefolded, without zero-width characters or deprecated Khmer letters"""
+    if not unicodedata.is_normalized("NFC", text):
+        text = unicodedata.normalize("NFC", text)
+    return text.translate(_CLEANUP).casefold()
+
+
+def syllables(run):
+    """Orthographic syllables of a run of Khmer script"""
+    return _SYLLABLE.findall(run)
+
+
+def syllable_spans(text):
+    """``(start, end)`` offsets of the Khmer syllables and other words of ``text`` as given"""
+    spans = []
+    position = 0
+    for match in KHMER_RUN.finditer(text):
+        spans.extend(m.span() for m in WORD.finditer(text, position, match.start()))
+        spans.extend(m.span() for m in _SYLLABLE.finditer(text, match.start(), match.end()))
+        position = match.end()
+    spans.extend(m.span() for m in WORD.finditer(text, position))
+    return spans
+
+
+def load_dictionary(path=DEFAULT_DICTIONARY):
+    """Read ``word<TAB>count`` lines, skipping comments; a missing count is 1"""
+    frequencies = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            fields = line.split("\t")
+            word = normalize(fields[0].strip())
+            count = int(fields[1]) if len(fields) > 1 and fields[1].strip() else 1
+            if word and count > 0:
+                frequencies[word] = frequencies.get(word, 0) + count
+    return frequencies
+
+
+class Segmenter:
+    """Maximum-likelihood Khmer word segmentation over a frequency dictionary"""
+
+    def __init__(self, frequencies):
+        total = sum(frequencies.values()) or 1
+        # Trie keyed by syllable; the '' key of a node holds the cost
+        # (negative log probability) of the word ending there
+        self._trie = {}
+        self.longest = 1
+        for word, count in frequencies.items():
+            keys = syllables(word)
+            if not keys:
+                continue
+            node = self._trie
+            for key in keys:
+                node = node.setdefault(key, {})
+            node[''] = math.log(total / count)
+            self.longest = max(self.longest, len(keys))
+        self.unknown_cost = math.log(total) + UNKNOWN_PENALTY
+        self.size = len(frequencies)
+        self.words = lru_cache(maxsize=RUN_CACHE_SIZE)(self._words)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_DICTIONARY):
+        return cls(load_dictionary(path))
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, word):
+        """Whether ``word`` (normalized) is a dictionary word"""
+        node = self._trie
+        for key in syllables(word):
+            node = node.get(key)
+            if node is None:
+                return False
+        return '' in node
+
+    def _split(self, keys):
+        """``(start, end)`` syllable ranges of the most likely words of ``keys``"""
+        count = len(keys)
+        if count < 2:
+            return [(0, count)] if count else []
+        cost = [0.0] + [math.inf] * count
+        back = [0] * (count + 1)
+        trie, unknown = self._trie, self.unknown_cost
+        for start in range(count):
+            base = cost[start]
+            if base + unknown < cost[start + 1]:
+                cost[start + 1] = base + unknown
+                back[start + 1] = start
+            node = trie
+            for end in range(start, min(count, start + self.longest)):
+                node = node.get(keys[end])
+                if node is None:
+                    break
+                word = node.get('')
+                if word is not None and base + word < cost[end + 1]:
+                    cost[end + 1] = base + word
+                    back[end + 1] = start
+        ranges = []
+        end = count
+        while end:
+            ranges.append((back[end], end))
+            end = back[end]
+        ranges.reverse()
+        return ranges
+
+    def _words(self, run):
+        """Words of a normalized run of Khmer script (``words`` is the cached version)"""
+        keys = syllables(run)
+        return tuple("".join(keys[start:end]) for start, end in self._split(keys))
+
+    def tokens(self, text):
+        """Normalized words of ``text``: Khmer runs segmented, other scripts split on non-letters"""
+        # A zero-width space is how Khmer typists mark a word break
+        text = normalize(text.replace("\u200b", " "))
+        tokens = []
+        position = 0
+        for match in KHMER_RUN.finditer(text):
+            tokens.extend(WORD.findall(text, position, match.start()))
+            tokens.extend(self.words(match.group()))
+            position = match.end()
+        tokens.extend(WORD.findall(text, position))
+        return tokens
+
+
+resources.register('khmer_dictionary', Segmenter.from_file, paths=(DEFAULT_DICTIONARY,))
+
+
+def get_segmenter():
+    """Khmer segmenter, shared by the process and rebuilt when the dictionary changes"""
+    return resources.get('khmer_dictionary')
+
+
+def tokens(text):
+    """Normalized words of ``text`` with the shared segmenter"""
+    return get_segmenter().tokens(text)
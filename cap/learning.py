@@ -0,0 +1,81 @@
+"""Learning Hub lessons, in English and Khmer.
+
+Kept out of app.py so the same text can be pre-rendered to audio
+(see ``cap.speech``) without running the page.
+"""
+
+# Section -> language -> markdown, in the order the Learning Hub shows them
+LESSONS = {
+    'tips': {
+        'Khmer': """\
+### របៀបកំណត់អត្តសញ្ញាណមាតិកាដែលបង្កើតដោយ AI
+
+**សម្រាប់រូបភាព:**
+- ស្វែងរកវាយនភាពស្បែកដែលមិនធម្មជាតិ
+- ពិនិត្យមើលពន្លឺ និងស្រមោលដែលមិនស្របគ្នា
+- កត់សម្គាល់លក្ខណៈមុខដែលមិនស៊ីមេទ្រី
+- មើលឃើញដៃ ឬម្រាមដៃដែលមានរូបរាងចម្លែក
+""",
+        'English': """\
+### How to Spot AI-Generated Content
+
+**For Images:**
+- Look for unnatural skin textures
+- Check for inconsistent lighting and shadows
+- Notice asymmetrical facial features
+- Watch for strange hands or fingers
+""",
+    },
+    'scams': {
+        'Khmer': """\
+### ការបោកប្រាស់ AI ធម្មតានៅកម្ពុជា
+
+**ការបោកប្រាស់តាមបណ្តាញសង្គម:**
+- ការផ្សាយក្លែងក្លាយពីតារាល្បី
+- ការផ្តល់ជូនល្អពេក
+- សារបន្ទាន់
+""",
+        'English': """\
+### Common AI Scams in Cambodia
+
+**Social Media Scams:**
+- Fake celebrity endorsements
+- Too-good-to-be-true offers
+- Urgency-based messages
+""",
+    },
+    'protection': {
+        'Khmer': """\
+### របៀបការពារខ្លួនអ្នក
+
+**គន្លឹះទូទៅ:**
+- ត្រួតពិនិត្យប្រភពឱ្យបានច្បាស់
+- កុំចែករំលែកមាតិកាដែលមិនទាន់បានផ្ទៀងផ្ទាត់
+- ប្រើប្រភពច្រើនសម្រាប់ព័ត៌មានសំខាន់
+- សង្ស័យចំពោះសារបន្ទាន់
+""",
+        'English': """\
+### How to Protect Yourself
+
+**General Tips:**
+- Always verify sources
+- Don't share unverified content
+- Use multiple sources for important news
+- Be skeptical of urgent messages
+""",
+    },
+    'faq': {
+        'Khmer': """\
+### សំណួរដែលសួរញឹកញាប់
+
+**Q: តើឧបករណ៍កំណត់អត្តសញ្ញាណ AI ត្រឹមត្រូវប៉ុន្មាន?**
+A: ឧបករណ៍របស់យើងផ្តល់នូវការប៉ាន់ស្មានដោយផ្អែកលើលំនាំ AI ធម្មតា។ ត្រូវប្រើវិធីសាស្ត្រផ្ទៀងផ្ទាត់ច្រើនជានិច្ច។
+""",
+        'English': """\
+### Frequently Asked Questions
+
+**Q: How accurate is the AI detection?**
+A: Our tool provides estimates based on common AI patterns. Always use multiple verification methods.
+""",
+    },
+}
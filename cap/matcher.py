@@ -0,0 +1,121 @@
+"""Multi-phrase indicator matcher for news verification.
+
+Builds an Aho-Corasick automaton over a weighted lexicon of scam and
+clickbait phrases (English and Khmer) so an article is scanned once, in
+time linear in its length, however many phrases the lexicon holds.
+"""
+import os
+from collections import deque, namedtuple
+
+DEFAULT_LEXICON = os.path.join(os.path.dirname(__file__), "data", "indicators.tsv")
+DEFAULT_WEIGHT = 20
+
+Match = namedtuple("Match", "start end phrase weight")
+
+
+def load_lexicon(path=DEFAULT_LEXICON):
+    """Read ``phrase<TAB>weight[<TAB>language]`` lines, skipping comments"""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            fields = line.split("\t")
+            phrase = fields[0].strip()
+            weight = int(fields[1]) if len(fields) > 1 and fields[1].strip() else DEFAULT_WEIGHT
+            if phrase:
+                entries.append((phrase, weight))
+    return entries
+
+
+def _fold(text):
+    """Lowercase without changing length, so match offsets stay valid"""
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+class IndicatorMatcher:
+    """Aho-Corasick automaton over weighted phrases, case-insensitive"""
+
+    def __init__(self, entries):
+        # Node 0 is the root; each node has transitions, a failure link,
+        # the phrase ending there (if any) and a link to the next node on
+        # the failure chain that ends a phrase
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [None]
+        self._output_link = [0]
+        self.phrases = []
+        self.weights = []
+        seen = {}
+        for phrase, weight in entries:
+            key = _fold(phrase)
+            if key in seen:
+                self.weights[seen[key]] = weight
+                continue
+            seen[key] = len(self.phrases)
+            self.phrases.append(phrase)
+            self.weights.append(weight)
+            self._insert(key, seen[key])
+        self._link()
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_LEXICON):
+        return cls(load_lexicon(path))
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def _insert(self, key, index):
+        node = 0
+        for char in key:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._output_link.append(0)
+                self._goto[node][char] = nxt
+            node = nxt
+        self._output[node] = index
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                target = self._fail[child]
+                self._output_link[child] = target if self._output[target] is not None else self._output_link[target]
+
+    def find(self, text):
+        """All phrase occurrences in ``text`` as Match tuples, in order of end position"""
+        goto, fail = self._goto, self._fail
+        output, output_link = self._output, self._output_link
+        matches = []
+        node = 0
+        for end, char in enumerate(_fold(text), 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            hit = node if output[node] is not None else output_link[node]
+            while hit:
+                index = output[hit]
+                length = len(self.phrases[index])
+                matches.append(Match(end - length, end, self.phrases[index], self.weights[index]))
+                hit = output_link[hit]
+        return matches
+
+    @staticmethod
+    def score(matches):
+        """Sum of weights, counting each distinct phrase once"""
+        return sum({m.phrase: m.weight for m in matches}.values())
@@ -0,0 +1,229 @@
+"""In-process latency histograms and counters in Prometheus text format.
+
+Recording is a lock, a bisect and two additions, cheap enough to leave
+on permanently. The current values can be written to a ``.prom`` file
+at a fixed interval (for node_exporter's textfile collector, or just
+``cat``) and served over HTTP at ``/metrics`` for a local Prometheus to
+scrape; both are set up in ``cap.config`` and need no other service.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+from cap import config
+
+# Upper bounds in seconds, from a cache hit to a slow detection
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = (f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + ','.join(pairs) + '}'
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+
+class Histogram:
+    """Observations bucketed by upper bound, per label combination"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), sum of values
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f"{self.name}_bucket{_labels(self.labels + ('le',), labels + (le,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+
+class Registry:
+    """The metrics of one process, rendered together"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.setdefault(metric.name, metric)
+            return self._metrics[metric.name]
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+PHASE_SECONDS = REGISTRY.register(Histogram(
+    'cap_phase_seconds', "Time spent in each phase of handling a request", ('phase',)))
+PHASE_ERRORS = REGISTRY.register(Counter(
+    'cap_phase_errors_total', "Phases that ended with an exception", ('phase',)))
+DETECTIONS = REGISTRY.register(Counter(
+    'cap_detections_total', "Detection results by kind and verdict", ('kind', 'verdict')))
+REPORTS_SUBMITTED = REGISTRY.register(Counter(
+    'cap_reports_submitted_total', "Community reports submitted", ('type',)))
+
+
+def observe(phase, seconds):
+    """Record a phase the caller timed itself"""
+    if config.METRICS_ENABLED:
+        PHASE_SECONDS.observe(seconds, phase)
+
+
+@contextmanager
+def timed(phase):
+    """Time a block as ``phase``, counting it as an error if it raises"""
+    if not config.METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        PHASE_ERRORS.inc(phase)
+        raise
+    finally:
+        PHASE_SECONDS.observe(time.perf_counter() - started, phase)
+
+
+def timed_function(phase):
+    """Decorator form of :func:`timed`"""
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(phase):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def write_file(path, registry=REGISTRY):
+    """Write the current metrics to ``path``, replacing it atomically"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, 'w', encoding='utf-8') as file:
+        file.write(registry.render())
+    os.replace(partial, path)
+
+
+class Exporter:
+    """Background file writer and/or HTTP endpoint for a registry"""
+
+    def __init__(self, path=None, port=None, interval=None, host=None, registry=REGISTRY):
+        self.path = config.METRICS_PATH if path is None else path
+        self.port = config.METRICS_PORT if port is None else port
+        self.interval = interval or config.METRICS_INTERVAL
+        self.registry = registry
+        self.server = None
+        self._stop = threading.Event()
+        if self.path:
+            threading.Thread(target=self._write_loop, name='cap-metrics-file', daemon=True).start()
+        if self.port:
+            self.serve(host or config.METRICS_HOST)
+
+    def serve(self, host):
+        """Serve the registry at ``http://host:port/metrics`` from a background thread"""
+        # Imported here so that only processes serving metrics load it
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, self.port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='cap-metrics-http', daemon=True).start()
+
+    def _write_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                write_file(self.path, self.registry)
+            except OSError:
+                pass
+
+    def stop(self):
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.path:
+            write_file(self.path, self.registry)
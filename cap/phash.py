@@ -0,0 +1,54 @@
+"""Perceptual image hashes.
+
+Both hashes are 64-bit integers that change little when an image is
+resized, recompressed or lightly edited, so near-duplicates can be found
+by Hamming distance.
+"""
+from PIL import Image
+
+from cap.ingest import open_image
+
+HASH_BITS = 64
+
+
+def _grayscale(image, size):
+    return image.convert('L').resize(size, Image.Resampling.LANCZOS)
+
+
+def dhash(image):
+    """Difference hash: brightness gradient between neighbouring pixels"""
+    small = _grayscale(image, (9, 8))
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            bits = (bits << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return bits
+
+
+def phash(image):
+    """DCT hash: low frequencies of a 32x32 thumbnail against their median"""
+    import numpy as np
+
+    small = _grayscale(image, (32, 32))
+    pixels = np.asarray(small, dtype=np.float64)
+    n = np.arange(32)
+    dct = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / 64)
+    low = (dct @ pixels @ dct.T)[:8, :8].ravel()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def image_hashes(data):
+    """(phash, dhash) for encoded image bytes, or None if they can't be decoded"""
+    try:
+        with open_image(data) as image:
+            image.draft('RGB', (256, 256))
+            return phash(image), dhash(image)
+    except (OSError, ValueError):
+        return None
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
@@ -0,0 +1,97 @@
+"""Community report helpers"""
+from functools import lru_cache
+from html import escape
+
+# Example reports every new store starts with
+SEED_REPORTS = [
+    {
+        'id': 1,
+        'type': 'Image',
+        'description': 'Fake profile picture with unnatural skin texture',
+        'explanation': 'រូបភាពនេះមានសម្បុរាមិនធម្មជាតិ និងភ្នែកមិនស៊ីគ្នា ដែលជាសញ្ញាធម្មតានៃរូបភាព AI',
+        'date': '2025-08-20',
+        'category': 'Social Media Scam',
+        'user': 'Livhoung.H',
+        'accuracy': 92,
+        'likes': 24,
+        'comments': 5
+    },
+    {
+        'id': 2,
+        'type': 'News',
+        'description': 'False news about government policy',
+        'explanation': 'ព័ត៌មានក្លែងក្លាយអំពីគោលនយោបាយរដ្ឋាភិបាល ដែលមិនមានប្រភពជាក់លាក់',
+        'date': '2025-08-18',
+        'category': 'Political Misinformation',
+        'user': 'Pich H.',
+        'accuracy': 87,
+        'likes': 32,
+        'comments': 8
+    },
+    {
+        'id': 3,
+        'type': 'Video',
+        'description': 'Deepfake video of celebrity endorsement',
+        'explanation': 'វីដេអូក្លែងក្លាយដែលប្រើបច្ចេកវិទ្យា deepfake ធ្វើឱ្យតារាចិន្តបង្ហាញពាក្យផ្សាយទំនិញ',
+        'date': '2025-08-15',
+        'category': 'Commercial Fraud',
+        'user': 'Socheata.S',
+        'accuracy': 95,
+        'likes': 45,
+        'comments': 12
+    }
+]
+
+
+def get_accuracy_class(accuracy):
+    """Get CSS class based on accuracy percentage"""
+    if accuracy >= 80:
+        return "high-accuracy"
+    elif accuracy >= 60:
+        return "medium-accuracy"
+    else:
+        return "low-accuracy"
+
+
+# Card labels per language
+CARD_LABELS = {
+    'English': {'accurate': 'accurate', 'category': 'Category', 'explanation': 'Explanation', 'comments': 'comments'},
+    'Khmer': {'accurate': 'ត្រឹមត្រូវ', 'category': 'ប្រភេទ', 'explanation': 'ការពន្យល់', 'comments': 'មតិ'},
+}
+
+
+def report_card_html(report, language='English'):
+    """HTML card for a community report, memoized per report and language"""
+    return _report_card(report['id'], report['type'], report['description'], report['explanation'],
+                        report['date'], report['category'], report['user'], report['accuracy'],
+                        report['likes'], report['comments'], language)
+
+
+@lru_cache(maxsize=4096)
+def _report_card(report_id, type, description, explanation, date, category, user,
+                 accuracy, likes, comments, language):
+    # Everything is keyed on the field values, so an edited report renders afresh
+    labels = CARD_LABELS.get(language, CARD_LABELS['English'])
+    return f"""
+    <div class="report-card">
+        <div class="user-info">
+            <div class="user-avatar">{escape(user[:1])}</div>
+            <div>
+                <strong>{escape(user)}</strong>
+                <span>• {escape(date)}</span>
+                <span class="accuracy-badge {get_accuracy_class(accuracy)}">
+                    {accuracy}% {labels['accurate']}
+                </span>
+            </div>
+        </div>
+        <h4>{escape(type)}: {escape(description)}</h4>
+        <p><strong>{labels['category']}:</strong> {escape(category)}</p>
+        <div class="khmer-explanation">
+            <strong>🇰🇭 {labels['explanation']}:</strong> {escape(explanation)}
+        </div>
+        <div style="display: flex; gap: 15px; margin-top: 10px;">
+            <span>👍 {likes}</span>
+            <span>💬 {comments} {labels['comments']}</span>
+        </div>
+    </div>
+    """
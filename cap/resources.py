@@ -0,0 +1,163 @@
+"""Detection assets loaded once per process and shared by every session.
+
+Lexicons, indexes, weights and the challenge bank are registered here
+with a loader and the data files they are built from. The first ``get``
+loads a resource (``warm_up`` loads them all ahead of time, e.g. from a
+background thread at server start) and every later caller gets the same
+object, which is shared and must be treated as read-only.
+
+When one of a resource's files changes on disk, the next ``get`` after
+the check interval builds a fresh copy and swaps it in, so an edited
+lexicon or challenge bank is picked up without restarting the server.
+Only one caller rebuilds; the others keep getting the previous copy
+until the new one is ready. If the rebuild fails, the previous copy
+stays in service and the error is shown by ``status``.
+"""
+import importlib
+import os
+import threading
+import time
+
+from cap import config
+
+# Modules that register resources, imported by warm_up
+PROVIDERS = ('cap.detection', 'cap.classifier', 'cap.challenges', 'cap.hash_index', 'cap.dedup', 'cap.khmer')
+
+
+def _import_providers():
+    for module in PROVIDERS:
+        importlib.import_module(module)
+
+
+class Resource:
+    """One registered asset: its loader, source files and current value"""
+
+    def __init__(self, name, loader, paths=()):
+        self.name = name
+        self.loader = loader
+        self.paths = tuple(paths)
+        self.value = None
+        self.loaded = False
+        self.version = 0
+        self.load_seconds = None
+        self.error = None
+        self._stamp = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _current_stamp(self):
+        stamp = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _build(self, stamp):
+        started = time.perf_counter()
+        try:
+            value = self.loader()
+        except Exception as error:
+            if not self.loaded:
+                raise
+            # Keep serving the last good copy until the files change again
+            self.error = f"{type(error).__name__}: {error}"
+            self._stamp = stamp
+            return
+        self.value, self._stamp = value, stamp
+        self.loaded = True
+        self.version += 1
+        self.error = None
+        self.load_seconds = time.perf_counter() - started
+
+    def load(self, force=False):
+        """The value, built now if it was never loaded (or ``force``)"""
+        with self._lock:
+            if force or not self.loaded:
+                self._build(self._current_stamp())
+            return self.value
+
+    def get(self, check_interval=None):
+        if not self.loaded:
+            return self.load()
+        if self.paths and check_interval is not None:
+            now = time.monotonic()
+            if now - self._checked >= check_interval:
+                self._checked = now
+                # Whoever sees the change first rebuilds; nobody waits for it
+                if self._current_stamp() != self._stamp and self._lock.acquire(blocking=False):
+                    try:
+                        stamp = self._current_stamp()
+                        if stamp != self._stamp:
+                            self._build(stamp)
+                    finally:
+                        self._lock.release()
+        return self.value
+
+
+class ResourceRegistry:
+    """Named resources of one process"""
+
+    def __init__(self, check_interval=None, reload=None):
+        self.check_interval = config.RESOURCE_CHECK_INTERVAL if check_interval is None else check_interval
+        self.reload_enabled = config.RESOURCE_RELOAD if reload is None else reload
+        self._resources = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, paths=()):
+        """Add a resource; registering a name again keeps the first one"""
+        with self._lock:
+            return self._resources.setdefault(name, Resource(name, loader, paths))
+
+    def get(self, name):
+        """The shared value of resource ``name``, loading or reloading it as needed"""
+        resource = self._resources.get(name)
+        if resource is None:
+            # Resources are registered when their module is first imported
+            _import_providers()
+            resource = self._resources[name]
+        return resource.get(self.check_interval if self.reload_enabled else None)
+
+    def reload(self, name=None):
+        """Rebuild one resource (or every loaded one) from its files now"""
+        names = [name] if name else [resource.name for resource in self._resources.values() if resource.loaded]
+        for name in names:
+            self._resources[name].load(force=True)
+
+    def warm_up(self, names=None):
+        """Load resources ahead of their first use; returns load seconds by name"""
+        _import_providers()
+        timings = {}
+        for name in names or list(self._resources):
+            resource = self._resources[name]
+            resource.load()
+            timings[name] = resource.load_seconds
+        return timings
+
+    def status(self):
+        """One dict per resource: whether it is loaded, version, load time, files, last error"""
+        return [{
+            'name': resource.name,
+            'loaded': resource.loaded,
+            'version': resource.version,
+            'load_seconds': resource.load_seconds,
+            'paths': list(resource.paths),
+            'error': resource.error,
+        } for resource in self._resources.values()]
+
+
+REGISTRY = ResourceRegistry()
+
+
+def register(name, loader, paths=()):
+    return REGISTRY.register(name, loader, paths)
+
+
+def get(name):
+    return REGISTRY.get(name)
+
+
+def warm_up(names=None):
+    return REGISTRY.warm_up(names)
@@ -0,0 +1,51 @@
+"""Search terms for Khmer and English report text.
+
+SQLite's tokenizers split on spaces, which Khmer does not use between
+words. Text is therefore turned into terms here before it reaches the
+full-text index: Latin-script words are kept whole, and each run of
+Khmer script is segmented into words with ``cap.khmer``. A query is
+tokenized the same way and all its terms must match.
+"""
+from cap.khmer import KHMER_RUN, get_segmenter, normalize, tokens
+
+
+def index_terms(text):
+    """Terms to index for ``text``, in order"""
+    return tokens(text)
+
+
+def query_terms(query):
+    """Distinct terms of ``query``; the last one is matched as a prefix.
+
+    A Khmer word still being typed segments into syllables the
+    dictionary doesn't know ("ព័ត៌" of "ព័ត៌មាន"), so those trailing
+    syllables are joined back into one prefix term.
+    """
+    segmenter = get_segmenter()
+    terms = segmenter.tokens(query)
+    text = normalize(query.replace("\u200b", " ")).rstrip()
+    last_run = None
+    for last_run in KHMER_RUN.finditer(text):
+        pass
+    if last_run is not None and last_run.end() == len(text):
+        words = segmenter.words(last_run.group())
+        unknown = 0
+        while unknown < len(words) and words[len(words) - unknown - 1] not in segmenter:
+            unknown += 1
+        if unknown > 1:
+            terms[-unknown:] = ["".join(terms[-unknown:])]
+    return list(dict.fromkeys(terms))
+
+
+def match_query(query):
+    """An FTS5 MATCH expression requiring every term of ``query``, or None if empty.
+
+    The last term also matches as a prefix, so results appear while a
+    word is still being typed.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return None
+    parts = ['"' + term.replace('"', '""') + '"' for term in terms]
+    parts[-1] += '*'
+    return " ".join(parts)
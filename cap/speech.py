@@ -0,0 +1,158 @@
+"""Offline text-to-speech with a content-addressed audio cache.
+
+Speech comes from a local command-line engine that reads text on stdin
+and writes a WAV file to stdout; espeak-ng is the default, and any
+engine that works that way (piper, a Khmer MMS wrapper, ...) can be
+configured per language in ``cap.config``. The WAV is compressed to
+Ogg/Opus with PyAV when it is installed (otherwise kept as WAV) and
+stored under a hash of the voice and the spoken text, so each text is
+synthesized at most once. The fixed Learning Hub lessons and challenge
+explanations can be rendered ahead of time with ``prerender``.
+"""
+import hashlib
+import os
+import re
+import shlex
+import subprocess
+import threading
+from io import BytesIO
+
+from cap import config
+from cap.challenges import get_challenge_bank
+from cap.learning import LESSONS
+
+LANGUAGES = ('English', 'Khmer')
+
+_MARKUP = re.compile(r"[#*_`>|]+")
+_BULLET = re.compile(r"^\s*[-•]\s*", re.MULTILINE)
+# Emoji and other pictographs the engines would read out by name
+_SYMBOLS = re.compile("[\U0001f000-\U0001faff\u2600-\u27bf\ufe0f\u200d]")
+_BLANKS = re.compile(r"[ \t]+")
+# Latin and Khmer sentence endings
+_ENDINGS = ('.', '!', '?', ':', '\u17d4', '\u17d5')
+
+
+class SpeechUnavailable(RuntimeError):
+    """Raised when no speech engine is installed or it fails"""
+
+
+def speech_text(text):
+    """Plain sentences for an engine to read, without markdown or emoji"""
+    text = _SYMBOLS.sub("", _MARKUP.sub("", _BULLET.sub("", text)))
+    # Each line (heading, bullet) becomes its own sentence
+    lines = [_BLANKS.sub(" ", line).strip() for line in text.splitlines()]
+    return " ".join(line if line.endswith(_ENDINGS) else line + "." for line in lines if line)
+
+
+def fixed_texts(language):
+    """Texts the app always offers to read out in ``language``"""
+    texts = [LESSONS[section][language] for section in LESSONS]
+    field = 'explanation' if language == 'Khmer' else 'explanation_en'
+    texts += [challenge[field] for challenge in get_challenge_bank().challenges]
+    return texts
+
+
+def _encode_opus(wav):
+    """Ogg/Opus bytes for a WAV, or None without PyAV"""
+    try:
+        import av
+    except ImportError:
+        return None
+    output = BytesIO()
+    with av.open(BytesIO(wav)) as source, av.open(output, 'w', format='ogg') as target:
+        stream = target.add_stream('libopus', rate=48000)
+        stream.bit_rate = 24000
+        stream.layout = 'mono'
+        resampler = av.AudioResampler(format='s16', layout='mono', rate=48000)
+        for frame in source.decode(audio=0):
+            for resampled in resampler.resample(frame):
+                target.mux(stream.encode(resampled))
+        for resampled in resampler.resample(None):
+            target.mux(stream.encode(resampled))
+        target.mux(stream.encode(None))
+    return output.getvalue()
+
+
+class SpeechCache:
+    """Synthesized audio files under ``directory``, keyed by voice and text"""
+
+    def __init__(self, directory=None, commands=None, timeout=None):
+        self.directory = directory or config.AUDIO_CACHE_DIR
+        self.commands = commands or config.TTS_COMMANDS
+        self.timeout = timeout or config.TTS_TIMEOUT
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _key(self, spoken, language):
+        command = self.commands.get(language, '')
+        return hashlib.sha256(f"{command}\0{spoken}".encode('utf-8')).hexdigest()
+
+    def _cached(self, key):
+        for extension in ('.ogg', '.wav'):
+            path = os.path.join(self.directory, key + extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _synthesize(self, spoken, language):
+        command = self.commands.get(language)
+        if not command:
+            raise SpeechUnavailable(f"No speech engine is configured for {language}")
+        try:
+            completed = subprocess.run(shlex.split(command), input=spoken.encode('utf-8'),
+                                       capture_output=True, timeout=self.timeout, check=True)
+        except FileNotFoundError:
+            raise SpeechUnavailable(f"Speech engine not installed: {shlex.split(command)[0]}") from None
+        except subprocess.TimeoutExpired:
+            raise SpeechUnavailable("Speech engine timed out") from None
+        except subprocess.CalledProcessError as error:
+            message = error.stderr.decode('utf-8', 'replace').strip() or f"exit status {error.returncode}"
+            raise SpeechUnavailable(f"Speech engine failed: {message}") from None
+        if not completed.stdout.startswith(b'RIFF'):
+            raise SpeechUnavailable("Speech engine did not produce a WAV file")
+        return completed.stdout
+
+    def audio_path(self, text, language):
+        """Path of an audio file reading ``text`` aloud, synthesized on first use"""
+        spoken = speech_text(text)
+        if not spoken:
+            raise SpeechUnavailable("Nothing to read out")
+        key = self._key(spoken, language)
+        path = self._cached(key)
+        if path is not None:
+            return path
+        # One synthesis per text even when several sessions ask at once
+        with self._locks_lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            path = self._cached(key)
+            if path is None:
+                wav = self._synthesize(spoken, language)
+                opus = _encode_opus(wav)
+                path = os.path.join(self.directory, key + ('.ogg' if opus else '.wav'))
+                os.makedirs(self.directory, exist_ok=True)
+                partial = f"{path}.{os.getpid()}.tmp"
+                with open(partial, 'wb') as file:
+                    file.write(opus or wav)
+                os.replace(partial, path)
+        with self._locks_lock:
+            self._locks.pop(key, None)
+        return path
+
+    def prerender(self, languages=LANGUAGES):
+        """Synthesize every fixed text; returns how many are now cached.
+
+        Languages without a configured engine are skipped.
+        """
+        rendered = 0
+        for language in languages:
+            if not self.commands.get(language):
+                continue
+            for text in fixed_texts(language):
+                self.audio_path(text, language)
+                rendered += 1
+        return rendered
+
+
+def mime_type(path):
+    return 'audio/ogg' if path.endswith('.ogg') else 'audio/wav'
@@ -0,0 +1,153 @@
+"""State shared by every session: counters and expiring values.
+
+A single server process keeps it in memory (``LocalState``). Several
+replicas behind a load balancer set ``CAP_STATE_URL`` to a Redis server
+(or anything that speaks its protocol, e.g. fakeredis in a test) and
+share it through ``RedisState``; the community reports and the result
+cache move to the same server then (see ``cap.store.open_report_store``
+and ``ResultCache``), so every replica sees the same data.
+
+Both backends have the same small interface: named groups of counters,
+incremented one at a time and read back whole, and string values with a
+lifetime. Calls that touch several keys go out as one pipelined round
+trip, so a rerun pays for one network hop, not one per key.
+"""
+import math
+import threading
+import time
+
+from cap import config
+
+
+class StateUnavailable(RuntimeError):
+    """Raised when the configured shared-state backend cannot be used"""
+
+
+class LocalState:
+    """State of this process only, for a single-server deployment"""
+
+    # Other processes don't see it
+    shared = False
+
+    def __init__(self):
+        self._counters = {}
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name, field, amount=1):
+        """Add ``amount`` to counter ``field`` of group ``name``; returns the new value"""
+        with self._lock:
+            counters = self._counters.setdefault(name, {})
+            counters[field] = counters.get(field, 0) + amount
+            return counters[field]
+
+    def counters(self, name):
+        """Every counter of group ``name``, as ``{field: value}``"""
+        return self.counters_many([name])[0]
+
+    def counters_many(self, names):
+        with self._lock:
+            return [dict(self._counters.get(name, {})) for name in names]
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        """Values of ``keys`` (None where missing or expired)"""
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._values.get(key)
+                if entry is not None and entry[1] is not None and entry[1] <= now:
+                    del self._values[key]
+                    entry = None
+                values.append(entry[0] if entry is not None else None)
+        return values
+
+    def set(self, key, value, ttl=None):
+        """Store a string, dropped after ``ttl`` seconds if given"""
+        with self._lock:
+            self._values[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def clear(self, prefix=''):
+        """Drop every value whose key starts with ``prefix``"""
+        with self._lock:
+            for key in [key for key in self._values if key.startswith(prefix)]:
+                del self._values[key]
+
+
+def _text(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class RedisState:
+    """State in a Redis server, shared by every process that connects to it.
+
+    ``client`` is a redis-py client (or a compatible one such as
+    ``fakeredis.FakeRedis()``); every key is put under ``prefix``.
+    """
+
+    shared = True
+
+    def __init__(self, client, prefix=None):
+        self.client = client
+        self.prefix = config.STATE_PREFIX if prefix is None else prefix
+
+    @classmethod
+    def from_url(cls, url, prefix=None):
+        try:
+            import redis
+        except ImportError:
+            raise StateUnavailable("CAP_STATE_URL needs the redis package (pip install redis)") from None
+        return cls(redis.Redis.from_url(url, decode_responses=True), prefix)
+
+    def incr(self, name, field, amount=1):
+        return self.client.hincrby(self.prefix + name, field, amount)
+
+    def counters(self, name):
+        return self.counters_many([name])[0]
+
+    def counters_many(self, names):
+        pipe = self.client.pipeline(transaction=False)
+        for name in names:
+            pipe.hgetall(self.prefix + name)
+        return [{_text(field): int(value) for field, value in counters.items()}
+                for counters in pipe.execute()]
+
+    def get(self, key):
+        return _text(self.client.get(self.prefix + key))
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return [_text(value) for value in self.client.mget([self.prefix + key for key in keys])]
+
+    def set(self, key, value, ttl=None):
+        # Redis lifetimes are whole seconds
+        self.client.set(self.prefix + key, value, ex=math.ceil(ttl) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self, prefix=''):
+        keys = []
+        for key in self.client.scan_iter(match=self.prefix + prefix + '*', count=1000):
+            keys.append(key)
+            if len(keys) == 1000:
+                self.client.delete(*keys)
+                keys = []
+        if keys:
+            self.client.delete(*keys)
+
+
+def open_state(url=None):
+    """The backend named by ``url`` (default ``CAP_STATE_URL``): Redis, or this process"""
+    url = config.STATE_URL if url is None else url
+    if not url:
+        return LocalState()
+    return RedisState.from_url(url)
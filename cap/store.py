@@ -0,0 +1,661 @@
+"""Persistent community report store.
+
+Reports live in one SQLite database in WAL mode, shared by every
+Streamlit session (and every process on the host), so a report
+submitted by one user is visible to all. Each thread gets its own
+connection; writes take the lock up front with BEGIN IMMEDIATE and wait
+out other writers via the busy timeout instead of failing.
+
+Rows keep the field names of the original session_state report dicts
+(id, type, description, explanation, date, category, user, accuracy,
+likes, comments), so those dicts can be imported as they are.
+
+When several server replicas share a Redis server (``CAP_STATE_URL``),
+``RedisReportStore`` keeps the reports there instead, behind the same
+interface; ``open_report_store`` picks the one for the deployment.
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from cap import config
+from cap.reports import SEED_REPORTS
+from cap.search import index_terms, match_query, query_terms
+from cap.state import _text
+
+REPORT_FIELDS = ('id', 'type', 'description', 'explanation', 'date', 'category',
+                 'user', 'accuracy', 'likes', 'comments')
+
+
+def _create_search_index(conn):
+    """Full-text index over description and explanation, backfilled from reports"""
+    try:
+        # Terms are pre-split by cap.search, so the plain ascii tokenizer
+        # only has to break on the spaces we put between them
+        conn.execute("CREATE VIRTUAL TABLE reports_fts USING fts5("
+                     "description, explanation, tokenize='ascii')")
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5; search falls back to a table scan
+        return
+    for row in conn.execute("SELECT id, description, explanation FROM reports").fetchall():
+        _index_report(conn, row[0], row[1], row[2])
+
+
+def _rebuild_search_index(conn):
+    """Re-index every report, e.g. after a change to how terms are split"""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'reports_fts'").fetchone() is None:
+        return
+    conn.execute("DELETE FROM reports_fts")
+    for row in conn.execute("SELECT id, description, explanation FROM reports").fetchall():
+        _index_report(conn, row[0], row[1], row[2])
+
+
+def _index_report(conn, report_id, description, explanation):
+    conn.execute("INSERT INTO reports_fts (rowid, description, explanation) VALUES (?, ?, ?)",
+                 (report_id, " ".join(index_terms(description)), " ".join(index_terms(explanation or ''))))
+
+
+# Schema changes, applied in order; PRAGMA user_version records how many ran.
+# Entries are SQL scripts or functions taking the connection.
+MIGRATIONS = [
+    """
+    CREATE TABLE reports (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        type TEXT NOT NULL,
+        description TEXT NOT NULL,
+        explanation TEXT NOT NULL DEFAULT '',
+        date TEXT NOT NULL,
+        category TEXT NOT NULL,
+        "user" TEXT NOT NULL,
+        accuracy INTEGER NOT NULL DEFAULT 0,
+        likes INTEGER NOT NULL DEFAULT 0,
+        comments INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL
+    );
+    CREATE INDEX reports_date ON reports (date, id);
+    CREATE INDEX reports_category ON reports (category, id);
+    CREATE INDEX reports_type ON reports (type, id);
+    CREATE INDEX reports_user ON reports ("user", id);
+    """,
+    _create_search_index,
+    # Rollups for the analytics view, kept current by triggers so any
+    # writer (the app, the CLI import) updates them in the same transaction
+    """
+    CREATE TABLE report_daily (
+        date TEXT NOT NULL,
+        category TEXT NOT NULL,
+        type TEXT NOT NULL,
+        reports INTEGER NOT NULL,
+        accuracy_sum INTEGER NOT NULL,
+        PRIMARY KEY (date, category, type)
+    ) WITHOUT ROWID;
+    CREATE TABLE reporter_totals (
+        "user" TEXT PRIMARY KEY,
+        reports INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    CREATE INDEX reporter_totals_reports ON reporter_totals (reports);
+    INSERT INTO report_daily (date, category, type, reports, accuracy_sum)
+        SELECT date, category, type, COUNT(*), SUM(accuracy) FROM reports GROUP BY date, category, type;
+    INSERT INTO reporter_totals ("user", reports)
+        SELECT "user", COUNT(*) FROM reports GROUP BY "user";
+    CREATE TRIGGER reports_rollup_insert AFTER INSERT ON reports BEGIN
+        INSERT INTO report_daily (date, category, type, reports, accuracy_sum)
+            VALUES (NEW.date, NEW.category, NEW.type, 1, NEW.accuracy)
+            ON CONFLICT (date, category, type) DO UPDATE
+            SET reports = reports + 1, accuracy_sum = accuracy_sum + excluded.accuracy_sum;
+        INSERT INTO reporter_totals ("user", reports) VALUES (NEW."user", 1)
+            ON CONFLICT ("user") DO UPDATE SET reports = reports + 1;
+    END;
+    CREATE TRIGGER reports_rollup_delete AFTER DELETE ON reports BEGIN
+        UPDATE report_daily SET reports = reports - 1, accuracy_sum = accuracy_sum - OLD.accuracy
+            WHERE date = OLD.date AND category = OLD.category AND type = OLD.type;
+        UPDATE reporter_totals SET reports = reports - 1 WHERE "user" = OLD."user";
+    END;
+    """,
+    # Khmer is indexed as dictionary words instead of syllable pairs
+    _rebuild_search_index,
+    # Perceptual hashes of reported images, as hex, so every process's
+    # image index can link new uploads of them to the report
+    """
+    CREATE TABLE report_images (
+        report_id INTEGER PRIMARY KEY REFERENCES reports (id),
+        phash TEXT NOT NULL,
+        dhash TEXT NOT NULL
+    );
+    """,
+]
+
+
+def _statements(script):
+    """Split a migration script into complete SQL statements"""
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement.strip()
+            statement = ''
+    if statement.strip():
+        yield statement.strip()
+
+
+class ReportStore:
+    """Community reports in SQLite, safe to share across sessions and threads"""
+
+    def __init__(self, path=None, seed=True):
+        self.path = path or config.REPORTS_DB_PATH
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+        self._migrate()
+        if seed and self.count() == 0:
+            self.import_reports(SEED_REPORTS)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=config.DB_BUSY_TIMEOUT,
+                                   isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        """Transaction that holds the write lock from the start"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _migrate(self):
+        with self._write() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+                if callable(migration):
+                    migration(conn)
+                else:
+                    for statement in _statements(migration):
+                        conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {number}")
+            self.has_search_index = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'reports_fts'").fetchone() is not None
+
+    @staticmethod
+    def _row(row):
+        return {field: row[field] for field in REPORT_FIELDS}
+
+    def _insert(self, conn, report):
+        values = [report.get('id'), report['type'], report['description'],
+                  report.get('explanation') or '',
+                  report.get('date') or datetime.now().strftime('%Y-%m-%d'),
+                  report['category'], report['user'], int(report.get('accuracy') or 0),
+                  int(report.get('likes') or 0), int(report.get('comments') or 0),
+                  datetime.now().isoformat(timespec='seconds')]
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO reports (id, type, description, explanation, date, category, '
+            '"user", accuracy, likes, comments, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            values)
+        if not cursor.rowcount:
+            return None
+        # Index the new report in the same transaction
+        if self.has_search_index:
+            _index_report(conn, cursor.lastrowid, values[2], values[3])
+        if report.get('image_hashes'):
+            phash, dhash = report['image_hashes']
+            conn.execute("INSERT INTO report_images (report_id, phash, dhash) VALUES (?, ?, ?)",
+                         (cursor.lastrowid, phash, dhash))
+        return cursor.lastrowid
+
+    def add(self, report):
+        """Insert a report dict (``id`` is assigned) and return the stored report.
+
+        ``image_hashes``, the hex ``(phash, dhash)`` of a reported image,
+        is stored with it for ``reported_images``.
+        """
+        report = dict(report, id=None)
+        with self._write() as conn:
+            report['id'] = self._insert(conn, report)
+        return {field: report.get(field) for field in REPORT_FIELDS}
+
+    def import_reports(self, reports):
+        """Bulk-load report dicts in the original schema, keeping their ids.
+
+        Reports whose id is already taken are skipped, so importing the
+        same list twice is harmless. Returns how many were added.
+        """
+        added = 0
+        with self._write() as conn:
+            for report in reports:
+                if self._insert(conn, report) is not None:
+                    added += 1
+        return added
+
+    def rebuild_search_index(self):
+        """Re-index every report's search terms, e.g. after the Khmer dictionary changed"""
+        with self._write() as conn:
+            _rebuild_search_index(conn)
+
+    def get(self, report_id):
+        row = self._connection().execute(
+            "SELECT * FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def reported_images(self, after_id=0):
+        """Image hashes of reports newer than ``after_id``, oldest first"""
+        rows = self._connection().execute(
+            "SELECT reports.id, reports.description, reports.accuracy, report_images.phash, "
+            "report_images.dhash FROM report_images JOIN reports ON reports.id = report_images.report_id "
+            "WHERE reports.id > ? ORDER BY reports.id", (after_id,))
+        return [{'report_id': row[0], 'description': row[1], 'accuracy': row[2],
+                 'image_hashes': (row[3], row[4])} for row in rows]
+
+    @staticmethod
+    def _filters(category=None, type=None, user=None, before_id=None, after_id=None, ids=None):
+        clauses, params = [], []
+        for column, value in (('category', category), ('type', type), ('"user"', user)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if before_id is not None:
+            clauses.append("id < ?")
+            params.append(before_id)
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+        if ids is not None:
+            clauses.append(f"id IN ({', '.join('?' * len(ids))})")
+            params.extend(ids)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def list_reports(self, limit=None, before_id=None, category=None, type=None, user=None,
+                     after_id=None, ids=None):
+        """Reports newest first, optionally filtered; ``before_id`` pages backwards"""
+        where, params = self._filters(category, type, user, before_id, after_id, ids)
+        sql = f"SELECT * FROM reports{where} ORDER BY id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [self._row(row) for row in self._connection().execute(sql, params)]
+
+    def count(self, category=None, type=None, user=None):
+        where, params = self._filters(category, type, user)
+        return self._connection().execute(f"SELECT COUNT(*) FROM reports{where}", params).fetchone()[0]
+
+    def search(self, query, category=None, type=None, limit=20):
+        """Reports matching every term of ``query``, best matches first"""
+        where, params = self._filters(category, type)
+        conn = self._connection()
+        if not self.has_search_index:
+            pattern = '%' + query.strip().replace('%', '').replace('_', '') + '%'
+            where += (" AND" if where else " WHERE") + " (description LIKE ? OR explanation LIKE ?)"
+            rows = conn.execute(f"SELECT * FROM reports{where} ORDER BY id DESC LIMIT ?",
+                                params + [pattern, pattern, limit])
+            return [self._row(row) for row in rows]
+        expression = match_query(query)
+        if expression is None:
+            return []
+        # Description matches weigh twice as much as explanation matches
+        rows = conn.execute(
+            "SELECT * FROM (SELECT rowid AS id, bm25(reports_fts, 2.0, 1.0) AS rank "
+            "FROM reports_fts WHERE reports_fts MATCH ?) AS hits "
+            f"JOIN reports USING (id){where} ORDER BY rank LIMIT ?",
+            [expression] + params + [limit])
+        return [self._row(row) for row in rows]
+
+    def trends(self, days=7, top=5):
+        """Aggregates for the last ``days`` days (all time if None), read from the rollups.
+
+        Besides totals per category, type and day, the mean accuracy and
+        the top reporters, ``previous_by_category`` holds the counts of
+        the period before, so spikes stand out.
+        """
+        conn = self._connection()
+        since = previous = None
+        if days:
+            since = (date.today() - timedelta(days=days - 1)).isoformat()
+            previous = (date.today() - timedelta(days=2 * days - 1)).isoformat()
+
+        def grouped(column, start=None, end=None):
+            where, params = [], []
+            if start:
+                where.append("date >= ?")
+                params.append(start)
+            if end:
+                where.append("date < ?")
+                params.append(end)
+            sql = (f"SELECT {column}, SUM(reports), SUM(accuracy_sum) FROM report_daily"
+                   f"{' WHERE ' + ' AND '.join(where) if where else ''} GROUP BY {column} HAVING SUM(reports) > 0")
+            return conn.execute(sql, params).fetchall()
+
+        by_day = grouped('date', since)
+        total = sum(row[1] for row in by_day)
+        accuracy = sum(row[2] for row in by_day)
+        return {
+            'since': since,
+            'total': total,
+            'mean_accuracy': accuracy / total if total else None,
+            'by_category': {row[0]: row[1] for row in grouped('category', since)},
+            'previous_by_category': {row[0]: row[1] for row in grouped('category', previous, since)} if days else {},
+            'by_type': {row[0]: row[1] for row in grouped('type', since)},
+            'by_day': [(row[0], row[1]) for row in by_day],
+            # Reporter totals are all-time
+            'top_reporters': [tuple(row) for row in conn.execute(
+                'SELECT "user", reports FROM reporter_totals WHERE reports > 0 ORDER BY reports DESC LIMIT ?',
+                (top,))],
+        }
+
+
+def _rollup_field(day, category, type):
+    return json.dumps([day, category, type], ensure_ascii=False)
+
+
+class RedisReportStore:
+    """Community reports in Redis, shared by every server replica.
+
+    Same interface as ``ReportStore``. Each report is a hash. Sorted
+    sets of ids (all reports, and per category, type and user) serve the
+    feed newest first and page by id. Rollup hashes and a reporter
+    ranking, updated in the same transaction as each insert, serve the
+    trends. A set of ids per search term serves search, which matches
+    like the SQLite index (every term, the last one also as a prefix)
+    but lists hits newest first rather than by relevance. A sorted set
+    of the reports that carry image hashes serves ``reported_images``.
+
+    ``client`` is a redis-py client or a compatible one such as
+    ``fakeredis.FakeRedis()``.
+    """
+
+    # Ids read from a sorted set per round trip when other filters have
+    # to be checked on the reports themselves
+    SCAN_SIZE = 200
+    # Indexed terms the last query term may expand to
+    PREFIX_LIMIT = 100
+
+    def __init__(self, client, prefix=None, seed=True):
+        self.client = client
+        self.prefix = (config.STATE_PREFIX if prefix is None else prefix) + 'reports:'
+        self.has_search_index = True
+        if seed and self.count() == 0:
+            self.import_reports(SEED_REPORTS)
+
+    def _key(self, *parts):
+        return self.prefix + ':'.join(str(part) for part in parts)
+
+    @staticmethod
+    def _row(fields):
+        fields = {_text(name): _text(value) for name, value in fields.items()}
+        if 'description' not in fields:
+            # Id claimed, report not written yet
+            return None
+        report = {field: fields.get(field) for field in REPORT_FIELDS}
+        for field in ('id', 'accuracy', 'likes', 'comments'):
+            report[field] = int(report[field] or 0)
+        return report
+
+    @staticmethod
+    def _values(report, report_id):
+        values = {
+            'id': report_id,
+            'type': report['type'],
+            'description': report['description'],
+            'explanation': report.get('explanation') or '',
+            'date': report.get('date') or datetime.now().strftime('%Y-%m-%d'),
+            'category': report['category'],
+            'user': report['user'],
+            'accuracy': int(report.get('accuracy') or 0),
+            'likes': int(report.get('likes') or 0),
+            'comments': int(report.get('comments') or 0),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        if report.get('image_hashes'):
+            values['image_hashes'] = ' '.join(report['image_hashes'])
+        return values
+
+    def _claim(self, reports):
+        """Take an id for each report: its own if free (else None), or a new one"""
+        candidates = [report.get('id') for report in reports]
+        fixed = [candidate is not None for candidate in candidates]
+        claimed = [None] * len(reports)
+        pending = list(range(len(reports)))
+        while pending:
+            fresh = [index for index in pending if not fixed[index]]
+            if fresh:
+                last = self.client.incrby(self._key('next_id'), len(fresh))
+                for index, report_id in zip(fresh, range(last - len(fresh) + 1, last + 1)):
+                    candidates[index] = report_id
+            pipe = self.client.pipeline(transaction=False)
+            for index in pending:
+                pipe.hsetnx(self._key('report', candidates[index]), 'id', candidates[index])
+            retry = []
+            for index, taken in zip(pending, pipe.execute()):
+                if taken:
+                    claimed[index] = candidates[index]
+                elif not fixed[index]:
+                    # An imported report already has this id; draw another
+                    retry.append(index)
+            pending = retry
+        return claimed
+
+    def _raise_next_id(self, report_id):
+        """Make sure new reports are numbered after ``report_id``"""
+        from redis.exceptions import WatchError
+
+        key = self._key('next_id')
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    if int(pipe.get(key) or 0) >= report_id:
+                        return
+                    pipe.multi()
+                    pipe.set(key, report_id)
+                    pipe.execute()
+                    return
+                except WatchError:
+                    continue
+
+    def _index_terms(self, pipe, report_id, description, explanation):
+        terms = set(index_terms(description) + index_terms(explanation))
+        for term in terms:
+            pipe.sadd(self._key('term', term), report_id)
+        if terms:
+            pipe.zadd(self._key('terms'), dict.fromkeys(terms, 0))
+
+    def _write(self, pipe, values):
+        """Queue everything stored for one claimed report"""
+        report_id = values['id']
+        pipe.hset(self._key('report', report_id), mapping=values)
+        pipe.zadd(self._key('ids'), {report_id: report_id})
+        for field in ('category', 'type', 'user'):
+            pipe.zadd(self._key(field, values[field]), {report_id: report_id})
+        self._index_terms(pipe, report_id, values['description'], values['explanation'])
+        rollup = _rollup_field(values['date'], values['category'], values['type'])
+        pipe.hincrby(self._key('daily'), rollup, 1)
+        pipe.hincrby(self._key('daily_accuracy'), rollup, values['accuracy'])
+        pipe.zincrby(self._key('reporters'), 1, values['user'])
+        if 'image_hashes' in values:
+            pipe.zadd(self._key('images'), {report_id: report_id})
+
+    def add(self, report):
+        """Insert a report dict (``id`` is assigned) and return the stored report"""
+        report_id = self._claim([dict(report, id=None)])[0]
+        values = self._values(report, report_id)
+        # MULTI/EXEC: readers see all of the report or none of it
+        pipe = self.client.pipeline()
+        self._write(pipe, values)
+        pipe.execute()
+        return {field: values[field] for field in REPORT_FIELDS}
+
+    def import_reports(self, reports, batch_size=500):
+        """Bulk-load report dicts, keeping their ids; reports whose id is taken are skipped"""
+        added = 0
+        reports = iter(reports)
+        while True:
+            batch = list(islice(reports, batch_size))
+            if not batch:
+                return added
+            ids = self._claim(batch)
+            pipe = self.client.pipeline()
+            for report, report_id in zip(batch, ids):
+                if report_id is not None:
+                    self._write(pipe, self._values(report, report_id))
+                    added += 1
+            pipe.execute()
+            own_ids = [report['id'] for report in batch if report.get('id') is not None]
+            if own_ids:
+                self._raise_next_id(max(own_ids))
+
+    def rebuild_search_index(self):
+        """Re-index every report's search terms, e.g. after the Khmer dictionary changed"""
+        stale = [self._key('terms')]
+        stale.extend(self.client.scan_iter(match=self._key('term', '*'), count=1000))
+        for start in range(0, len(stale), 1000):
+            self.client.delete(*stale[start:start + 1000])
+        ids = [int(_text(report_id)) for report_id in self.client.zrange(self._key('ids'), 0, -1)]
+        for start in range(0, len(ids), self.SCAN_SIZE):
+            pipe = self.client.pipeline(transaction=False)
+            for report in self._fetch(ids[start:start + self.SCAN_SIZE]):
+                self._index_terms(pipe, report['id'], report['description'], report['explanation'])
+            pipe.execute()
+
+    def _fetch(self, ids):
+        """Reports with these ids, in the same order, in one round trip"""
+        pipe = self.client.pipeline(transaction=False)
+        for report_id in ids:
+            pipe.hgetall(self._key('report', report_id))
+        return [report for report in map(self._row, pipe.execute()) if report is not None]
+
+    def reported_images(self, after_id=0):
+        """Image hashes of reports newer than ``after_id``, oldest first"""
+        ids = self.client.zrangebyscore(self._key('images'), f"({after_id}", '+inf')
+        pipe = self.client.pipeline(transaction=False)
+        for report_id in ids:
+            pipe.hmget(self._key('report', _text(report_id)), 'id', 'description', 'accuracy', 'image_hashes')
+        return [{'report_id': int(_text(fields[0])), 'description': _text(fields[1]),
+                 'accuracy': int(_text(fields[2]) or 0), 'image_hashes': tuple(_text(fields[3]).split())}
+                for fields in pipe.execute() if fields[3] is not None]
+
+    @staticmethod
+    def _matching(reports, filters):
+        return [report for report in reports
+                if all(report[field] == value for field, value in filters.items())]
+
+    def get(self, report_id):
+        return self._row(self.client.hgetall(self._key('report', report_id)))
+
+    def list_reports(self, limit=None, before_id=None, category=None, type=None, user=None,
+                     after_id=None, ids=None):
+        """Reports newest first, optionally filtered; ``before_id`` pages backwards"""
+        filters = {field: value for field, value in (('user', user), ('category', category), ('type', type))
+                   if value is not None}
+        if ids is not None:
+            ids = sorted((report_id for report_id in ids
+                          if (before_id is None or report_id < before_id)
+                          and (after_id is None or report_id > after_id)), reverse=True)
+            return self._matching(self._fetch(ids), filters)[:limit]
+        # Walk the most selective sorted set and check the other filters on the reports
+        field = next(iter(filters), None)
+        key = self._key(field, filters.pop(field)) if field else self._key('ids')
+        high = f"({before_id}" if before_id is not None else "+inf"
+        low = f"({after_id}" if after_id is not None else "-inf"
+        reports = []
+        while limit is None or len(reports) < limit:
+            wanted = self.SCAN_SIZE if filters or limit is None else limit - len(reports)
+            page = [int(_text(report_id)) for report_id
+                    in self.client.zrevrangebyscore(key, high, low, start=0, num=wanted)]
+            reports += self._matching(self._fetch(page), filters)
+            if len(page) < wanted:
+                break
+            high = f"({page[-1]}"
+        return reports[:limit]
+
+    def count(self, category=None, type=None, user=None):
+        filters = [(field, value) for field, value in (('user', user), ('category', category), ('type', type))
+                   if value is not None]
+        if len(filters) > 1:
+            return len(self.list_reports(category=category, type=type, user=user))
+        return self.client.zcard(self._key(*filters[0]) if filters else self._key('ids'))
+
+    def search(self, query, category=None, type=None, limit=20):
+        """Reports matching every term of ``query``, newest first"""
+        terms = query_terms(query)
+        if not terms:
+            return []
+        *exact, last = terms
+        # The last term also matches as a prefix, so results appear while typing
+        prefix = last.encode('utf-8')
+        expansions = self.client.zrangebylex(self._key('terms'), b'[' + prefix, b'[' + prefix + b'\xff',
+                                             start=0, num=self.PREFIX_LIMIT)
+        if not expansions:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        if exact:
+            pipe.sinter([self._key('term', term) for term in exact])
+        pipe.sunion([self._key('term', _text(term)) for term in expansions])
+        found = [{int(_text(report_id)) for report_id in ids} for ids in pipe.execute()]
+        hits = sorted(set.intersection(*found), reverse=True)
+        filters = {field: value for field, value in (('category', category), ('type', type)) if value is not None}
+        reports = []
+        for start in range(0, len(hits), self.SCAN_SIZE):
+            reports += self._matching(self._fetch(hits[start:start + self.SCAN_SIZE]), filters)
+            if len(reports) >= limit:
+                break
+        return reports[:limit]
+
+    def trends(self, days=7, top=5):
+        """Aggregates for the last ``days`` days (all time if None), as ``ReportStore.trends``"""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(self._key('daily'))
+        pipe.hgetall(self._key('daily_accuracy'))
+        pipe.zrevrangebyscore(self._key('reporters'), '+inf', '(0', start=0, num=top, withscores=True)
+        daily, accuracy, reporters = pipe.execute()
+        accuracy = {_text(field): int(value) for field, value in accuracy.items()}
+        rows = [(json.loads(_text(field)), int(count), accuracy.get(_text(field), 0))
+                for field, count in daily.items()]
+        since = previous = None
+        if days:
+            since = (date.today() - timedelta(days=days - 1)).isoformat()
+            previous = (date.today() - timedelta(days=2 * days - 1)).isoformat()
+
+        def grouped(column, start=None, end=None):
+            totals = {}
+            for values, count, accuracy_sum in rows:
+                if (start and values[0] < start) or (end and values[0] >= end):
+                    continue
+                total = totals.setdefault(values[column], [0, 0])
+                total[0] += count
+                total[1] += accuracy_sum
+            return sorted((name, *total) for name, total in totals.items() if total[0] > 0)
+
+        by_day = grouped(0, since)
+        total = sum(row[1] for row in by_day)
+        accuracy_total = sum(row[2] for row in by_day)
+        return {
+            'since': since,
+            'total': total,
+            'mean_accuracy': accuracy_total / total if total else None,
+            'by_category': {row[0]: row[1] for row in grouped(1, since)},
+            'previous_by_category': {row[0]: row[1] for row in grouped(1, previous, since)} if days else {},
+            'by_type': {row[0]: row[1] for row in grouped(2, since)},
+            'by_day': [(row[0], row[1]) for row in by_day],
+            # Reporter totals are all-time
+            'top_reporters': [(_text(user), int(count)) for user, count in reporters],
+        }
+
+
+def open_report_store(state=None):
+    """The report store for this deployment: in Redis if ``state`` is shared, else SQLite"""
+    if state is not None and state.shared:
+        return RedisReportStore(state.client, state.prefix)
+    return ReportStore()
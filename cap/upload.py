@@ -0,0 +1,110 @@
+"""Uploaded files, read once and shared without copies.
+
+A Streamlit upload is a BytesIO over the bytes the browser sent, and
+``getvalue()`` hands out those same bytes rather than a copy, as long as
+nobody asks the BytesIO for a writable view (``getbuffer()`` makes it
+copy the whole file first). ``Upload`` takes the bytes once, hashes them
+for the result cache in slices through a memoryview, and gives the
+decoders (PIL, PyAV) read-only files over the same buffer, so an upload
+exists once in memory however many stages look at it.
+"""
+import io
+
+from cap.cache import content_key
+
+# Uploads that go through the video frame sampler
+ANIMATED_TYPES = ('image/gif',)
+
+
+class BufferReader(io.RawIOBase):
+    """Read-only, seekable file over a bytes-like buffer.
+
+    Reads copy only the slice they return, never the whole buffer.
+    """
+
+    def __init__(self, buffer):
+        super().__init__()
+        self._view = memoryview(buffer).cast('B')
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        elif whence != io.SEEK_SET:
+            raise ValueError(f"Invalid whence: {whence}")
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self._position = offset
+        return offset
+
+    def read(self, size=-1):
+        start = min(self._position, len(self._view))
+        end = len(self._view) if size is None or size < 0 else min(start + size, len(self._view))
+        self._position = end
+        return self._view[start:end].tobytes()
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, buffer):
+        chunk = self.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+
+class Upload:
+    """One uploaded file: its bytes, name, MIME type and (lazily) cache key"""
+
+    def __init__(self, data, name='', type='', file_id=None):
+        self.data = data
+        self.name = name
+        self.type = type
+        self.file_id = file_id
+        self._key = None
+
+    @classmethod
+    def read(cls, source):
+        """Take the contents of an ``UploadedFile`` (or any binary file) without copying them"""
+        getvalue = getattr(source, 'getvalue', None)
+        if getvalue is not None:
+            data = getvalue()
+        else:
+            source.seek(0)
+            data = source.read()
+        return cls(data, getattr(source, 'name', ''), getattr(source, 'type', ''),
+                   getattr(source, 'file_id', None))
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @property
+    def key(self):
+        """Result cache key, hashed once per upload"""
+        if self._key is None:
+            self._key = content_key(self.data)
+        return self._key
+
+    @property
+    def is_video(self):
+        """Videos and animated GIFs are sampled frame by frame"""
+        return self.type.startswith('video') or self.type in ANIMATED_TYPES
+
+    def open(self):
+        """A new read-only file over the upload's bytes"""
+        return BufferReader(self.data)
@@ -0,0 +1,132 @@
+"""Streaming frame sampler and verdict aggregation for video uploads.
+
+Frames are decoded lazily from a generator, downscaled straight away and
+scored a small batch at a time, so memory does not grow with the length
+of the clip. Scoring stops as soon as the running verdict is confident.
+
+MP4/AVI/MOV decoding uses PyAV (``pip install av``) when it is
+installed; animated GIFs only need PIL.
+"""
+import math
+from itertools import islice
+
+from PIL import Image, ImageSequence
+
+from cap import config
+from cap.upload import BufferReader
+
+
+class VideoUnsupported(ValueError):
+    """Raised when a video cannot be decoded in this environment"""
+
+
+def _shrink(image, max_side):
+    image = image.convert('RGB')
+    image.thumbnail((max_side, max_side))
+    return image
+
+
+def _gif_frames(data, every_n, max_side):
+    with Image.open(BufferReader(data)) as image:
+        for index, frame in enumerate(ImageSequence.Iterator(image)):
+            if index % every_n == 0:
+                yield _shrink(frame, max_side)
+
+
+def _av_frames(data, every_n, keyframes_only, max_side):
+    try:
+        import av
+    except ImportError:
+        raise VideoUnsupported("Video analysis needs the PyAV package (pip install av)") from None
+    ffmpeg_error = getattr(av, 'FFmpegError', None) or av.AVError
+    try:
+        container = av.open(BufferReader(data))
+    except ffmpeg_error as error:
+        raise VideoUnsupported(f"Could not read this video: {error}") from None
+    with container:
+        if not container.streams.video:
+            raise VideoUnsupported("This file has no video track")
+        stream = container.streams.video[0]
+        stream.thread_type = 'AUTO'
+        if keyframes_only:
+            # The decoder drops everything but keyframes before decoding them
+            stream.codec_context.skip_frame = 'NONKEY'
+        width, height = stream.codec_context.width, stream.codec_context.height
+        scale = min(1.0, max_side / max(width, height, 1))
+        size = (max(int(width * scale), 1), max(int(height * scale), 1))
+        for index, frame in enumerate(container.decode(stream)):
+            if index % every_n == 0:
+                yield frame.to_image(width=size[0], height=size[1])
+
+
+def iter_frames(data, every_n=None, keyframes_only=None, max_side=None):
+    """Yield downscaled PIL frames from encoded video (or animated GIF) bytes.
+
+    With ``keyframes_only`` every keyframe is a candidate, otherwise every
+    frame is; of those, every ``every_n``-th one is yielded.
+    """
+    every_n = max(every_n or config.VIDEO_EVERY_N, 1)
+    keyframes_only = config.VIDEO_KEYFRAMES_ONLY if keyframes_only is None else keyframes_only
+    max_side = max_side or config.VIDEO_FRAME_SIDE
+    if bytes(data[:6]) in (b'GIF87a', b'GIF89a'):
+        return _gif_frames(data, every_n, max_side)
+    return _av_frames(data, every_n, keyframes_only, max_side)
+
+
+class VerdictAggregator:
+    """Running mean of per-frame AI scores with a confidence test.
+
+    The verdict is settled once enough frames are in and the mean sits
+    clearly on one side of the uncertain band, by more than ``z``
+    standard errors.
+    """
+
+    def __init__(self, fake_above=70, real_below=40, min_frames=6, z=2.0):
+        self.fake_above = fake_above
+        self.real_below = real_below
+        self.min_frames = min_frames
+        self.z = z
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, score):
+        # Welford's online mean and variance
+        self.count += 1
+        delta = score - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (score - self.mean)
+
+    @property
+    def stderr(self):
+        if self.count < 2:
+            return float('inf')
+        return math.sqrt(self._m2 / (self.count - 1) / self.count)
+
+    @property
+    def confident(self):
+        if self.count < self.min_frames:
+            return False
+        margin = self.z * self.stderr
+        return self.mean - margin > self.fake_above or self.mean + margin < self.real_below
+
+
+def score_frames(frames, detect_batch, batch_size=None, max_frames=None, aggregator=None):
+    """Score frames in batches until the verdict is confident or frames run out.
+
+    ``detect_batch`` takes a list of PIL images and returns result dicts
+    with a 0-100 ``score``. Returns ``(aggregator, stopped_early)``.
+    """
+    batch_size = batch_size or config.VIDEO_BATCH_SIZE
+    max_frames = max_frames or config.VIDEO_MAX_FRAMES
+    aggregator = aggregator or VerdictAggregator()
+    frames = islice(frames, max_frames)
+    while True:
+        batch = list(islice(frames, batch_size))
+        if not batch:
+            return aggregator, False
+        for result in detect_batch(batch):
+            aggregator.add(result['score'])
+        del batch
+        if aggregator.confident:
+            return aggregator, True